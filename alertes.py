@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
 
+from records import parse_date
+
 
 def _verifier_alertes_date_retour(attributions, id_key='immatriculation'):
     """Générique: véhicules/scooters avec date de retour prévue dans <= 2 jours."""
@@ -10,8 +12,10 @@ def _verifier_alertes_date_retour(attributions, id_key='immatriculation'):
         try:
             date_retour_prevue = attr.get('date_retour_prevue', '')
             if date_retour_prevue:
-                date_retour = datetime.strptime(date_retour_prevue, "%d/%m/%Y")
-                jours_restants = (date_retour.date() - datetime.now().date()).days
+                date_retour = parse_date(date_retour_prevue)
+                if date_retour is None:
+                    continue
+                jours_restants = (date_retour - datetime.now().date()).days
                 if jours_restants <= 2:
                     alertes.append({
                         'immatriculation': attr[id_key],
@@ -44,8 +48,8 @@ def _verifier_alertes_date_fin(attributions, id_key='numero_serie'):
         try:
             date_fin_str = attr.get('date_fin', '')
             if date_fin_str:
-                date_fin = datetime.strptime(date_fin_str, "%d/%m/%Y").date()
-                if date_fin < today:
+                date_fin = parse_date(date_fin_str)
+                if date_fin is not None and date_fin < today:
                     jours_retard = (today - date_fin).days
                     alertes.append({
                         'numero_serie': attr[id_key],
@@ -1,19 +1,10 @@
 import streamlit as st
-from styles import get_css, THEMES
 from auth import check_password
-from hamburger import inject_hamburger
-from database import init_database, _load_all_sheets
+from styles import THEMES
+from hamburger import inject_theme
+from database import init_database, load_sheets, noms, offline_status, parametres_dict, ALL_SHEET_NAMES
+from fleet import ALERT_SHEETS, SHEETS as FLEET_SHEETS
 from sidebar import render_sidebar
-from pages.dashboard import render_dashboard
-from pages.vehicules import render_vehicules
-from pages.scooters import render_scooters
-from pages.engins import render_engins
-from pages.golfettes import render_golfettes
-from pages.parametres import render_parametres
-from pages.distribution_clefs import render_distribution_clefs
-from pages.planning_wlg import render_planning_wlg
-from pages.planning_golfettes_wlg import render_planning_golfettes_wlg
-from pages.interventions_wlg import render_interventions_wlg
 
 st.set_page_config(page_title="Gestion de Flotte", page_icon="🚗", layout="wide", initial_sidebar_state="expanded")
 
@@ -21,44 +12,11 @@ if 'theme' not in st.session_state:
     st.session_state['theme'] = 'Sombre Classique'
 
 t = THEMES[st.session_state['theme']]
-st.markdown(get_css(t), unsafe_allow_html=True)
-
-inject_hamburger(t)
+inject_theme(st.session_state['theme'])
 check_password(t)
 
 init_database()
 
-# CHARGEMENT DONNÉES (1 seul appel API batchGet)
-try:
-    _all = _load_all_sheets()
-except Exception as _e:
-    st.error(f"Erreur de connexion à Google Sheets — rechargez la page dans quelques secondes. ({_e})")
-    st.stop()
-# Les défauts (catégories, services) sont peuplés par init_database() à la 1re session,
-# donc on n'a plus besoin de fallback API ici → 0 appel supplémentaire par page.
-vehicules = _all.get('vehicules', [])
-attributions = _all.get('attributions', [])
-categories = [c.get('nom', '') for c in _all.get('categories', []) if c.get('nom')]
-services = [s.get('nom', '') for s in _all.get('services', []) if s.get('nom')]
-interventions = _all.get('interventions', [])
-bons_carburant = _all.get('carburant', [])
-engins = _all.get('engins', [])
-attributions_engins = _all.get('attributions_engins', [])
-categories_engins = [c.get('nom', '') for c in _all.get('categories_engins', []) if c.get('nom')]
-interventions_engins = _all.get('interventions_engins', [])
-scooters = _all.get('scooters', [])
-attributions_scooters = _all.get('attributions_scooters', [])
-categories_scooters = [c.get('nom', '') for c in _all.get('categories_scooters', []) if c.get('nom')]
-interventions_scooters = _all.get('interventions_scooters', [])
-liens = _all.get('liens', [])
-fiches_vehicules = _all.get('fiches_vehicules', [])
-golfettes = _all.get('golfettes', [])
-attributions_golfettes = _all.get('attributions_golfettes', [])
-categories_golfettes = [c.get('nom', '') for c in _all.get('categories_golfettes', []) if c.get('nom')]
-interventions_golfettes = _all.get('interventions_golfettes', [])
-parametres = {r['cle']: r.get('valeur', '') for r in _all.get('parametres', []) if r.get('cle')}
-contacts_wlg = _all.get('contacts_wlg', [])
-
 # INITIALISATION SESSION STATE
 if 'page' not in st.session_state:
     st.session_state.page = "📊 Dashboard"
@@ -75,9 +33,6 @@ if 'golf_sem_offset' not in st.session_state:
 if '_fk' not in st.session_state:
     st.session_state['_fk'] = 0
 
-# SIDEBAR
-render_sidebar(t, attributions, attributions_scooters, attributions_engins, services, attributions_golfettes)
-
 # ROUTEUR DE PAGES
 page = st.session_state.page
 
@@ -86,26 +41,92 @@ SCOOTER_PAGES = ["🛵 Saisir un scooter", "🔧 Attribuer un scooter", "🔨 In
 ENGIN_PAGES = ["📊 Vue Engins", "🚜 Saisir un engin", "🔧 Attribuer un engin", "🔨 Interventions Engins"]
 GOLFETTE_PAGES = ["📊 Vue Golfettes", "⛳ Saisir une golfette", "🔧 Attribuer une golfette", "🔨 Interventions Golfettes"]
 
+# Feuilles lues par chaque page, préchargées en un seul batchGet avec celles
+# de la sidebar (alertes). Une feuille non déclarée reste lisible : elle est
+# chargée seule au premier accès (cf. database.load_sheets).
+# Les pages en fragments (plannings WLG) relisent ces feuilles elles-mêmes
+# dans le cache : le préchargement reste utile.
+PAGE_SHEETS = {
+    "📊 Dashboard": list(FLEET_SHEETS) + ['liens'],
+    "🔑 Distribution Clés": ['engins', 'vehicules', 'scooters', 'golfettes', 'distribution_clefs'],
+    "🎪 Planning WLG": ['engins', 'attributions_engins', 'interventions_engins', 'distribution_clefs'],
+    "🎪 Planning Engins WLG": ['engins', 'attributions_engins', 'interventions_engins', 'distribution_clefs'],
+    "⛳ Planning Golfettes WLG": ['golfettes', 'attributions_golfettes', 'distribution_clefs'],
+    "🔨 Interventions WLG": ['engins', 'golfettes', 'interventions_engins', 'interventions_golfettes', 'contacts_wlg'],
+    "⚙️ Paramètres": ['categories', 'services', 'categories_engins', 'categories_scooters',
+                      'categories_golfettes', 'liens', 'parametres', 'contacts_wlg'],
+}
+PAGE_SHEETS.update({p: ['vehicules', 'attributions', 'categories', 'services', 'carburant',
+                        'interventions', 'fiches_vehicules'] for p in VEHICULE_PAGES})
+PAGE_SHEETS.update({p: ['scooters', 'attributions_scooters', 'categories_scooters', 'services',
+                        'interventions_scooters'] for p in SCOOTER_PAGES})
+PAGE_SHEETS.update({p: ['engins', 'attributions_engins', 'categories_engins', 'services',
+                        'interventions_engins'] for p in ENGIN_PAGES})
+PAGE_SHEETS.update({p: ['golfettes', 'attributions_golfettes', 'categories_golfettes', 'services',
+                        'interventions_golfettes'] for p in GOLFETTE_PAGES})
+# La Vue Engins / Golfettes lit aussi l'état de flotte partagé (cf. fleet.py).
+PAGE_SHEETS["📊 Vue Engins"] = PAGE_SHEETS["📊 Vue Golfettes"] = list(FLEET_SHEETS)
+
+# CHARGEMENT DONNÉES (1 seul appel API batchGet pour la page courante)
+try:
+    _all = load_sheets(list(ALERT_SHEETS) + PAGE_SHEETS.get(page, ALL_SHEET_NAMES))
+except Exception as _e:
+    st.error(f"Erreur de connexion à Google Sheets — rechargez la page dans quelques secondes. ({_e})")
+    st.stop()
+_hors_ligne = offline_status()
+if _hors_ligne:
+    # Google Sheets injoignable : on affiche les dernières données connues (cache / miroir local).
+    st.warning(
+        f"📴 Google Sheets injoignable depuis {_hors_ligne['since'].strftime('%H:%M')} — "
+        "affichage des dernières données connues. Les modifications sont mises en attente "
+        "et seront enregistrées au retour de la connexion."
+    )
+# Les défauts (catégories, services) sont peuplés par init_database() à la 1re session,
+# donc on n'a plus besoin de fallback API ici → 0 appel supplémentaire par page.
+
+# SIDEBAR
+render_sidebar(t)
+
+# Chaque page est importée au premier passage seulement : un process ne charge
+# que les pages visitées, et leurs dépendances lourdes (pandas, reportlab)
+# quand elles servent (import déjà fait = simple lecture de sys.modules).
 if page == "📊 Dashboard":
-    render_dashboard(t, vehicules, attributions, scooters, attributions_scooters,
-                     engins, attributions_engins, interventions, interventions_scooters,
-                     interventions_engins, services, liens,
-                     golfettes, attributions_golfettes, interventions_golfettes)
+    from pages.dashboard import render_dashboard
+    render_dashboard(t, _all['vehicules'], _all['attributions'], _all['scooters'], _all['attributions_scooters'],
+                     _all['engins'], _all['attributions_engins'], _all['interventions'], _all['interventions_scooters'],
+                     _all['interventions_engins'], noms('services'), _all['liens'],
+                     _all['golfettes'], _all['attributions_golfettes'], _all['interventions_golfettes'])
 elif page == "🔑 Distribution Clés":
-    render_distribution_clefs(t, engins, vehicules, scooters, golfettes)
+    from pages.distribution_clefs import render_distribution_clefs
+    render_distribution_clefs(t, _all['engins'], _all['vehicules'], _all['scooters'], _all['golfettes'])
 elif page in ("🎪 Planning WLG", "🎪 Planning Engins WLG"):
-    render_planning_wlg(t, engins, attributions_engins, interventions_engins)
+    from pages.planning_wlg import render_planning_wlg
+    render_planning_wlg(t)
 elif page == "⛳ Planning Golfettes WLG":
-    render_planning_golfettes_wlg(t, golfettes, attributions_golfettes)
+    from pages.planning_golfettes_wlg import render_planning_golfettes_wlg
+    render_planning_golfettes_wlg(t)
 elif page == "🔨 Interventions WLG":
-    render_interventions_wlg(t, engins, golfettes, interventions_engins, interventions_golfettes, contacts_wlg)
+    from pages.interventions_wlg import render_interventions_wlg
+    render_interventions_wlg(t, _all['engins'], _all['golfettes'], _all['interventions_engins'],
+                             _all['interventions_golfettes'], _all['contacts_wlg'])
 elif page in VEHICULE_PAGES:
-    render_vehicules(page, t, vehicules, attributions, categories, services, bons_carburant, interventions, fiches_vehicules)
+    from pages.vehicules import render_vehicules
+    render_vehicules(page, t, _all['vehicules'], _all['attributions'], noms('categories'), noms('services'),
+                     _all['carburant'], _all['interventions'], _all['fiches_vehicules'])
 elif page in SCOOTER_PAGES:
-    render_scooters(page, t, scooters, attributions_scooters, categories_scooters, services, interventions_scooters)
+    from pages.scooters import render_scooters
+    render_scooters(page, t, _all['scooters'], _all['attributions_scooters'], noms('categories_scooters'),
+                    noms('services'), _all['interventions_scooters'])
 elif page in ENGIN_PAGES:
-    render_engins(page, t, engins, attributions_engins, categories_engins, services, interventions_engins)
+    from pages.engins import render_engins
+    render_engins(page, t, _all['engins'], _all['attributions_engins'], noms('categories_engins'),
+                  noms('services'), _all['interventions_engins'])
 elif page in GOLFETTE_PAGES:
-    render_golfettes(page, t, golfettes, attributions_golfettes, categories_golfettes, services, interventions_golfettes)
+    from pages.golfettes import render_golfettes
+    render_golfettes(page, t, _all['golfettes'], _all['attributions_golfettes'], noms('categories_golfettes'),
+                     noms('services'), _all['interventions_golfettes'])
 elif page == "⚙️ Paramètres":
-    render_parametres(t, categories, services, categories_engins, categories_scooters, categories_golfettes, liens, parametres, contacts_wlg)
+    from pages.parametres import render_parametres
+    render_parametres(t, noms('categories'), noms('services'), noms('categories_engins'),
+                      noms('categories_scooters'), noms('categories_golfettes'), _all['liens'],
+                      parametres_dict(), _all['contacts_wlg'])
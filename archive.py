@@ -0,0 +1,230 @@
+"""
+Archivage des lignes closes vers des feuilles froides.
+
+Les attributions retournées et les interventions terminées plus vieilles que
+l'horizon (en jours, clé 'archive_horizon_jours' de la feuille parametres,
+365 par défaut) quittent la feuille chaude pour `<feuille>_archive_<AAAA>`
+(année de la date de référence de la ligne). Les pages n'y lisent que sur
+demande (cf. database.read_archives).
+
+Depuis l'app : Paramètres → Archivage (database.archiver).
+En ligne de commande :
+    .venv/bin/python3 archive.py [--horizon 365] [--dry-run]
+La ligne de commande ne supprime que les lignes archivées, repérées par _id
+dans une relecture, et pose le jeton _meta des feuilles modifiées : l'app les
+recharge à sa sonde suivante.
+"""
+import argparse
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import quota
+import sheets_backend
+from records import parse_date
+
+DEFAULT_HORIZON = 365
+# Bornes de l'horizon saisi dans Paramètres.
+HORIZON_MIN, HORIZON_MAX = 30, 3650
+
+
+def horizon_from(value):
+    """Horizon en jours d'après la valeur de parametres : défaut si vide ou
+    illisible, ramené dans [HORIZON_MIN, HORIZON_MAX]."""
+    try:
+        horizon = int(value or DEFAULT_HORIZON)
+    except ValueError:
+        return DEFAULT_HORIZON
+    return min(max(horizon, HORIZON_MIN), HORIZON_MAX)
+
+
+def _retournee(row):
+    return bool(row.get('retourne'))
+
+
+def _terminee(row):
+    return row.get('statut') == 'Terminée'
+
+
+# feuille chaude → la ligne est-elle close ?
+ARCHIVABLE = {
+    'attributions': _retournee,
+    'attributions_engins': _retournee,
+    'attributions_scooters': _retournee,
+    'attributions_golfettes': _retournee,
+    'interventions': _terminee,
+    'interventions_engins': _terminee,
+    'interventions_scooters': _terminee,
+    'interventions_golfettes': _terminee,
+}
+
+
+def archive_name(sheet_name, year):
+    return f"{sheet_name}_archive_{year}"
+
+
+def reference_date(row):
+    """Date de clôture si on la connaît (retourne = 'dd/mm/YYYY HH:MM'),
+    sinon fin prévue, sinon début. None si aucune n'est lisible."""
+    for value in (str(row.get('retourne', ''))[:10], row.get('date_fin'), row.get('date_retour_prevue'), row.get('date')):
+        d = parse_date(value)
+        if d is not None:
+            return d
+    return None
+
+
+def split_rows(sheet_name, rows, horizon_days, today):
+    """(lignes à garder, {feuille d'archive: lignes à déplacer})."""
+    closed = ARCHIVABLE[sheet_name]
+    limit = today - timedelta(days=horizon_days)
+    keep, moved = [], {}
+    for row in rows:
+        ref = reference_date(row) if closed(row) else None
+        if ref is not None and ref < limit:
+            moved.setdefault(archive_name(sheet_name, ref.year), []).append(row)
+        else:
+            keep.append(row)
+    return keep, moved
+
+
+def sheet_titles(svc, sid):
+    meta = svc.spreadsheets().get(spreadsheetId=sid).execute()
+    return [s['properties']['title'] for s in meta['sheets']]
+
+
+def sheet_id(svc, sid, name):
+    """sheetId numérique de la feuille (requis par deleteDimension)."""
+    meta = svc.spreadsheets().get(spreadsheetId=sid).execute()
+    return next(s['properties']['sheetId'] for s in meta['sheets'] if s['properties']['title'] == name)
+
+
+def ensure_sheets(svc, sid, names):
+    missing = [n for n in names if n not in sheet_titles(svc, sid)]
+    if missing:
+        svc.spreadsheets().batchUpdate(
+            spreadsheetId=sid,
+            body={"requests": [{"addSheet": {"properties": {"title": n}}} for n in missing]}
+        ).execute()
+
+
+def append_rows(svc, sid, name, rows):
+    """Ajoute rows à la feuille d'archive, en complétant son en-tête si besoin."""
+    values = svc.spreadsheets().values().get(spreadsheetId=sid, range=f"{name}!1:1").execute().get('values', [])
+    headers = values[0] if values else []
+    new_headers = headers + [k for k in dict.fromkeys(k for r in rows for k in r) if k not in headers]
+    if new_headers != headers:
+        svc.spreadsheets().values().update(
+            spreadsheetId=sid, range=f"{name}!A1", valueInputOption='RAW', body={'values': [new_headers]}
+        ).execute()
+    svc.spreadsheets().values().append(
+        spreadsheetId=sid, range=f"{name}!A1", valueInputOption='RAW', insertDataOption='INSERT_ROWS',
+        body={'values': [[str(r.get(h, '') or '') for h in new_headers] for r in rows]}
+    ).execute()
+
+
+def read_archives(svc, sid, sheet_name):
+    """Toutes les lignes archivées de la feuille (années croissantes)."""
+    prefix = f"{sheet_name}_archive_"
+    names = sorted(t for t in sheet_titles(svc, sid) if t.startswith(prefix))
+    if not names:
+        return []
+    result = svc.spreadsheets().values().batchGet(spreadsheetId=sid, ranges=[f"{n}!A:Z" for n in names]).execute()
+    rows = []
+    for vr in result.get('valueRanges', []):
+        values = vr.get('values', [])
+        if len(values) < 2:
+            continue
+        headers = values[0]
+        rows += [dict(zip(headers, r + [''] * (len(headers) - len(r)))) for r in values[1:]]
+    return rows
+
+
+# ── Ligne de commande ───────────────────────────────────────────────────────
+
+def _connect():
+    import toml
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
+    secrets = toml.load(os.path.join(os.path.dirname(__file__), '.streamlit', 'secrets.toml'))
+    creds = Credentials.from_service_account_info(
+        dict(secrets['gcp_service_account']),
+        scopes=['https://www.googleapis.com/auth/spreadsheets']
+    )
+    return quota.limit(build('sheets', 'v4', credentials=creds)), secrets['google_sheets']['spreadsheet_id']
+
+
+def _read(svc, sid, name):
+    values = svc.spreadsheets().values().get(spreadsheetId=sid, range=f"{name}!A:Z").execute().get('values', [])
+    if len(values) < 2:
+        return [], values[0] if values else []
+    headers = values[0]
+    return [dict(zip(headers, r + [''] * (len(headers) - len(r)))) for r in values[1:]], headers
+
+
+def _row_key(row, headers):
+    """Identité d'une ligne : son _id, à défaut son contenu complet."""
+    if row.get('_id'):
+        return ('_id', row['_id'])
+    return ('row', tuple(str(row.get(h, '') or '') for h in headers))
+
+
+def delete_rows(svc, sid, name, rows):
+    """Supprime de la feuille les lignes rows, retrouvées dans une relecture
+    par _row_key : une ligne ajoutée ou déplacée par l'app entre-temps n'est
+    pas touchée. Une plage deleteDimension par bloc contigu, du bas vers le
+    haut, en 1 batchUpdate. Retourne le nombre de lignes supprimées."""
+    current, headers = _read(svc, sid, name)
+    wanted = Counter(_row_key(r, headers) for r in rows)
+    spans = []
+    for i, row in enumerate(current, start=1):  # index 0 = en-tête
+        key = _row_key(row, headers)
+        if not wanted[key]:
+            continue
+        wanted[key] -= 1
+        if spans and spans[-1][1] == i:
+            spans[-1][1] = i + 1
+        else:
+            spans.append([i, i + 1])
+    if spans:
+        gid = sheet_id(svc, sid, name)
+        svc.spreadsheets().batchUpdate(spreadsheetId=sid, body={'requests': [
+            {'deleteDimension': {'range': {'sheetId': gid, 'dimension': 'ROWS', 'startIndex': a, 'endIndex': b}}}
+            for a, b in reversed(spans)
+        ]}).execute()
+    return sum(b - a for a, b in spans)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive les attributions retournées et interventions terminées.")
+    parser.add_argument('--horizon', type=int, default=None, help=f"jours (défaut : parametres ou {DEFAULT_HORIZON})")
+    parser.add_argument('--dry-run', action='store_true', help="compter sans rien déplacer")
+    args = parser.parse_args()
+
+    svc, sid = _connect()
+    horizon = args.horizon
+    if horizon is None:
+        params, _ = _read(svc, sid, 'parametres')
+        horizon = horizon_from(next((p.get('valeur') for p in params if p.get('cle') == 'archive_horizon_jours'), ''))
+    today = datetime.now(ZoneInfo('Europe/Paris')).date()
+    print(f"🗄️ Archivage des lignes closes depuis plus de {horizon} jours")
+    for sheet_name in ARCHIVABLE:
+        rows, _ = _read(svc, sid, sheet_name)
+        keep, moved = split_rows(sheet_name, rows, horizon, today)
+        n = sum(len(v) for v in moved.values())
+        print(f"  {sheet_name} : {n} ligne(s) à archiver")
+        if not n or args.dry_run:
+            continue
+        ensure_sheets(svc, sid, list(moved))
+        for name, archived in moved.items():
+            append_rows(svc, sid, name, archived)
+        # Archive écrite d'abord : une coupure ne perd rien (au pire un doublon).
+        # Puis suppression des seules lignes archivées : les lignes écrites par
+        # l'app pendant l'opération restent en place.
+        removed = delete_rows(svc, sid, sheet_name, [r for v in moved.values() for r in v])
+        sheets_backend.bump_meta(svc, sid, [sheet_name])
+        print(f"  ✅ {sheet_name} : {removed} ligne(s) retirée(s), {len(keep)} gardée(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,57 @@
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
 import streamlit as st
-from datetime import datetime
+from collections import Counter, deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import MappingProxyType
 from zoneinfo import ZoneInfo
 
+import archive
+import fleet
+import grille
+import quota
+import records
+import sheets_backend
+
+_log = logging.getLogger(__name__)
 _TZ = ZoneInfo('Europe/Paris')
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+
+# Backend : 'google' (défaut) ou 'fake' (classeur simulé, hors ligne) —
+# cf. sheets_backend. Le fake ne lit pas st.secrets.
+_BACKEND = sheets_backend.backend_kind(
+    None if os.environ.get('FLOTTE_BACKEND') else st.secrets
+)
 
 
 # CONNEXION GOOGLE SHEETS
+def _new_service():
+    """Client du backend, derrière le limiteur de quota partagé par le process."""
+    if _BACKEND == 'fake':
+        return quota.limit(sheets_backend.fake_service_from_env())
+    return quota.limit(sheets_backend.google_service(st.secrets))
+
+
 @st.cache_resource
 def get_sheets_service():
-    credentials = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=["https://www.googleapis.com/auth/spreadsheets"]
-    )
-    return build('sheets', 'v4', credentials=credentials)
+    return _new_service()
 
 
-SPREADSHEET_ID = st.secrets["google_sheets"]["spreadsheet_id"]
+if _BACKEND == 'fake':
+    SPREADSHEET_ID = os.environ.get('SPREADSHEET_ID', 'fake')
+else:
+    SPREADSHEET_ID = st.secrets["google_sheets"]["spreadsheet_id"]
 sheets_service = get_sheets_service()
 
 ALL_SHEET_NAMES = [
@@ -32,80 +66,1134 @@ ALL_SHEET_NAMES = [
 DISTRIB_EXT_ID = "1lHvCjEL-KZ0llBPKiZrWocOcHlcAoQkW5d72KShi1GY"
 
 
-@st.cache_data(ttl=60, show_spinner="Chargement des données...")
-def _load_all_sheets():
-    ranges = [f"{name}!A:Z" for name in ALL_SHEET_NAMES]
-    # Ne pas attraper les exceptions ici : si l'API échoue, Streamlit ne mettra
-    # pas le résultat vide en cache et réessaiera à la prochaine interaction.
-    result = sheets_service.spreadsheets().values().batchGet(
+# Cache par feuille : chaque feuille a sa propre entrée (TTL, version), si
+# bien qu'une écriture ne recharge que la feuille touchée — les 22 autres
+# restent servies depuis le cache.
+_SHEET_TTL = 60
+# Feuilles de référence, rarement modifiées : TTL plus long.
+_SHEET_TTLS = {name: 300 for name in (
+    'categories', 'services', 'categories_engins', 'categories_scooters',
+    'categories_golfettes', 'liens', 'parametres', 'contacts_wlg'
+)}
+_store_lock = threading.Lock()
+
+
+@st.cache_resource
+def _sheet_store():
+    """{feuille: entrée}, partagé entre sessions. Une entrée n'est jamais
+    modifiée : elle est remplacée (rows, index {_id: n° de ligne},
+    fetched_at, version incrémentée à chaque rechargement ou patch).
+    """
+    return {}
+
+
+def _parse_values(values):
+    return records.rows_from_values(values)
+
+
+# Numéro unique de chaque entrée construite par _set_entry, clé des calculs
+# dérivés (cf. _memo) ; la version, elle, repart du miroir si le cache est vidé.
+_serials = itertools.count(1)
+
+
+def _set_entry(sheet_name, rows, fetched_at=None, mirror=True, version=None, stamp=None, full_at=None):
+    store = _sheet_store()
+    old = store.get(sheet_name)
+    # Lignes compactes en lecture seule (records.Row), en-tête partagé.
+    rows = records.compact_rows(rows)
+    entry = {
+        'rows': rows,
+        # Ligne 1 = en-tête
+        'index': {row['_id']: i + 2 for i, row in enumerate(rows) if row.get('_id')},
+        'fetched_at': time.monotonic() if fetched_at is None else fetched_at,
+        'version': version or (old['version'] + 1 if old else 1),
+        'serial': next(_serials),
+        # Jeton _meta de la feuille correspondant à ces lignes (cf. _check_meta)
+        'stamp': stamp if stamp is not None else (old or {}).get('stamp'),
+        # Dernier rechargement complet (cf. _APPEND_SHEETS)
+        'full_at': full_at if full_at is not None else (old or {}).get('full_at', float('-inf')),
+    }
+    store[sheet_name] = entry
+    if mirror:
+        _mirror_store(sheet_name, entry, old)
+    else:
+        # Entrée reprise du miroir : il contient déjà ces lignes.
+        _mirrored[sheet_name] = entry['version']
+
+
+def _ttl(sheet_name):
+    # Si la sonde _meta fonctionne, le TTL n'est plus qu'un filet de sécurité.
+    return _SAFETY_TTL if _probe['ok'] else _SHEET_TTLS.get(sheet_name, _SHEET_TTL)
+
+
+def _has_pending(sheet_name):
+    return _write_queue()['pending'][sheet_name] > 0
+
+
+def _is_stale(sheet_name, now):
+    entry = _sheet_store().get(sheet_name)
+    if entry is None:
+        return True
+    # Écritures en attente (write-behind) : la feuille distante est en retard
+    # sur le cache, la relire ferait réapparaître l'ancien état.
+    if _has_pending(sheet_name):
+        return False
+    # Instantané servi pendant son rechargement en arrière-plan.
+    if sheet_name in _sync['loading']:
+        return False
+    return now - entry['fetched_at'] > _ttl(sheet_name)
+
+
+def _refresh(sheet_names):
+    """Recharge en 1 seul batchGet les feuilles absentes ou expirées.
+    Si l'API échoue, rien n'est mis en cache : l'exception remonte s'il
+    manque une feuille, sinon le cache est servi tel quel (hors ligne, cf.
+    offline_status) et on réessaiera dans _OFFLINE_RETRY s.
+
+    Sous _store_lock, la lecture est faite en 1 seul essai : une erreur
+    transitoire (429…) est retentée après avoir rendu le verrou, pour ne pas
+    bloquer les autres sessions pendant le backoff.
+    """
+    now = time.monotonic()
+    if now - _probe['at'] >= _PROBE_INTERVAL and now >= _sync['retry_at']:
+        # Hors du verrou : la sonde sert aussi de test de connexion.
+        _check_meta(now)
+    if not any(_is_stale(n, now) for n in sheet_names):
+        return
+    delay = 1.0
+    for attempt in range(_FETCH_RETRIES + 1):
+        if _refresh_locked(sheet_names, time.monotonic(), attempt == _FETCH_RETRIES):
+            return
+        time.sleep(delay + random.uniform(0, delay))
+        delay = min(delay * 2, _FETCH_BACKOFF_MAX)
+
+
+def _refresh_locked(sheet_names, now, last):
+    """Un essai de _refresh, sous _store_lock. Retourne False si la lecture
+    est à retenter (erreur transitoire, sauf hors ligne avec tout en cache)."""
+    with _store_lock:
+        # Une autre session a pu recharger pendant qu'on attendait le verrou.
+        stale = [n for n in sheet_names if _is_stale(n, now)]
+        if not stale:
+            return True
+        # Démarrage à froid : reprendre le miroir SQLite. Encore dans le TTL,
+        # il vaut une lecture ; expiré, il est servi tout de suite et
+        # rechargé en arrière-plan.
+        store = _sheet_store()
+        wall = time.time()
+        served = []
+        for name, (rows, version, fetched_wall, stamp) in _mirror_load([n for n in stale if n not in store]).items():
+            age = wall - fetched_wall
+            fresh = stamp == _probe['stamps'].get(name) if _probe['ok'] else age <= _ttl(name)
+            fetched_at = now - min(age, _ttl(name)) if fresh else float('-inf')
+            _set_entry(name, rows, fetched_at, mirror=False, version=version, stamp=stamp, full_at=fetched_at)
+            if not fresh:
+                served.append(name)
+        if served and now >= _sync['retry_at']:
+            _refresh_in_background(served)
+        stale = [n for n in stale if _is_stale(n, now)]
+        if not stale:
+            return True
+        if now < _sync['retry_at']:
+            # Hors ligne (sonde ou lecture en échec il y a moins de
+            # _OFFLINE_RETRY s) : pas de nouvel essai d'ici là.
+            if all(n in store for n in stale):
+                return True
+            raise ConnectionError(_sync['error'])
+        try:
+            with st.spinner("Chargement des données..."):
+                _fetch(quota.single_shot(sheets_service), stale, now)
+        except Exception as e:
+            cached = all(n in store for n in stale)
+            if not last and quota.is_transient(e) and not (cached and _is_offline_error(e)):
+                return False
+            if not cached:
+                raise
+            _set_offline(e, now)
+    return True
+
+
+def _fetch(service, stale, now):
+    """Lit stale (complètes, ou incrémentales cf. _APPEND_SHEETS) et met le
+    cache à jour. Appelé sous _store_lock, avec un client à 1 seul essai
+    (quota.single_shot) : les nouveaux essais se font hors du verrou."""
+    store = _sheet_store()
+    incr = [n for n in stale if _append_ok(n, now)]
+    full = [n for n in stale if n not in incr]
+    ranges = [f"{n}!A:Z" for n in full]
+    for n in incr:
+        size = len(store[n]['rows'])
+        # Échantillon du début (en-tête compris) + dernière ligne connue et suivantes.
+        ranges += [f"{n}!A1:Z{min(size, _APPEND_SAMPLE) + 1}", f"{n}!A{size + 1}:Z"]
+    result = service.spreadsheets().values().batchGet(
         spreadsheetId=SPREADSHEET_ID, ranges=ranges
     ).execute()
-    data = {}
-    for i, vr in enumerate(result.get('valueRanges', [])):
-        values = vr.get('values', [])
-        if not values or len(values) < 2:
-            data[ALL_SHEET_NAMES[i]] = []
+    value_ranges = result.get('valueRanges', [])
+    for name, vr in zip(full, value_ranges):
+        _set_entry(name, _parse_values(vr.get('values', [])), stamp=_probe['stamps'].get(name), full_at=now)
+    reload = []
+    for i, name in enumerate(incr):
+        head, tail = value_ranges[len(full) + 2 * i:len(full) + 2 * i + 2]
+        entry = store[name]
+        added = _appended_rows(entry['rows'], head.get('values', []), tail.get('values', []))
+        if added is None:
+            reload.append(name)
+        elif added:
+            _set_entry(name, entry['rows'] + added, stamp=_probe['stamps'].get(name))
         else:
-            headers = values[0]
-            data[ALL_SHEET_NAMES[i]] = [dict(zip(headers, row + [''] * (len(headers) - len(row)))) for row in values[1:]]
+            # Rien de nouveau : on garde l'entrée (et ses calculs dérivés).
+            store[name] = {**entry, 'fetched_at': now, 'stamp': _probe['stamps'].get(name, entry['stamp'])}
+    if reload:
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=SPREADSHEET_ID, ranges=[f"{n}!A:Z" for n in reload]
+        ).execute()
+        for name, vr in zip(reload, result.get('valueRanges', [])):
+            _set_entry(name, _parse_values(vr.get('values', [])), stamp=_probe['stamps'].get(name), full_at=now)
+    _set_online()
+    # Lignes sans _id (saisies à la main, imports) : numérotées dès qu'on les voit.
+    sans_id = {n: store[n]['rows'] for n in stale if len(store[n]['index']) < len(store[n]['rows'])}
+    if sans_id:
+        try:
+            _backfill_ids(sans_id, service)
+        except Exception as e:
+            # Le cache reste celui de la feuille (rien n'a été écrit) : nouvel
+            # essai au prochain rechargement de ces feuilles.
+            _log.warning("Numérotation _id impossible (%s) : %s", ', '.join(sans_id), e)
+
+
+# DÉMARRAGE À FROID ET MODE HORS LIGNE
+# Le miroir SQLite sert d'instantané local : après un redémarrage, ses
+# feuilles sont servies sans attendre l'API et rechargées par un thread. Si
+# Google Sheets est injoignable, les dernières données connues restent
+# affichées (bandeau dans app.py) et l'API n'est retentée que toutes les
+# _OFFLINE_RETRY s, par la sonde _meta (1 seul essai, délai court, hors du
+# verrou). Les écritures faites entre-temps passent par la file du
+# write-behind (cf. _deferred) et partent au retour de la connexion.
+_OFFLINE_RETRY = 30
+# Nouveaux essais d'une lecture en 429, hors de _store_lock (cf. _refresh)
+_FETCH_RETRIES = 5
+_FETCH_BACKOFF_MAX = 32.0
+_PROBE_TIMEOUT = 5
+# Partagé par les sessions du process : feuilles en cours de rechargement
+# en arrière-plan, début de la panne (horloge murale) et dernière erreur.
+_sync = {'loading': set(), 'offline_since': None, 'error': '', 'retry_at': float('-inf')}
+
+
+def _set_offline(error, now):
+    if _sync['offline_since'] is None:
+        _sync['offline_since'] = time.time()
+    _sync['error'] = str(error)
+    _sync['retry_at'] = now + _OFFLINE_RETRY
+
+
+def _set_online():
+    _sync['offline_since'] = None
+    _sync['error'] = ''
+    _sync['retry_at'] = float('-inf')
+
+
+def _is_offline_error(e):
+    """Erreur réseau ou 5xx (un 4xx, ex. plage inconnue, n'est pas une panne)."""
+    status = getattr(getattr(e, 'resp', None), 'status', None)
+    return int(status) >= 500 if status is not None else isinstance(e, (OSError, TimeoutError))
+
+
+@st.cache_resource
+def _probe_service():
+    """Client de la sonde : 1 seul essai et délai réseau court. Dédié, car
+    appelé hors de _store_lock (le client Google n'est pas thread-safe)."""
+    if _BACKEND == 'fake':
+        return quota.single_shot(sheets_service)
+    return quota.single_shot(sheets_backend.google_service(st.secrets, timeout=_PROBE_TIMEOUT))
+
+
+def _refresh_in_background(sheet_names):
+    """Recharge sheet_names dans un thread ; d'ici là, elles ne sont pas
+    considérées comme expirées (cf. _is_stale)."""
+    names = [n for n in sheet_names if n not in _sync['loading']]
+    if not names:
+        return
+    _sync['loading'].update(names)
+
+    def run():
+        # Client dédié : le client Google (httplib2) n'est pas thread-safe.
+        delay = 1.0
+        try:
+            service = quota.single_shot(sheets_service if _BACKEND == 'fake' else _new_service())
+            for attempt in range(_FETCH_RETRIES + 1):
+                try:
+                    with _store_lock:
+                        _fetch(service, names, time.monotonic())
+                    break
+                except Exception as e:
+                    if attempt == _FETCH_RETRIES or _is_offline_error(e) or not quota.is_transient(e):
+                        raise
+                # 429 : attendre hors du verrou.
+                time.sleep(delay + random.uniform(0, delay))
+                delay = min(delay * 2, _FETCH_BACKOFF_MAX)
+        except Exception as e:
+            _set_offline(e, time.monotonic())
+        finally:
+            _sync['loading'].difference_update(names)
+
+    threading.Thread(target=run, daemon=True, name='flotte-refresh').start()
+
+
+def offline_status():
+    """None si la dernière lecture a réussi, sinon {'since': début de la
+    panne (datetime, heure de Paris), 'error': message}."""
+    if _sync['offline_since'] is None:
+        return None
+    return {'since': datetime.fromtimestamp(_sync['offline_since'], _TZ), 'error': _sync['error']}
+
+
+# SYNCHRO INCRÉMENTALE
+# Feuilles-journaux qui grossissent surtout par ajouts : au lieu de tout
+# relire (A:Z), on ne lit que la dernière ligne connue et les suivantes, plus
+# un échantillon du début de la feuille. Si l'échantillon ou la dernière
+# ligne ne correspondent plus au cache (modification, suppression), on
+# recharge la feuille en entier. La lecture incrémentale ne sert qu'aux
+# expirations du TTL : si le jeton _meta a bougé, une autre instance a écrit
+# (peut-être au milieu de la feuille) et on relit tout. Un rechargement
+# complet reste fait toutes les _APPEND_FULL_TTL s pour les saisies faites
+# à la main au milieu de la feuille.
+_APPEND_SHEETS = {
+    'distribution_clefs', 'carburant', 'interventions', 'interventions_engins',
+    'interventions_scooters', 'interventions_golfettes',
+}
+_APPEND_SAMPLE = 20
+_APPEND_FULL_TTL = 900
+
+
+def _append_ok(sheet_name, now):
+    entry = _sheet_store().get(sheet_name)
+    return (
+        sheet_name in _APPEND_SHEETS and entry is not None and bool(entry['rows'])
+        and now - entry.get('full_at', float('-inf')) < _APPEND_FULL_TTL
+        and entry.get('stamp') == _probe['stamps'].get(sheet_name)
+    )
+
+
+def _digest(rows, width):
+    h = hashlib.sha1()
+    for row in rows:
+        h.update(json.dumps((list(row) + [''] * width)[:width], ensure_ascii=False).encode())
+    return h.hexdigest()
+
+
+def _appended_rows(rows, head, tail):
+    """Lignes ajoutées depuis le cache ([] si aucune), ou None s'il faut tout
+    recharger. head : lignes 1..k+1 de la feuille ; tail : dernière ligne
+    connue et suivantes."""
+    if not head or not tail:
+        return None
+    headers = head[0]
+    if list(rows[0].keys()) != headers:
+        return None
+    width = len(headers)
+    sample = head[1:] + [[]] * (min(len(rows), _APPEND_SAMPLE) - len(head) + 1)
+    cached = [[r.get(h, '') for h in headers] for r in rows[:len(sample)] + rows[-1:]]
+    if _digest(sample + tail[:1], width) != _digest(cached, width):
+        return None
+    return _parse_values([headers] + tail[1:])
+
+
+# DÉTECTION DE CHANGEMENTS
+# Feuille _meta : une ligne par feuille (feuille | version). Chaque écriture de
+# l'app y pose un nouveau jeton, dans le même appel quand c'est possible. Une
+# sonde (lecture de _meta, quelques octets) toutes les _PROBE_INTERVAL s dit
+# quelles feuilles ont bougé : seules celles-là sont rechargées. Les saisies
+# faites à la main dans Google Sheets ne changent pas le jeton : elles sont
+# vues au bout de _SAFETY_TTL.
+_META_SHEET = sheets_backend.META_SHEET
+_PROBE_INTERVAL = 5
+_SAFETY_TTL = 300
+# Partagé par les sessions du process : dernière sonde, {feuille: n° de ligne
+# dans _meta}, {feuille: jeton}, ok = _meta lisible.
+_probe = {'at': float('-inf'), 'rows': {}, 'stamps': {}, 'ok': False}
+_probe_lock = threading.Lock()
+
+
+def _read_meta(values):
+    rows = {r[0]: i + 2 for i, r in enumerate(values[1:]) if r and r[0]}
+    _probe['rows'] = rows
+    _probe['stamps'] = {r[0]: (r[1] if len(r) > 1 else '') for r in values[1:] if r and r[0]}
+    _probe['ok'] = bool(rows)
+
+
+def _check_meta(now):
+    """Sonde _meta et expire les feuilles en cache dont le jeton a bougé.
+    Une sonde à la fois ; en cas de panne réseau, passe en mode hors ligne."""
+    if now - _probe['at'] < _PROBE_INTERVAL or not _probe_lock.acquire(blocking=False):
+        return
+    try:
+        _probe['at'] = now
+        values = _probe_service().spreadsheets().values().get(
+            spreadsheetId=SPREADSHEET_ID, range=f"{_META_SHEET}!A:B"
+        ).execute().get('values', [])
+    except Exception as e:
+        _probe['ok'] = False
+        if _is_offline_error(e):
+            _set_offline(e, now)
+        return
+    finally:
+        _probe_lock.release()
+    if _sync['offline_since'] is not None:
+        _set_online()
+    _read_meta(values)
+    store = _sheet_store()
+    for name, stamp in _probe['stamps'].items():
+        entry = store.get(name)
+        if entry and entry.get('stamp') != stamp and not _has_pending(name):
+            _invalidate(name)
+
+
+def _init_meta(values):
+    """Crée l'en-tête de _meta et une ligne par feuille manquante ; values :
+    contenu actuel de _meta (A:B)."""
+    known = {r[0] for r in values[1:] if r}
+    header = [] if values else [['feuille', 'version']]
+    added = [[name, _new_id()] for name in ALL_SHEET_NAMES if name not in known]
+    if header or added:
+        sheets_service.spreadsheets().values().update(
+            spreadsheetId=SPREADSHEET_ID, range=f"{_META_SHEET}!A{len(values) + 1}",
+            valueInputOption="RAW", body={"values": header + added}
+        ).execute()
+    _read_meta(values + header + added)
+
+
+def _bump_ranges(sheet_names):
+    """Plages _meta à joindre à une écriture : nouveau jeton pour chaque feuille."""
+    ranges = []
+    for name in sheet_names:
+        row = _probe['rows'].get(name)
+        if row:
+            stamp = _new_id()
+            _probe['stamps'][name] = stamp
+            ranges.append({'range': f"{_META_SHEET}!B{row}", 'values': [[stamp]]})
+    return ranges
+
+
+def _bump(sheet_names):
+    """Signale une modification quand l'écriture n'a pas pu l'embarquer (append,
+    réécriture complète). Sans gravité si ça échoue : le TTL rattrape."""
+    ranges = _bump_ranges(sheet_names)
+    if not ranges:
+        return
+    try:
+        sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"valueInputOption": "RAW", "data": ranges}
+        ).execute()
+    except Exception:
+        pass
+
+
+def _invalidate(sheet_name):
+    """Expire la feuille : elle sera rechargée (seule) au prochain accès."""
+    entry = _sheet_store().get(sheet_name)
+    if entry:
+        _sheet_store()[sheet_name] = {**entry, 'fetched_at': float('-inf')}
+    _mirror_expire(sheet_name)
+
+
+def _entry(sheet_name):
+    """Entrée de cache à jour de la feuille (ou son état en attente dans la
+    transaction en cours). Lecture seule."""
+    staged = _staged(sheet_name)
+    if staged is not None:
+        return staged
+    _refresh([sheet_name])
+    return _sheet_store()[sheet_name]
+
+
+def _load_all_sheets():
+    """{feuille: lignes} pour toutes les feuilles + '_index' {feuille: {_id: n° de ligne}}.
+    Seules les feuilles absentes ou expirées sont rechargées. Lecture seule.
+    """
+    _refresh(ALL_SHEET_NAMES)
+    store = _sheet_store()
+    data = {name: store[name]['rows'] for name in ALL_SHEET_NAMES}
+    data['_index'] = {name: store[name]['index'] for name in ALL_SHEET_NAMES}
     return data
 
 
+class _LazySheets(Mapping):
+    """{feuille: lignes} en lecture seule ; chaque accès passe par _entry, donc
+    une feuille non préchargée est lue (seule) au premier accès."""
+
+    def __getitem__(self, sheet_name):
+        if sheet_name not in ALL_SHEET_NAMES:
+            raise KeyError(sheet_name)
+        return _entry(sheet_name)['rows']
+
+    def __iter__(self):
+        return iter(ALL_SHEET_NAMES)
+
+    def __len__(self):
+        return len(ALL_SHEET_NAMES)
+
+
+def load_sheets(sheet_names):
+    """Précharge sheet_names (un seul batchGet pour celles absentes ou
+    expirées) et renvoie une vue paresseuse de toutes les feuilles."""
+    _refresh([n for n in sheet_names if n in ALL_SHEET_NAMES])
+    return _LazySheets()
+
+
+def noms(sheet_name):
+    """Colonne 'nom' non vide d'une feuille de référence (catégories, services)."""
+    return _derived(sheet_name, 'noms', lambda e: tuple(r.get('nom', '') for r in e['rows'] if r.get('nom')))
+
+
+def parametres_dict():
+    """Feuille parametres en {cle: valeur}, en lecture seule."""
+    return _derived('parametres', 'dict', lambda e: MappingProxyType(
+        {r['cle']: r.get('valeur', '') for r in e['rows'] if r.get('cle')}
+    ))
+
+
+@st.cache_resource
+def _versioned_slots():
+    return {'lock': threading.Lock()}
+
+
+def _versioned(key, sheet_names, build):
+    """build({feuille: lignes}, aujourd'hui), partagé par toutes les sessions
+    du process et recalculé seulement quand la version d'une des feuilles
+    change (ou toutes les 5 min : « en cours aujourd'hui » et les alertes
+    dépendent de l'heure)."""
+    _refresh(list(sheet_names))
+    store = _sheet_store()
+    entries = {name: store[name] for name in sheet_names}
+    now = datetime.now(_TZ)
+    version = (tuple(e['version'] for e in entries.values()), now.date(), int(time.time() // 300))
+    slots = _versioned_slots()
+    with slots['lock']:
+        slot = slots.get(key)
+        if slot is None or slot[0] != version:
+            slot = slots[key] = (version, build({n: e['rows'] for n, e in entries.items()}, now.date()))
+        return slot[1]
+
+
+def fleet_state():
+    """fleet.FleetState courant (cf. _versioned)."""
+    return _versioned('fleet', fleet.SHEETS, fleet.build)
+
+
+def alertes_state():
+    """Alertes par type d'actif (fleet.build_alertes) : ne dépend que des
+    feuilles d'attributions, pour la sidebar de toutes les pages."""
+    return _versioned('alertes', fleet.ALERT_SHEETS, lambda data, today: fleet.build_alertes(data))
+
+
 def read_sheet(sheet_name):
     result = sheets_service.spreadsheets().values().get(
         spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A:Z"
     ).execute()
-    values = result.get('values', [])
-    if not values or len(values) < 2:
-        return []
-    headers = values[0]
-    return [dict(zip(headers, row + [''] * (len(headers) - len(row)))) for row in values[1:]]
+    return _parse_values(result.get('values', []))
 
 
 def _cached(sheet_name):
-    """Lecture depuis le cache _load_all_sheets (0 appel API si cache valide)."""
+    """Lecture depuis le cache par feuille (0 appel API si à jour). Renvoie
+    les lignes partagées de l'entrée, sans copie : lecture seule (records.Row).
+    Pour modifier, copier la liste et remplacer les lignes touchées par des
+    dicts ({**row, ...}), puis écrire (write_sheet) : l'entrée est remplacée,
+    jamais modifiée, et sa version suit.
+    """
     try:
-        return _load_all_sheets().get(sheet_name, [])
+        return _entry(sheet_name)['rows']
     except Exception:
         return []
 
 
-def write_sheet(sheet_name, data, prev_size=None):
-    """Réécrit toute la feuille. Si prev_size est connu et <= len(data),
-    on évite l'appel clear() résiduel (1 appel API au lieu de 2).
+class _Arg:
+    """Argument passé tel quel à une fonction lru_cache, sans compter dans la clé."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return 0
+
+    def __eq__(self, other):
+        return isinstance(other, _Arg)
+
+
+@functools.lru_cache(maxsize=512)
+def _memo_cached(serial, key, arg):
+    entry, build = arg.value
+    # arg reste dans la clé du LRU : ne pas y retenir l'entrée (ses lignes).
+    arg.value = None
+    return build(entry)
+
+
+def _memo(entry, key, build):
+    """build(entry), calculé une fois par entrée de cache et par key, pour
+    toutes les sessions : une entrée est remplacée (jamais modifiée) à chaque
+    changement, la clé suit donc son numéro (serial). Les plus anciens
+    calculs sortent du LRU. L'état en attente d'une transaction n'a pas de
+    numéro : calculé à chaque fois."""
+    if entry.get('serial') is None:
+        return build(entry)
+    return _memo_cached(entry['serial'], key, _Arg((entry, build)))
+
+
+def _derived(sheet_name, key, build):
+    """Valeur calculée à partir de l'entrée de cache de la feuille (cf. _memo)."""
+    try:
+        entry = _entry(sheet_name)
+    except Exception:
+        entry = {'rows': []}
+    return _memo(entry, key, build)
+
+
+def _attr_id_key(sheet_name):
+    return 'numero_serie' if sheet_name in ('attributions_engins', 'attributions_golfettes') else 'immatriculation'
+
+
+def _entry_records(sheet_name, entry):
+    return _memo(entry, 'records', lambda e: records.from_rows(e['rows'], _attr_id_key(sheet_name)))
+
+
+def attribution_records(sheet_name):
+    """Attributions typées de la feuille (records.Attribution, même ordre que
+    les lignes)."""
+    return _derived(sheet_name, 'records', lambda e: _entry_records(sheet_name, e))
+
+
+def attribution_index(sheet_name):
+    """records.AttributionIndex de la feuille (zone du jour / prochaine zone)."""
+    return _derived(sheet_name, 'interval_index',
+                    lambda e: records.AttributionIndex(_entry_records(sheet_name, e)))
+
+
+def week_grid(sheet_name, monday):
+    """records.week_grid de la feuille pour la semaine du lundi donné, mis en
+    cache par (entrée de cache, semaine) : naviguer d'une semaine à l'autre
+    puis revenir ne recalcule rien."""
+    return _derived(sheet_name, ('week_grid', monday),
+                    lambda e: records.week_grid(_entry_records(sheet_name, e), monday))
+
+
+def week_table(sheet_name, key, build):
+    """HTML d'une grille de semaine (cf. grille.py), gardé avec l'entrée de
+    cache de la feuille d'attributions : key porte le reste (page, semaine,
+    jour, actifs affichés, services…). Le HTML n'utilise que des classes CSS,
+    le thème n'en fait donc pas partie."""
+    return _derived(sheet_name, ('week_table', key), lambda e: build())
+
+
+def slot_week_table(sheet_name, label, assets, monday, today, services):
+    """grille.slot_table de la semaine pour la feuille d'attributions (engins
+    ou golfettes), via week_table. assets : [(identifiant, sous-titre)]."""
+    assets, services = tuple(assets), tuple(services)
+    days = [monday + timedelta(days=i) for i in range(7)]
+    return week_table(
+        sheet_name, ('slots', label, monday, today, assets, services),
+        lambda: grille.slot_table(label, assets, week_grid(sheet_name, monday), days, today, services),
+    )
+
+
+def _read_back(v):
+    """Valeur telle que l'API la relira après une écriture RAW."""
+    if v is None:
+        return ''
+    if isinstance(v, bool):
+        return 'TRUE' if v else 'FALSE'
+    return str(v)
+
+
+def _patch_rows(sheet_name, rows, headers):
+    """Remplace le cache de la feuille par les lignes qu'on vient d'écrire
+    (sans relecture). L'échéance du TTL est conservée, pour borner le retard
+    sur les écritures faites hors de l'app.
+    """
+    entry = _sheet_store().get(sheet_name)
+    _set_entry(
+        sheet_name,
+        records.compact_rows([{h: _read_back(row.get(h, '')) for h in headers} for row in rows], headers),
+        entry['fetched_at'] if entry else None,
+        stamp=_probe['stamps'].get(sheet_name)
+    )
+
+
+# MIROIR SQLITE
+# Copie locale de chaque feuille, mise à jour à chaque rechargement ou écriture
+# confirmée par l'API (Google Sheets reste la référence) : seules les lignes
+# qui ont changé depuis l'entrée précédente sont réécrites. Permet de repartir
+# sans batchGet après un redémarrage, tant que le TTL court, et de faire des
+# requêtes indexées (query_sheet).
+_MIRROR_PATH = os.environ.get(
+    'FLOTTE_SQLITE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.flotte_cache.sqlite3')
+)
+# Colonnes indexées ; 'date' y est stockée au format ISO (tri et bornes).
+_MIRROR_COLS = ('numero_serie', 'immatriculation', 'date', 'retourne')
+_mirror_lock = threading.Lock()
+# {feuille: version de l'entrée que le miroir contient}, cf. _mirror_store
+_mirrored = {}
+
+
+@st.cache_resource
+def _mirror():
+    """Connexion SQLite partagée, None si le fichier est inaccessible (le
+    miroir est alors simplement désactivé)."""
+    try:
+        conn = sqlite3.connect(_MIRROR_PATH, check_same_thread=False)
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS sheets (
+                name TEXT PRIMARY KEY, headers TEXT, version INTEGER, fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                sheet TEXT, pos INTEGER, _id TEXT,
+                numero_serie TEXT, immatriculation TEXT, date TEXT, retourne TEXT,
+                data TEXT,
+                PRIMARY KEY (sheet, pos)
+            );
+            CREATE INDEX IF NOT EXISTS rows_id ON rows (sheet, _id);
+            CREATE INDEX IF NOT EXISTS rows_numero_serie ON rows (sheet, numero_serie);
+            CREATE INDEX IF NOT EXISTS rows_immatriculation ON rows (sheet, immatriculation);
+            CREATE INDEX IF NOT EXISTS rows_date ON rows (sheet, date);
+            CREATE INDEX IF NOT EXISTS rows_retourne ON rows (sheet, retourne);
+        ''')
+        try:
+            # Miroirs créés avant l'ajout du jeton _meta
+            conn.execute("ALTER TABLE sheets ADD COLUMN stamp TEXT")
+        except sqlite3.OperationalError:
+            pass
+        return conn
+    except sqlite3.Error:
+        return None
+
+
+def _iso_date(value):
+    """'dd/mm/YYYY' (ou date) → 'YYYY-MM-DD' ; valeur inchangée si illisible."""
+    if hasattr(value, 'strftime'):
+        return value.strftime("%Y-%m-%d")
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return value
+
+
+def _mirror_store(sheet_name, entry, old=None):
+    """Écrit entry dans le miroir. Si celui-ci contient old (entrée remplacée)
+    avec le même en-tête, seules les lignes différentes sont réécrites et les
+    lignes en trop supprimées ; sinon la feuille est réécrite en entier."""
+    conn = _mirror()
+    if conn is None:
+        return
+    rows = entry['rows']
+    headers = list(rows[0].keys()) if rows else []
+    base = old['rows'] if old is not None and _mirrored.get(sheet_name) == old['version'] else None
+    if base and rows and list(base[0].keys()) == headers:
+        # records.Row : tuples de valeurs comparés directement.
+        changed = [i for i, r in enumerate(rows) if i >= len(base) or base[i]._values != r._values]
+        clear = ("DELETE FROM rows WHERE sheet = ? AND pos > ?", (sheet_name, len(rows) + 1))
+    else:
+        changed = range(len(rows))
+        clear = ("DELETE FROM rows WHERE sheet = ?", (sheet_name,))
+    # Horodatage monotone → horloge murale, pour survivre au redémarrage.
+    fetched_wall = max(time.time() - (time.monotonic() - entry['fetched_at']), 0.0)
+    _mirrored.pop(sheet_name, None)
+    try:
+        with _mirror_lock, conn:
+            conn.execute(*clear)
+            conn.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [_mirror_row(sheet_name, i + 2, rows[i], headers) for i in changed]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sheets (name, headers, version, fetched_at, stamp) VALUES (?, ?, ?, ?, ?)",
+                (sheet_name, json.dumps(headers, ensure_ascii=False), entry['version'], fetched_wall, entry.get('stamp'))
+            )
+        _mirrored[sheet_name] = entry['version']
+    except sqlite3.Error:
+        pass
+
+
+def _mirror_row(sheet_name, pos, r, headers):
+    return (
+        sheet_name, pos, r.get('_id', ''), r.get('numero_serie', ''),
+        r.get('immatriculation', ''), _iso_date(r.get('date', '')), r.get('retourne', ''),
+        json.dumps([r.get(h, '') for h in headers], ensure_ascii=False),
+    )
+
+
+def _mirror_expire(sheet_name):
+    conn = _mirror()
+    if conn is None:
+        return
+    try:
+        with _mirror_lock, conn:
+            conn.execute("UPDATE sheets SET fetched_at = 0 WHERE name = ?", (sheet_name,))
+    except sqlite3.Error:
+        pass
+
+
+def _mirror_load(sheet_names):
+    """{feuille: (lignes, version, fetched_at murale, jeton _meta)} depuis le miroir."""
+    conn = _mirror()
+    if conn is None or not sheet_names:
+        return {}
+    marks = ','.join('?' * len(sheet_names))
+    try:
+        with _mirror_lock:
+            meta = {
+                name: (json.loads(headers), version, fetched_at, stamp)
+                for name, headers, version, fetched_at, stamp in conn.execute(
+                    f"SELECT name, headers, version, fetched_at, stamp FROM sheets WHERE name IN ({marks})", sheet_names
+                )
+            }
+            out = {name: ([], version, fetched_at, stamp) for name, (_, version, fetched_at, stamp) in meta.items()}
+            for sheet, data in conn.execute(
+                f"SELECT sheet, data FROM rows WHERE sheet IN ({marks}) ORDER BY sheet, pos", sheet_names
+            ):
+                out[sheet][0].append(dict(zip(meta[sheet][0], json.loads(data))))
+    except sqlite3.Error:
+        return {}
+    return out
+
+
+def query_sheet(sheet_name, date_min=None, date_max=None, **equals):
+    """Lignes de la feuille filtrées via les index du miroir SQLite, dans
+    l'ordre de la feuille (dicts modifiables, à la différence de _cached).
+
+    equals : égalité sur numero_serie, immatriculation, date, retourne ou _id.
+    date_min / date_max (date ou 'dd/mm/YYYY') bornent la colonne date.
     """
+    unknown = set(equals) - {'_id', *_MIRROR_COLS}
+    if unknown:
+        raise ValueError(f"Colonnes non indexées : {sorted(unknown)}")
+    if 'date' in equals:
+        equals['date'] = _iso_date(equals['date'])
+    lo = _iso_date(date_min) if date_min else None
+    hi = _iso_date(date_max) if date_max else None
     try:
-        if not data:
-            # Safety: si le caller savait qu'il y avait 0 lignes (prev_size=0)
-            # et nous demande d'écrire 0 lignes, c'est un no-op — ne pas wipe.
-            # Évite la perte des données quand le cache renvoie [] par erreur
-            # API transitoire et qu'un delete_X enchaîne avec write_sheet([], 0).
-            if prev_size == 0:
-                return
-            # Préserver la ligne d'en-tête : on n'efface que les lignes de données.
-            sheets_service.spreadsheets().values().clear(
-                spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A2:Z10000"
-            ).execute()
-            return
-        headers = list(dict.fromkeys(k for row in data for k in row.keys()))
-        values = [headers] + [[row.get(h, '') for h in headers] for row in data]
-        # 1. Écrire depuis A1 (données valides immédiatement)
-        sheets_service.spreadsheets().values().update(
-            spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A1",
-            valueInputOption="RAW", body={"values": values}
+        entry = _entry(sheet_name)
+    except Exception:
+        return []
+    conn = _mirror()
+    if conn is not None:
+        sql = "SELECT data FROM rows WHERE sheet = ?" + ''.join(f" AND {c} = ?" for c in equals)
+        params = [sheet_name, *equals.values()]
+        if lo:
+            sql += " AND date >= ?"
+            params.append(lo)
+        if hi:
+            sql += " AND date <= ?"
+            params.append(hi)
+        try:
+            with _mirror_lock:
+                found = conn.execute(
+                    "SELECT headers FROM sheets WHERE name = ? AND version = ?", (sheet_name, entry['version'])
+                ).fetchone()
+                if found:
+                    headers = json.loads(found[0])
+                    return [dict(zip(headers, json.loads(d))) for (d,) in conn.execute(sql + " ORDER BY pos", params)]
+        except sqlite3.Error:
+            pass
+    # Miroir indisponible ou en retard sur le cache : filtrage en mémoire.
+    out = []
+    for r in entry['rows']:
+        d = _iso_date(r.get('date', ''))
+        if all((d if c == 'date' else r.get(c, '')) == v for c, v in equals.items()) \
+                and (not lo or d >= lo) and (not hi or d <= hi):
+            out.append(dict(r))
+    return out
+
+
+def _col_letter(i):
+    """Index de colonne 0-based → lettre A1 (0 → A, 25 → Z, 26 → AA)."""
+    letters = ''
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        letters = chr(65 + r) + letters
+    return letters
+
+
+def _cell_str(row, c):
+    v = row[c] if c < len(row) else ''
+    return '' if v is None else str(v)
+
+
+def _row_ranges(sheet_name, row_number, old_row, new_row):
+    """Plages A1 des cellules modifiées d'une ligne ; les cellules modifiées
+    contiguës sont regroupées en une seule plage."""
+    ranges = []
+    width = max(len(new_row), len(old_row))
+    c = 0
+    while c < width:
+        if _cell_str(new_row, c) == _cell_str(old_row, c):
+            c += 1
+            continue
+        start = c
+        while c < width and _cell_str(new_row, c) != _cell_str(old_row, c):
+            c += 1
+        ranges.append({
+            'range': f"{sheet_name}!{_col_letter(start)}{row_number}:{_col_letter(c - 1)}{row_number}",
+            'values': [[new_row[k] if k < len(new_row) else '' for k in range(start, c)]],
+        })
+    return ranges
+
+
+def _diff_ranges(sheet_name, old_values, new_values):
+    """Plages A1 à réécrire pour passer de old_values à new_values
+    (grilles [en-tête] + lignes).
+
+    Retourne None si des lignes ont disparu : les suivantes sont décalées,
+    seule une réécriture complète est sûre.
+    """
+    if len(new_values) < len(old_values):
+        return None
+    data = []
+    for r, new_row in enumerate(new_values):
+        old_row = old_values[r] if r < len(old_values) else []
+        data += _row_ranges(sheet_name, r + 1, old_row, new_row)
+    return data
+
+
+def _delta_write(sheet_name, values):
+    """Tente une écriture différentielle par rapport au cache. Retourne False
+    si elle n'est pas applicable (cache indisponible, colonnes réordonnées,
+    lignes supprimées) — le caller fait alors une réécriture complète.
+    """
+    try:
+        snapshot = _entry(sheet_name)['rows']
+    except Exception:
+        return False
+    old_headers = list(dict.fromkeys(k for row in snapshot for k in row.keys()))
+    if values[0][:len(old_headers)] != old_headers:
+        return False
+    old_values = ([old_headers] if old_headers else []) + [[row.get(h, '') for h in old_headers] for row in snapshot]
+    ranges = _diff_ranges(sheet_name, old_values, values)
+    if ranges is None:
+        return False
+    if ranges:
+        sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"valueInputOption": "RAW", "data": ranges + _bump_ranges([sheet_name])}
         ).execute()
-        # 2. Supprimer les lignes résiduelles seulement si on a rétréci
-        if prev_size is None or prev_size > len(data):
+    return True
+
+
+# WRITE-BEHIND (optionnel : FLOTTE_WRITE_BEHIND=1)
+# Les écritures sont appliquées tout de suite au cache puis persistées par un
+# thread en arrière-plan : plus d'attente sur le spinner, et une erreur
+# 429/5xx transitoire est retentée (backoff exponentiel) au lieu de perdre
+# l'action. Chaque lot est journalisé sur disque avant d'être acquitté, et
+# rejoué au redémarrage. Un seul worker qui traite la file dans l'ordre :
+# l'ordre des écritures par feuille est garanti. Seules les modifications et
+# suppressions (repérées par _id) sont écrites par position ; les ajouts
+# partent en values().append, vérifiés par _id avant tout nouvel essai.
+_WRITE_BEHIND = os.environ.get('FLOTTE_WRITE_BEHIND', '') not in ('', '0')
+_JOURNAL_PATH = os.environ.get(
+    'FLOTTE_JOURNAL', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.flotte_journal.jsonl')
+)
+_BACKOFF_MAX = 60
+
+
+def _deferred():
+    """Écritures mises en file : mode write-behind, ou API injoignable."""
+    return _WRITE_BEHIND or _sync['offline_since'] is not None
+
+
+def _write_op(fn):
+    """En mode différé (cf. _deferred), exécute l'écriture dans une transaction
+    implicite dont le flush met le lot en file au lieu d'appeler l'API."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _deferred() or _in_transaction():
+            return fn(*args, **kwargs)
+        with transaction():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _journal_append(record):
+    with open(_JOURNAL_PATH, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _journal_pending():
+    """Lots journalisés mais pas encore acquittés, dans l'ordre d'arrivée."""
+    try:
+        with open(_JOURNAL_PATH, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    jobs, done = {}, set()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # ligne tronquée (arrêt pendant l'écriture)
+        if 'done' in record:
+            done.add(record['done'])
+        else:
+            jobs[record['id']] = record
+    return [job for job_id, job in jobs.items() if job_id not in done]
+
+
+@st.cache_resource
+def _write_queue():
+    """File du write-behind, partagée entre sessions, et son thread worker.
+    Les lots restés dans le journal sont remis en file au démarrage."""
+    q = {'jobs': deque(), 'cond': threading.Condition(), 'pending': Counter(), 'failed': 0, 'last_error': ''}
+    for job in _journal_pending():
+        job['replayed'] = True
+        q['jobs'].append(job)
+        q['pending'].update(job['sheets'])
+    threading.Thread(target=_write_worker, args=(q,), daemon=True, name='flotte-write-behind').start()
+    return q
+
+
+def _enqueue(batches, sheet_names, appends=None, bump=None, positions=None):
+    q = _write_queue()
+    job = {
+        'id': uuid.uuid4().hex, 'batches': batches, 'sheets': sheet_names,
+        'appends': appends or {}, 'bump': bump or [], 'positions': positions or {},
+    }
+    with q['cond']:
+        _journal_append(job)
+        q['jobs'].append(job)
+        q['pending'].update(sheet_names)
+        q['cond'].notify()
+
+
+def _write_worker(q):
+    # Client dédié : le client Google (httplib2) n'est pas thread-safe.
+    service = sheets_service if _BACKEND == 'fake' else _new_service()
+    while True:
+        with q['cond']:
+            while not q['jobs']:
+                q['cond'].wait()
+            job = q['jobs'][0]
+        _persist(service, job, q)
+        with q['cond']:
+            q['jobs'].popleft()
+            for sheet_name in job['sheets']:
+                q['pending'][sheet_name] -= 1
+                if q['pending'][sheet_name] <= 0:
+                    del q['pending'][sheet_name]
             try:
-                sheets_service.spreadsheets().values().clear(
-                    spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A{len(values) + 1}:Z10000"
-                ).execute()
-            except Exception:
+                if q['jobs']:
+                    _journal_append({'done': job['id']})
+                else:
+                    # File vide : le journal peut repartir de zéro.
+                    open(_JOURNAL_PATH, 'w').close()
+            except OSError:
                 pass
-    finally:
-        _load_all_sheets.clear()
 
 
+def _persist(service, job, q):
+    """Envoie un lot, en retentant indéfiniment les erreurs transitoires
+    (429, 5xx, réseau). Une erreur définitive (4xx, ou _Conflict : lignes
+    disparues entre-temps) abandonne le lot et fait recharger les feuilles
+    concernées."""
+    delay = 1
+    moved = set()
+    check = bool(job.get('replayed'))
+    while True:
+        try:
+            _send(service, job['batches'], job.get('appends', {}), job.get('bump', []), moved, check,
+                  job.get('positions'))
+            q['last_error'] = ''
+            break
+        except Exception as e:
+            # Un append a pu être écrit malgré l'erreur : vérifier avant de le renvoyer.
+            check = True
+            q['last_error'] = str(e)
+            status = getattr(getattr(e, 'resp', None), 'status', None)
+            if isinstance(e, _Conflict) or (status is not None and int(status) != 429 and int(status) < 500):
+                q['failed'] += 1
+                for sheet_name in job['sheets']:
+                    _invalidate(sheet_name)
+                return
+            time.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, _BACKOFF_MAX)
+    if job.get('replayed'):
+        # Lot d'une session précédente : le cache a été chargé sans lui.
+        moved.update(job['sheets'])
+    for sheet_name in moved:
+        _invalidate(sheet_name)
+
+
+def quota_usage():
+    """Consommation des budgets lecture / écriture de l'API (cf. quota.RateLimiter.usage)."""
+    return quota.shared_limiter().usage()
+
+
+def pending_writes():
+    """Nombre de lots d'écriture pas encore envoyés à Google Sheets."""
+    return len(_write_queue()['jobs'])
+
+
+@_write_op
+def write_sheet(sheet_name, data, prev_size=None):
+    """Écrit la feuille. Par défaut, seules les cellules qui diffèrent du
+    cache partent en 1 appel values().batchUpdate. La réécriture complète
+    n'est utilisée que si des lignes ont été supprimées (décalage) ou si le
+    cache n'est pas exploitable. Si prev_size est connu et <= len(data), on
+    évite alors l'appel clear() résiduel (1 appel API au lieu de 2).
+
+    Le cache de la feuille est ensuite patché avec data (pas de relecture).
+    """
+    if not data and prev_size == 0:
+        # Safety: si le caller savait qu'il y avait 0 lignes (prev_size=0)
+        # et nous demande d'écrire 0 lignes, c'est un no-op — ne pas wipe.
+        # Évite la perte des données quand le cache renvoie [] par erreur
+        # API transitoire et qu'un delete_X enchaîne avec write_sheet([], 0).
+        # Le cache n'est pas fiable dans ce cas : on le fait recharger.
+        _invalidate(sheet_name)
+        return
+    headers = list(dict.fromkeys(k for row in data for k in row.keys()))
+    if _in_transaction():
+        if not headers:
+            # Feuille vidée : l'en-tête reste, seules les lignes de données partent.
+            headers = list(dict.fromkeys(k for row in _entry(sheet_name)['rows'] for k in row.keys()))
+        _stage(sheet_name, data, headers)
+        return
+    try:
+        _write_values(sheet_name, data, headers, prev_size)
+    except Exception:
+        _invalidate(sheet_name)
+        raise
+    _patch_rows(sheet_name, data, headers)
+
+
+def _write_values(sheet_name, data, headers, prev_size):
+    if not data:
+        # Préserver la ligne d'en-tête : on n'efface que les lignes de données.
+        sheets_service.spreadsheets().values().clear(
+            spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A2:Z10000"
+        ).execute()
+        _bump([sheet_name])
+        return
+    values = [headers] + [[row.get(h, '') for h in headers] for row in data]
+    if (prev_size is None or prev_size <= len(data)) and _delta_write(sheet_name, values):
+        return
+    # 1. Écrire depuis A1 (données valides immédiatement)
+    sheets_service.spreadsheets().values().update(
+        spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A1",
+        valueInputOption="RAW", body={"values": values}
+    ).execute()
+    # 2. Supprimer les lignes résiduelles seulement si on a rétréci
+    if prev_size is None or prev_size > len(data):
+        try:
+            sheets_service.spreadsheets().values().clear(
+                spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!A{len(values) + 1}:Z10000"
+            ).execute()
+        except Exception:
+            pass
+    _bump([sheet_name])
+
+
+@_write_op
 def append_row(sheet_name, row_dict):
     """Ajoute UNE ligne via l'API append (1 seul appel, beaucoup plus rapide
     qu'un read+rewrite complet). On infère les en-têtes depuis la 1re ligne
@@ -114,9 +1202,19 @@ def append_row(sheet_name, row_dict):
     Si la feuille est vraiment vide (pas d'en-tête), on écrit [en-tête, ligne]
     via update — sinon la 1re ligne devient une ligne de données et toutes
     les lectures suivantes échouent (dict(zip(headers, row)) avec headers={}).
+
+    Le cache de la feuille est patché avec la ligne ajoutée, à la position
+    renvoyée par l'API.
     """
+    row_dict = {**row_dict, '_id': row_dict.get('_id') or _new_id()}
+    if _in_transaction():
+        existing = _entry(sheet_name)['rows']
+        headers = list(dict.fromkeys([*(k for r in existing for k in r.keys()), *row_dict]))
+        _stage(sheet_name, existing + [row_dict], headers)
+        _tx.state['appends'].setdefault(sheet_name, set()).add(row_dict['_id'])
+        return
     try:
-        existing = _load_all_sheets().get(sheet_name, [])
+        existing = _entry(sheet_name)['rows']
         if existing:
             header_row = list(dict.fromkeys(k for r in existing for k in r.keys()))
         else:
@@ -133,14 +1231,24 @@ def append_row(sheet_name, row_dict):
             for k in row_dict:
                 if k not in headers:
                     headers.append(k)
+            if len(headers) > len(header_row):
+                # Nouvelle colonne (ex. _id) : compléter l'en-tête, sinon la
+                # valeur ajoutée serait ignorée à la lecture.
+                sheets_service.spreadsheets().values().update(
+                    spreadsheetId=SPREADSHEET_ID,
+                    range=f"{sheet_name}!A1",
+                    valueInputOption="RAW",
+                    body={"values": [headers]}
+                ).execute()
             row_values = [row_dict.get(h, '') for h in headers]
-            sheets_service.spreadsheets().values().append(
+            result = sheets_service.spreadsheets().values().append(
                 spreadsheetId=SPREADSHEET_ID,
                 range=f"{sheet_name}!A:Z",
                 valueInputOption="RAW",
                 insertDataOption="INSERT_ROWS",
                 body={"values": [row_values]}
             ).execute()
+            row_number = _append_at(result)
         else:
             headers = list(row_dict.keys())
             row_values = [row_dict.get(h, '') for h in headers]
@@ -150,8 +1258,365 @@ def append_row(sheet_name, row_dict):
                 valueInputOption="RAW",
                 body={"values": [headers, row_values]}
             ).execute()
+            row_number = 2
+    except Exception:
+        _invalidate(sheet_name)
+        raise
+    _bump([sheet_name])
+    if row_number == len(existing) + 2:
+        _patch_rows(sheet_name, existing + [row_dict], headers)
+    else:
+        # Ligne insérée ailleurs qu'en fin de tableau (lignes vides, écriture
+        # concurrente) : le cache ne reflète plus les positions.
+        _invalidate(sheet_name)
+
+
+def _new_id():
+    """Identifiant stable d'une ligne (colonne cachée _id)."""
+    return uuid.uuid4().hex[:12]
+
+
+class _Conflict(KeyError):
+    """La feuille a changé sous l'index du cache (ligne supprimée ou archivée
+    depuis un autre poste) : rien n'a été écrit, elle est rechargée."""
+
+
+def _retry_conflict(fn):
+    """Hors transaction englobante, rejoue fn une fois après un _Conflict :
+    la feuille vient d'être rechargée, la ligne est retrouvée par son _id."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _in_transaction():
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        except _Conflict:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+@_retry_conflict
+def _update_row(sheet_name, row_id, changes):
+    """Met à jour UNE ligne repérée par son _id : on retrouve sa position via
+    l'index du cache et seules ses cellules modifiées sont écrites
+    (1 appel batchUpdate, sans reconstruire la feuille). La colonne _id est
+    relue juste avant : si la ligne a bougé entre-temps, l'écriture la suit
+    (cf. _relocate). Lève KeyError si l'identifiant est vide ou inconnu.
+    """
+    with transaction():
+        entry = _entry(sheet_name)
+        row_number = entry['index'].get(row_id) if row_id else None
+        if row_number is None:
+            raise _unknown_id(sheet_name, row_id)
+        rows = entry['rows']
+        headers = list(dict.fromkeys(k for r in rows for k in r.keys()))
+        new_rows = list(rows)
+        new_rows[row_number - 2] = {**rows[row_number - 2], **changes}
+        _stage(sheet_name, new_rows, headers + [k for k in changes if k not in headers])
+        _check_ids(sheet_name, row_id)
+
+
+def _unknown_id(sheet_name, row_id):
+    return KeyError(f"{sheet_name} : aucune ligne d'identifiant {row_id!r}")
+
+
+def _update_first(sheet_name, match, changes, last=False):
+    """Met à jour la première (ou la dernière) ligne pour laquelle match(row)
+    est vrai. Passe par _update_row ; une ligne sans _id (pas encore
+    rétro-numérotée) est écrite via write_sheet. Retourne False si aucune
+    ligne ne correspond.
+    """
+    rows = _cached(sheet_name)
+    order = range(len(rows) - 1, -1, -1) if last else range(len(rows))
+    for i in order:
+        row = rows[i]
+        if match(row):
+            if row.get('_id'):
+                _update_row(sheet_name, row['_id'], changes)
+            else:
+                new = list(rows)
+                new[i] = {**row, **changes}
+                write_sheet(sheet_name, new, prev_size=len(rows))
+            return True
+    return False
+
+
+@_retry_conflict
+def _delete_row(sheet_name, row_id):
+    """Supprime la ligne d'identifiant row_id (réécriture : les lignes suivantes
+    remontent). Rien n'est écrit si la colonne _id de la feuille ne correspond
+    plus au cache : elle est rechargée et la suppression rejouée. Le cache,
+    index compris, est reconstruit sur les lignes restantes.
+    Lève KeyError si l'identifiant est vide ou inconnu."""
+    with transaction():
+        rows = _cached(sheet_name)
+        new = [r for r in rows if r.get('_id') != row_id] if row_id else rows
+        if len(new) == len(rows):
+            raise _unknown_id(sheet_name, row_id)
+        write_sheet(sheet_name, new, prev_size=len(rows))
+        _check_ids(sheet_name)
+
+
+def _backfill_ids(all_data, service=None):
+    """Attribue un _id aux lignes qui n'en ont pas encore (lignes antérieures à
+    la colonne, imports externes) ; all_data : {feuille: lignes}, limité aux
+    feuilles qui viennent d'être lues (cf. _fetch). Une seule plage par
+    feuille, le tout en 1 appel batchUpdate. En cas d'échec, l'exception
+    remonte et le cache est laissé tel quel.
+    """
+    ranges = []
+    patched = {}
+    for sheet_name in ALL_SHEET_NAMES:
+        rows = all_data.get(sheet_name, [])
+        if all(r.get('_id') for r in rows):
+            continue
+        headers = list(dict.fromkeys(k for r in rows for k in r.keys()))
+        if '_id' in headers:
+            col = _col_letter(headers.index('_id'))
+        else:
+            col = _col_letter(len(headers))
+            ranges.append({'range': f"{sheet_name}!{col}1", 'values': [['_id']]})
+            headers.append('_id')
+        rows = [{**r, '_id': r.get('_id') or _new_id()} for r in rows]
+        ranges.append({
+            'range': f"{sheet_name}!{col}2:{col}{len(rows) + 1}",
+            'values': [[r['_id']] for r in rows],
+        })
+        patched[sheet_name] = (rows, headers)
+    if ranges:
+        ranges += _bump_ranges(patched)
+        (service or sheets_service).spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"valueInputOption": "RAW", "data": ranges}
+        ).execute()
+        for sheet_name, (rows, headers) in patched.items():
+            _patch_rows(sheet_name, rows, headers)
+
+
+# TRANSACTIONS
+# Dans un bloc `with transaction():`, write_sheet / append_row / _update_row
+# n'appellent pas l'API : l'état de chaque feuille touchée est tenu en attente
+# (et relu par _entry / _cached, donc les écritures s'enchaînent). À la sortie
+# du bloc, les cellules qui diffèrent de l'état initial partent en 1 appel
+# values().batchUpdate par classeur, les lignes ajoutées en 1 values().append
+# par feuille (jamais à une position supposée : des lignes ont pu être
+# ajoutées hors de l'app entre-temps), puis le cache est patché 1 fois par
+# feuille. Une exception dans le bloc annule tout (rien n'est écrit).
+_tx = threading.local()
+
+
+def _in_transaction():
+    return getattr(_tx, 'state', None) is not None
+
+
+def _staged(sheet_name):
+    return _tx.state['sheets'].get(sheet_name, (None, None))[1] if _in_transaction() else None
+
+
+def _check_ids(sheet_name, row_id=None):
+    """Fait vérifier par le flush que la ligne row_id est toujours à sa
+    position dans la feuille — toutes les lignes si None (l'écriture décale
+    des lignes) — avant d'écrire par position (cf. _relocate)."""
+    check = _tx.state['checks'].setdefault(sheet_name, {'ids': set(), 'strict': False})
+    if row_id is None:
+        check['strict'] = True
+    else:
+        check['ids'].add(row_id)
+
+
+def _stage(sheet_name, rows, headers):
+    sheets = _tx.state['sheets']
+    if sheet_name in sheets:
+        base = sheets[sheet_name][0]
+    else:
+        base = _entry(sheet_name)['rows']
+    rows = [{h: _read_back(r.get(h, '')) for h in headers} for r in rows]
+    sheets[sheet_name] = (base, {
+        'rows': rows,
+        'headers': headers,
+        'index': {r['_id']: i + 2 for i, r in enumerate(rows) if r.get('_id')},
+        # Jamais égale à celle du miroir : query_sheet filtre en mémoire.
+        'version': None,
+    })
+
+
+def _grid(rows, headers=None):
+    if headers is None:
+        headers = list(dict.fromkeys(k for r in rows for k in r.keys()))
+    return ([headers] if headers else []) + [[r.get(h, '') for h in headers] for r in rows]
+
+
+@contextmanager
+def transaction():
+    """Regroupe les écritures du bloc en 1 aller-retour API par classeur.
+    Une transaction imbriquée est rattachée à la transaction englobante.
+    """
+    if _in_transaction():
+        yield
+        return
+    # appends : {feuille: _id des lignes ajoutées dans le bloc}
+    # checks : {feuille: lignes à vérifier avant écriture, cf. _check_ids}
+    _tx.state = {'sheets': {}, 'ext': {}, 'appends': {}, 'checks': {}}
+    try:
+        yield
+        state = _tx.state
     finally:
-        _load_all_sheets.clear()
+        _tx.state = None
+    _flush(state)
+
+
+def _flush(state):
+    data, appends = [], {}
+    for sheet_name, (base, final) in state['sheets'].items():
+        added = state['appends'].get(sheet_name, set())
+        kept = [r for r in final['rows'] if r.get('_id') not in added]
+        old, new = _grid(base), _grid(kept, final['headers'])
+        for r in range(max(len(old), len(new))):
+            # Lignes en trop (suppressions) : leurs cellules sont vidées.
+            data += _row_ranges(
+                sheet_name, r + 1, old[r] if r < len(old) else [], new[r] if r < len(new) else []
+            )
+        new_rows = [r for r in final['rows'] if r.get('_id') in added]
+        if new_rows:
+            appends[sheet_name] = {
+                # N° de ligne attendu de la 1re ligne ajoutée (cf. _append_at)
+                'at': len(kept) + 2,
+                'headers': final['headers'],
+                'values': _grid(new_rows, final['headers'])[1:],
+            }
+    bump = _bump_ranges(state['sheets']) if data or appends else []
+    if not appends:
+        # Pas d'ajout : le jeton part dans le même appel que les cellules.
+        data, bump = data + bump, []
+    batches = {SPREADSHEET_ID: data} if data else {}
+    batches.update(state['ext'])
+    positions = _positions(state) if data else {}
+    moved = set()
+    if _deferred():
+        if batches or appends:
+            _enqueue(batches, list(state['sheets']), appends, bump, positions)
+    else:
+        try:
+            _send(sheets_service, batches, appends, bump, moved, positions=positions)
+        except Exception:
+            for sheet_name in state['sheets']:
+                _invalidate(sheet_name)
+            raise
+    for sheet_name, (_, final) in state['sheets'].items():
+        if sheet_name in moved:
+            _invalidate(sheet_name)
+        else:
+            _patch_rows(sheet_name, final['rows'], final['headers'])
+
+
+def _positions(state):
+    """{feuille: {'col', 'rows': {_id: n° de ligne}, 'strict'}} : lignes dont
+    la position dans la feuille (état initial de la transaction) est à
+    vérifier avant l'envoi, cf. _check_ids et _relocate."""
+    positions = {}
+    for sheet_name, check in state['checks'].items():
+        base = state['sheets'].get(sheet_name, ([],))[0]
+        headers = _grid(base)[0] if base else []
+        if '_id' not in headers:
+            continue
+        rows = {
+            r['_id']: i + 2 for i, r in enumerate(base)
+            if r.get('_id') and (check['strict'] or r['_id'] in check['ids'])
+        }
+        if rows:
+            positions[sheet_name] = {'col': _col_letter(headers.index('_id')), 'rows': rows, 'strict': check['strict']}
+    return positions
+
+
+def _send(service, batches, appends, bump, moved, check=False, positions=None):
+    """Envoie un lot : cellules (batchUpdate par classeur), puis ajouts
+    (values().append), puis jetons _meta — posés en dernier pour qu'une
+    sonde ne recharge pas la feuille avant les lignes ajoutées. Les feuilles
+    dont les lignes n'ont pas atterri à la ligne attendue vont dans moved.
+
+    check : nouvel essai ou lot rejoué, un append précédent a pu aboutir
+    sans réponse ; les lignes dont l'_id est déjà dans la feuille sont sautées.
+    positions : cf. _positions, vérifiées juste avant les cellules.
+    """
+    if positions and batches.get(SPREADSHEET_ID):
+        batches = {**batches, SPREADSHEET_ID: _relocate(service, batches[SPREADSHEET_ID], positions, moved)}
+    for spreadsheet_id, ranges in batches.items():
+        service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"valueInputOption": "RAW", "data": ranges}
+        ).execute()
+    for sheet_name, added in appends.items():
+        values = _missing_rows(service, sheet_name, added) if check else added['values']
+        if len(values) < len(added['values']):
+            moved.add(sheet_name)
+        if not values:
+            continue
+        result = service.spreadsheets().values().append(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f"{sheet_name}!A:Z",
+            valueInputOption="RAW",
+            insertDataOption="INSERT_ROWS",
+            body={"values": values}
+        ).execute()
+        if _append_at(result) != added['at']:
+            moved.add(sheet_name)
+    if bump:
+        service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"valueInputOption": "RAW", "data": bump}
+        ).execute()
+
+
+def _relocate(service, ranges, positions, moved):
+    """Relit la colonne _id des feuilles de positions (1 batchGet) avant une
+    écriture par position. Une ligne qui a bougé depuis la lecture du cache
+    (suppression, archivage sur un autre poste) : ses plages suivent son _id
+    et la feuille va dans moved. Lève _Conflict si une ligne a disparu, ou si
+    la feuille a bougé alors que l'écriture décale des lignes (strict)."""
+    names = list(positions)
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=SPREADSHEET_ID,
+        ranges=[f"{n}!{positions[n]['col']}2:{positions[n]['col']}" for n in names]
+    ).execute()
+    shift = {}
+    for name, vr in zip(names, result.get('valueRanges', [])):
+        found = {v[0]: i + 2 for i, v in enumerate(vr.get('values', [])) if v}
+        for row_id, row_number in positions[name]['rows'].items():
+            at = found.get(row_id)
+            if at == row_number:
+                continue
+            if at is None or positions[name]['strict']:
+                raise _Conflict(f"{name} : feuille modifiée depuis un autre poste, rechargée")
+            shift[(name, row_number)] = at
+    if not shift:
+        return ranges
+    out = []
+    for d in ranges:
+        name, a1 = d['range'].rsplit('!', 1)
+        m = re.fullmatch(r'([A-Z]+)(\d+):([A-Z]+)\2', a1)
+        at = shift.get((name, int(m.group(2)))) if m else None
+        if at is not None:
+            d = {**d, 'range': f"{name}!{m.group(1)}{at}:{m.group(3)}{at}"}
+            moved.add(name)
+        out.append(d)
+    return out
+
+
+def _missing_rows(service, sheet_name, added):
+    """Lignes de added (cf. _flush) dont l'_id n'est pas encore dans la feuille."""
+    i = added['headers'].index('_id')
+    col = _col_letter(i)
+    result = service.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID, range=f"{sheet_name}!{col}2:{col}"
+    ).execute()
+    present = {v[0] for v in result.get('values', []) if v}
+    return [row for row in added['values'] if row[i] not in present]
+
+
+def _append_at(result):
+    """N° de la 1re ligne écrite par values().append ("feuille!A57:F58" → 57)."""
+    m = re.search(r'!\D*(\d+)', result.get('updates', {}).get('updatedRange', ''))
+    return int(m.group(1)) if m else None
 
 
 DEFAULTS = {
@@ -163,31 +1628,61 @@ DEFAULTS = {
 }
 
 
+# Version du schéma du classeur, notée dans parametres à la fin du
+# bootstrap : tant qu'elle correspond, init_database ne fait aucun appel.
+# Elle suit la liste des feuilles et des défauts ; incrémenter _SCHEMA_REV
+# pour forcer un nouveau bootstrap (ex. nouvelle colonne à rétro-remplir).
+_SCHEMA_REV = 1
+_SCHEMA_KEY = 'schema_version'
+SCHEMA_VERSION = f"{_SCHEMA_REV}-" + hashlib.sha1(
+    json.dumps([ALL_SHEET_NAMES, sorted(DEFAULTS)]).encode()
+).hexdigest()[:8]
+
+
 @st.cache_resource
 def init_database():
-    """Crée les feuilles manquantes ET populate les défauts si elles sont vides.
-    Tourne 1 fois par session (cache_resource) → pas d'appels API répétés.
+    """Bootstrap du classeur (cf. _bootstrap), 1 fois par process et
+    seulement si parametres ne porte pas déjà SCHEMA_VERSION : la
+    vérification se fait sur le cache (ou l'instantané local au démarrage).
+    Un échec n'enregistre pas la version : on réessaiera au prochain démarrage.
     """
-    required_sheets = ['vehicules', 'attributions', 'categories', 'services', 'interventions', 'carburant', 'engins', 'attributions_engins', 'categories_engins', 'interventions_engins', 'scooters', 'attributions_scooters', 'categories_scooters', 'interventions_scooters', 'liens', 'fiches_vehicules', 'distribution_clefs', 'golfettes', 'attributions_golfettes', 'categories_golfettes', 'interventions_golfettes', 'parametres', 'contacts_wlg']
+    # Démarre le worker tout de suite : rejoue les lots restés au journal.
+    _write_queue()
+    if parametres_dict().get(_SCHEMA_KEY) == SCHEMA_VERSION:
+        return
     try:
-        sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-        existing_sheets = [s['properties']['title'] for s in sheet_metadata['sheets']]
-        missing = [s for s in required_sheets if s not in existing_sheets]
-        if missing:
-            sheets_service.spreadsheets().batchUpdate(
-                spreadsheetId=SPREADSHEET_ID,
-                body={"requests": [{"addSheet": {"properties": {"title": s}}} for s in missing]}
-            ).execute()
-        # Populate les défauts pour les feuilles vides (1 fois par session)
-        for sheet_name, defaults in DEFAULTS.items():
-            try:
-                current = read_sheet(sheet_name)
-                if not current:
-                    write_sheet(sheet_name, [{'nom': v} for v in defaults])
-            except Exception:
-                pass
+        _bootstrap()
+    except Exception:
+        pass
+
+
+def _bootstrap():
+    """Crée les feuilles manquantes (dont _meta), populate les défauts des
+    feuilles vides, puis note SCHEMA_VERSION. Les lignes sans _id sont
+    numérotées à leur chargement (cf. _fetch). Lectures : la liste des feuilles, puis _meta et l'en-tête
+    + 1re ligne des feuilles de DEFAULTS en 1 seul batchGet.
+    """
+    sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
+    existing_sheets = {s['properties']['title'] for s in sheet_metadata['sheets']}
+    missing = [s for s in ALL_SHEET_NAMES + [_META_SHEET] if s not in existing_sheets]
+    if missing:
+        sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"requests": [{"addSheet": {"properties": {"title": s}}} for s in missing]}
+        ).execute()
+    result = sheets_service.spreadsheets().values().batchGet(
+        spreadsheetId=SPREADSHEET_ID,
+        ranges=[f"{_META_SHEET}!A:B"] + [f"{name}!A1:Z2" for name in DEFAULTS]
+    ).execute()
+    value_ranges = result.get('valueRanges', [])
+    try:
+        _init_meta(value_ranges[0].get('values', []))
     except Exception:
         pass
+    for (sheet_name, defaults), vr in zip(DEFAULTS.items(), value_ranges[1:]):
+        if len(vr.get('values', [])) < 2:
+            write_sheet(sheet_name, [{'nom': v, '_id': _new_id()} for v in defaults])
+    set_parametre(_SCHEMA_KEY, SCHEMA_VERSION)
 
 
 # CRUD VÉHICULES
@@ -209,12 +1704,8 @@ def get_fiches_vehicules():
     return _cached('fiches_vehicules')
 
 def save_fiche_vehicule(immat, contrat_url, photos_entree, photos_sortie, notes):
-    fiches = _cached('fiches_vehicules')
     data = {'immatriculation': immat, 'contrat_url': contrat_url, 'photos_entree': photos_entree, 'photos_sortie': photos_sortie, 'notes': notes}
-    if any(f.get('immatriculation') == immat for f in fiches):
-        new_fiches = [data if f.get('immatriculation') == immat else f for f in fiches]
-        write_sheet('fiches_vehicules', new_fiches, prev_size=len(fiches))
-    else:
+    if not _update_first('fiches_vehicules', lambda f: f.get('immatriculation') == immat, data):
         append_row('fiches_vehicules', data)
 
 def get_attributions():
@@ -223,28 +1714,35 @@ def get_attributions():
 def add_attribution(immat, service, date, heure, date_retour_prevue):
     append_row('attributions', {'immatriculation': immat, 'service': service, 'date': date, 'heure': heure, 'date_retour_prevue': date_retour_prevue, 'retourne': ''})
 
+def _retourner(sheet_name, id_key, id_value):
+    """Marque retournée la dernière attribution non retournée de l'élément."""
+    changes = {'retourne': datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")}
+    ouvertes = query_sheet(sheet_name, **{id_key: id_value, 'retourne': ''})
+    if ouvertes and ouvertes[-1].get('_id'):
+        _update_row(sheet_name, ouvertes[-1]['_id'], changes)
+    elif ouvertes:
+        _update_first(
+            sheet_name, lambda a: a.get(id_key) == id_value and not a.get('retourne'),
+            changes, last=True
+        )
+
 def retourner_vehicule(immat):
-    attributions = _cached('attributions')
-    for attr in reversed(attributions):
-        if attr.get('immatriculation') == immat and not attr.get('retourne'):
-            attr['retourne'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-            break
-    write_sheet('attributions', attributions, prev_size=len(attributions))
+    _retourner('attributions', 'immatriculation', immat)
 
-def update_attribution(idx, data):
-    attributions = _cached('attributions')
-    if 0 <= idx < len(attributions):
-        attributions[idx].update(data)
-        write_sheet('attributions', attributions, prev_size=len(attributions))
+def update_attribution(row_id, data):
+    _update_row('attributions', row_id, data)
 
-def delete_attribution(idx):
-    attributions = _cached('attributions')
-    if 0 <= idx < len(attributions):
-        attributions.pop(idx)
-        write_sheet('attributions', attributions, prev_size=len(attributions) + 1)
+def delete_attribution(row_id):
+    _delete_row('attributions', row_id)
 
 
 # CRUD CATÉGORIES & SERVICES
+def _delete_nom(sheet_name, nom):
+    """Retire nom d'une feuille de référence en réécrivant les lignes
+    complètes du cache (_id et autres colonnes gardent leur alignement)."""
+    rows = _cached(sheet_name)
+    write_sheet(sheet_name, [r for r in rows if r.get('nom') != nom], prev_size=len(rows))
+
 def get_categories():
     return [c.get('nom', '') for c in _cached('categories') if c.get('nom')]
 
@@ -253,8 +1751,7 @@ def add_category(nom):
         append_row('categories', {'nom': nom})
 
 def delete_category(nom):
-    cats = get_categories()
-    write_sheet('categories', [{'nom': c} for c in cats if c != nom], prev_size=len(cats))
+    _delete_nom('categories', nom)
 
 def get_services():
     return [s.get('nom', '') for s in _cached('services') if s.get('nom')]
@@ -264,8 +1761,7 @@ def add_service(nom):
         append_row('services', {'nom': nom})
 
 def delete_service(nom):
-    srvs = get_services()
-    write_sheet('services', [{'nom': s} for s in srvs if s != nom], prev_size=len(srvs))
+    _delete_nom('services', nom)
 
 
 # CRUD INTERVENTIONS VÉHICULES
@@ -285,13 +1781,9 @@ def add_bon_carburant(bon):
 
 def update_bon_carburant(numero_bon, type_carb, volume, montant):
     bons = _cached('carburant')
-    for bon in bons:
-        if bon.get('numero_bon') == numero_bon:
-            bon['type_carburant'] = type_carb
-            bon['volume'] = str(volume)
-            bon['montant'] = str(montant)
-            bon['statut'] = 'Saisi'
-    write_sheet('carburant', bons, prev_size=len(bons))
+    changes = {'type_carburant': type_carb, 'volume': str(volume), 'montant': str(montant), 'statut': 'Saisi'}
+    new = [{**bon, **changes} if bon.get('numero_bon') == numero_bon else bon for bon in bons]
+    write_sheet('carburant', new, prev_size=len(bons))
 
 def delete_bon_carburant(numero_bon):
     bons = _cached('carburant')
@@ -321,49 +1813,27 @@ def add_engin(num_serie, type_e, marque, numero_prestataire=""):
     if not any(e.get('numero_serie') == num_serie for e in _cached('engins')):
         append_row('engins', {'numero_serie': num_serie, 'type': type_e, 'marque': marque, 'numero_prestataire': numero_prestataire})
 
+def _update_engin(num_serie, changes):
+    _update_first('engins', lambda e: e.get('numero_serie') == num_serie, changes)
+
 def update_engin_prestataire(num_serie, numero_prestataire):
-    engins = _cached('engins')
-    for e in engins:
-        if e.get('numero_serie') == num_serie:
-            e['numero_prestataire'] = numero_prestataire
-            break
-    write_sheet('engins', engins, prev_size=len(engins))
+    _update_engin(num_serie, {'numero_prestataire': numero_prestataire})
 
 def marquer_retard_livraison_engin(num_serie):
     """Signale qu'un engin censé être sur parc n'a pas encore été livré."""
-    engins = _cached('engins')
-    for e in engins:
-        if e.get('numero_serie') == num_serie:
-            e['retard_livraison'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-            break
-    write_sheet('engins', engins, prev_size=len(engins))
+    _update_engin(num_serie, {'retard_livraison': datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")})
 
 def marquer_engin_recu(num_serie):
     """Lève le statut 'non livré' une fois l'engin réellement reçu sur parc."""
-    engins = _cached('engins')
-    for e in engins:
-        if e.get('numero_serie') == num_serie:
-            e['retard_livraison'] = ''
-            break
-    write_sheet('engins', engins, prev_size=len(engins))
+    _update_engin(num_serie, {'retard_livraison': ''})
 
 def marquer_livraison_anticipee_engin(num_serie):
     """Signale qu'un engin est arrivé sur parc avant sa date de planning."""
-    engins = _cached('engins')
-    for e in engins:
-        if e.get('numero_serie') == num_serie:
-            e['livraison_anticipee'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-            break
-    write_sheet('engins', engins, prev_size=len(engins))
+    _update_engin(num_serie, {'livraison_anticipee': datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")})
 
 def annuler_livraison_anticipee_engin(num_serie):
     """Lève le statut 'livré en avance' (l'engin n'est plus considéré comme en avance)."""
-    engins = _cached('engins')
-    for e in engins:
-        if e.get('numero_serie') == num_serie:
-            e['livraison_anticipee'] = ''
-            break
-    write_sheet('engins', engins, prev_size=len(engins))
+    _update_engin(num_serie, {'livraison_anticipee': ''})
 
 def delete_engin(num_serie):
     engins = _cached('engins')
@@ -377,13 +1847,10 @@ def _is_engin_active_today(attr):
     """Retourne True si l'attribution couvre aujourd'hui (date_debut <= today <= date_fin)."""
     if attr.get('retourne'):
         return False
-    try:
-        today = datetime.now(_TZ).date()
-        date_debut = datetime.strptime(attr['date'], "%d/%m/%Y").date()
-        date_fin = datetime.strptime(attr.get('date_fin', attr['date']), "%d/%m/%Y").date()
-        return date_debut <= today <= date_fin
-    except Exception:
-        return not attr.get('retourne')
+    rec = records.from_row(attr)
+    if not rec.dates_ok:
+        return True
+    return rec.covers(datetime.now(_TZ).date())
 
 def add_attribution_engin(num_serie, service, date_debut, date_fin, periode):
     append_row('attributions_engins', {'numero_serie': num_serie, 'service': service, 'date': date_debut, 'date_fin': date_fin, 'periode': periode, 'retourne': ''})
@@ -395,24 +1862,13 @@ def ecraser_attributions_engin_periode(num_serie, date_debut, date_fin):
     return _ecraser_attr_periode('attributions_engins', num_serie, date_debut, date_fin)
 
 def retourner_engin(num_serie):
-    attributions = _cached('attributions_engins')
-    for attr in reversed(attributions):
-        if attr.get('numero_serie') == num_serie and not attr.get('retourne'):
-            attr['retourne'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-            break
-    write_sheet('attributions_engins', attributions, prev_size=len(attributions))
+    _retourner('attributions_engins', 'numero_serie', num_serie)
 
-def update_attribution_engin(idx, data):
-    attributions = _cached('attributions_engins')
-    if 0 <= idx < len(attributions):
-        attributions[idx].update(data)
-        write_sheet('attributions_engins', attributions, prev_size=len(attributions))
+def update_attribution_engin(row_id, data):
+    _update_row('attributions_engins', row_id, data)
 
-def delete_attribution_engin(idx):
-    attributions = _cached('attributions_engins')
-    if 0 <= idx < len(attributions):
-        attributions.pop(idx)
-        write_sheet('attributions_engins', attributions, prev_size=len(attributions) + 1)
+def delete_attribution_engin(row_id):
+    _delete_row('attributions_engins', row_id)
 
 def get_categories_engins():
     return [c.get('nom', '') for c in _cached('categories_engins') if c.get('nom')]
@@ -422,8 +1878,7 @@ def add_category_engin(nom):
         append_row('categories_engins', {'nom': nom})
 
 def delete_category_engin(nom):
-    cats = get_categories_engins()
-    write_sheet('categories_engins', [{'nom': c} for c in cats if c != nom], prev_size=len(cats))
+    _delete_nom('categories_engins', nom)
 
 def get_interventions_engins():
     return _cached('interventions_engins')
@@ -431,12 +1886,9 @@ def get_interventions_engins():
 def add_intervention_engin(num_serie, type_i, date, heure, comm, statut, telephone="", horaires=""):
     append_row('interventions_engins', {'numero_serie': num_serie, 'type': type_i, 'date': date, 'heure': heure, 'commentaire': comm, 'statut': statut, 'telephone': telephone, 'horaires': horaires})
 
-def update_intervention_engin(idx, data):
+def update_intervention_engin(row_id, data):
     """Met à jour les champs d'une intervention (statut, note_cloture, bon_url, etc.)."""
-    interventions = _cached('interventions_engins')
-    if 0 <= idx < len(interventions):
-        interventions[idx].update(data)
-        write_sheet('interventions_engins', interventions, prev_size=len(interventions))
+    _update_row('interventions_engins', row_id, data)
 
 
 # CRUD SCOOTERS
@@ -459,24 +1911,13 @@ def add_attribution_scooter(immat, service, date, heure, date_retour_prevue, cas
     append_row('attributions_scooters', {'immatriculation': immat, 'service': service, 'date': date, 'heure': heure, 'date_retour_prevue': date_retour_prevue, 'casque': casque, 'retourne': ''})
 
 def retourner_scooter(immat):
-    attributions = _cached('attributions_scooters')
-    for attr in reversed(attributions):
-        if attr.get('immatriculation') == immat and not attr.get('retourne'):
-            attr['retourne'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-            break
-    write_sheet('attributions_scooters', attributions, prev_size=len(attributions))
+    _retourner('attributions_scooters', 'immatriculation', immat)
 
-def update_attribution_scooter(idx, data):
-    attributions = _cached('attributions_scooters')
-    if 0 <= idx < len(attributions):
-        attributions[idx].update(data)
-        write_sheet('attributions_scooters', attributions, prev_size=len(attributions))
+def update_attribution_scooter(row_id, data):
+    _update_row('attributions_scooters', row_id, data)
 
-def delete_attribution_scooter(idx):
-    attributions = _cached('attributions_scooters')
-    if 0 <= idx < len(attributions):
-        attributions.pop(idx)
-        write_sheet('attributions_scooters', attributions, prev_size=len(attributions) + 1)
+def delete_attribution_scooter(row_id):
+    _delete_row('attributions_scooters', row_id)
 
 def get_categories_scooters():
     return [c.get('nom', '') for c in _cached('categories_scooters') if c.get('nom')]
@@ -486,8 +1927,7 @@ def add_category_scooter(nom):
         append_row('categories_scooters', {'nom': nom})
 
 def delete_category_scooter(nom):
-    cats = get_categories_scooters()
-    write_sheet('categories_scooters', [{'nom': c} for c in cats if c != nom], prev_size=len(cats))
+    _delete_nom('categories_scooters', nom)
 
 def get_interventions_scooters():
     return _cached('interventions_scooters')
@@ -521,20 +1961,19 @@ def add_distribution_clef(categorie, identifiant, nom, commentaire):
         'ext_row': str(ext_row) if ext_row else ''
     })
 
-def retour_clef(idx):
-    clefs = _cached('distribution_clefs')
-    if 0 <= idx < len(clefs):
-        clefs[idx]['retour_clef'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-        write_sheet('distribution_clefs', clefs, prev_size=len(clefs))
-        _cocher_retour_externe(clefs[idx])
+def retour_clef(row_id):
+    entry = next((c for c in _cached('distribution_clefs') if row_id and c.get('_id') == row_id), None)
+    if entry is None:
+        raise _unknown_id('distribution_clefs', row_id)
+    _update_row('distribution_clefs', row_id, {'retour_clef': datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")})
+    _cocher_retour_externe(entry)
 
-def delete_distribution_clef(idx):
-    clefs = _cached('distribution_clefs')
-    if 0 <= idx < len(clefs):
-        clefs.pop(idx)
-        write_sheet('distribution_clefs', clefs, prev_size=len(clefs) + 1)
+def delete_distribution_clef(row_id):
+    _delete_row('distribution_clefs', row_id)
 
 def _write_distrib_externe(categorie, identifiant, nom, commentaire, dt):
+    if _sync['offline_since'] is not None:
+        return '', None
     try:
         date_str = dt.strftime("%d/%m/%Y")
         if categorie == 'engin':
@@ -564,7 +2003,6 @@ def _write_distrib_externe(categorie, identifiant, nom, commentaire, dt):
         updated = result.get('updates', {}).get('updatedRange', '')
         row_num = None
         if updated:
-            import re
             m = re.search(r':.*?(\d+)$', updated)
             if m:
                 row_num = int(m.group(1))
@@ -597,48 +2035,34 @@ def ecraser_attributions_golfette_periode(num_serie, date_debut, date_fin):
 
 
 def _ecraser_attr_periode(sheet_name, num_serie, date_debut, date_fin):
-    try:
-        dd_new = datetime.strptime(date_debut, "%d/%m/%Y").date()
-        df_new = datetime.strptime(date_fin, "%d/%m/%Y").date()
-    except Exception:
+    dd_new = records.parse_date(date_debut)
+    df_new = records.parse_date(date_fin)
+    if dd_new is None or df_new is None:
+        return 0
+    # Records et lignes de _cached suivent le même ordre.
+    hits = [
+        i for i, r in enumerate(attribution_records(sheet_name))
+        if r.ident == num_serie and not r.retourne and r.dates_ok
+        and dd_new <= r.date_debut and r.date_fin <= df_new
+    ]
+    if not hits:
         return 0
     attributions = _cached(sheet_name)
+    new = list(attributions)
     now_str = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-    n = 0
-    for attr in attributions:
-        if attr.get('numero_serie') != num_serie or attr.get('retourne'):
-            continue
-        try:
-            dd = datetime.strptime(attr['date'], "%d/%m/%Y").date()
-            df = datetime.strptime(attr.get('date_fin', attr['date']), "%d/%m/%Y").date()
-        except Exception:
-            continue
-        if dd_new <= dd and df <= df_new:
-            attr['retourne'] = now_str
-            n += 1
-    if n:
-        write_sheet(sheet_name, attributions, prev_size=len(attributions))
-    return n
+    for i in hits:
+        new[i] = {**attributions[i], 'retourne': now_str}
+    write_sheet(sheet_name, new, prev_size=len(attributions))
+    return len(hits)
 
 def retourner_golfette(num_serie):
-    attributions = _cached('attributions_golfettes')
-    for attr in reversed(attributions):
-        if attr.get('numero_serie') == num_serie and not attr.get('retourne'):
-            attr['retourne'] = datetime.now(_TZ).strftime("%d/%m/%Y %H:%M")
-            break
-    write_sheet('attributions_golfettes', attributions, prev_size=len(attributions))
+    _retourner('attributions_golfettes', 'numero_serie', num_serie)
 
-def update_attribution_golfette(idx, data):
-    attributions = _cached('attributions_golfettes')
-    if 0 <= idx < len(attributions):
-        attributions[idx].update(data)
-        write_sheet('attributions_golfettes', attributions, prev_size=len(attributions))
+def update_attribution_golfette(row_id, data):
+    _update_row('attributions_golfettes', row_id, data)
 
-def delete_attribution_golfette(idx):
-    attributions = _cached('attributions_golfettes')
-    if 0 <= idx < len(attributions):
-        attributions.pop(idx)
-        write_sheet('attributions_golfettes', attributions, prev_size=len(attributions) + 1)
+def delete_attribution_golfette(row_id):
+    _delete_row('attributions_golfettes', row_id)
 
 def get_categories_golfettes():
     return [c.get('nom', '') for c in _cached('categories_golfettes') if c.get('nom')]
@@ -648,8 +2072,7 @@ def add_category_golfette(nom):
         append_row('categories_golfettes', {'nom': nom})
 
 def delete_category_golfette(nom):
-    cats = get_categories_golfettes()
-    write_sheet('categories_golfettes', [{'nom': c} for c in cats if c != nom], prev_size=len(cats))
+    _delete_nom('categories_golfettes', nom)
 
 def get_interventions_golfettes():
     return _cached('interventions_golfettes')
@@ -657,14 +2080,12 @@ def get_interventions_golfettes():
 def add_intervention_golfette(num_serie, type_i, date, heure, comm, statut, telephone="", horaires=""):
     append_row('interventions_golfettes', {'numero_serie': num_serie, 'type': type_i, 'date': date, 'heure': heure, 'commentaire': comm, 'statut': statut, 'telephone': telephone, 'horaires': horaires})
 
-def update_intervention_golfette(idx, data):
+def update_intervention_golfette(row_id, data):
     """Met à jour les champs d'une intervention (statut, note_cloture, bon_url, etc.)."""
-    interventions = _cached('interventions_golfettes')
-    if 0 <= idx < len(interventions):
-        interventions[idx].update(data)
-        write_sheet('interventions_golfettes', interventions, prev_size=len(interventions))
+    _update_row('interventions_golfettes', row_id, data)
 
 
+@_write_op
 def _cocher_retour_externe(entry):
     try:
         sheet_name = entry.get('ext_sheet', '')
@@ -675,6 +2096,9 @@ def _cocher_retour_externe(entry):
         if not col:
             return
         cell = f"'{sheet_name}'!{col}{ext_row}"
+        if _in_transaction():
+            _tx.state['ext'].setdefault(DISTRIB_EXT_ID, []).append({'range': cell, 'values': [[True]]})
+            return
         sheets_service.spreadsheets().values().update(
             spreadsheetId=DISTRIB_EXT_ID,
             range=cell,
@@ -692,24 +2116,52 @@ def get_contacts_wlg():
 def add_contact_wlg(categorie, nom, telephone, horaires):
     append_row('contacts_wlg', {'categorie': categorie, 'nom': nom, 'telephone': telephone, 'horaires': horaires})
 
-def delete_contact_wlg(idx):
-    contacts = _cached('contacts_wlg')
-    if 0 <= idx < len(contacts):
-        contacts.pop(idx)
-        write_sheet('contacts_wlg', contacts, prev_size=len(contacts) + 1)
+def delete_contact_wlg(row_id):
+    _delete_row('contacts_wlg', row_id)
+
+
+# ARCHIVAGE (cf. archive.py)
+def archive_horizon():
+    return archive.horizon_from(parametres_dict().get('archive_horizon_jours'))
+
+
+def archiver(horizon_jours=None, dry_run=False):
+    """Déplace les lignes closes plus vieilles que l'horizon vers les feuilles
+    d'archive. Renvoie {feuille: nb de lignes archivées (ou à archiver)}."""
+    horizon = horizon_jours or archive_horizon()
+    today = datetime.now(_TZ).date()
+    resume = {}
+    for sheet_name in archive.ARCHIVABLE:
+        rows = _cached(sheet_name)
+        keep, moved = archive.split_rows(sheet_name, rows, horizon, today)
+        if not moved:
+            continue
+        resume[sheet_name] = sum(len(v) for v in moved.values())
+        if dry_run:
+            continue
+        archive.ensure_sheets(sheets_service, SPREADSHEET_ID, list(moved))
+        for name, archived in moved.items():
+            archive.append_rows(sheets_service, SPREADSHEET_ID, name, archived)
+        # Archive écrite d'abord : une coupure ne perd rien (au pire un doublon).
+        write_sheet(sheet_name, keep, prev_size=len(rows))
+    if not dry_run:
+        read_archives.clear()
+    return resume
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def read_archives(sheet_name):
+    """Lignes archivées de la feuille : lues seulement quand une page les demande."""
+    return archive.read_archives(sheets_service, SPREADSHEET_ID, sheet_name)
 
 
 # CRUD PARAMÈTRES
 def get_parametres():
-    """Retourne un dict {cle: valeur} depuis le cache."""
-    return {r['cle']: r.get('valeur', '') for r in _cached('parametres') if r.get('cle')}
+    """Retourne un dict {cle: valeur} depuis le cache (copie modifiable de
+    parametres_dict)."""
+    return dict(parametres_dict())
 
 def set_parametre(cle, valeur):
     """Crée ou met à jour une entrée dans la feuille parametres."""
-    rows = _cached('parametres')
-    for r in rows:
-        if r.get('cle') == cle:
-            r['valeur'] = valeur
-            write_sheet('parametres', rows, prev_size=len(rows))
-            return
-    append_row('parametres', {'cle': cle, 'valeur': valeur})
+    if not _update_first('parametres', lambda r: r.get('cle') == cle, {'valeur': valeur}):
+        append_row('parametres', {'cle': cle, 'valeur': valeur})
@@ -0,0 +1,126 @@
+"""État de la flotte dérivé des feuilles (FleetState).
+
+app.py, la sidebar et les pages recalculaient à chaque rerun de chaque
+session les mêmes listes dérivées (catégories, services, paramètres, « en
+sortie », « en intervention », maps par identifiant, alertes). build()
+les calcule une fois ; database.fleet_state() garde le résultat pour tout le
+process tant que les versions des feuilles ne changent pas.
+
+Tout est en lecture seule (tuple / frozenset / MappingProxyType) : l'objet
+est partagé entre sessions. Les lignes sont celles du cache, à ne pas
+modifier non plus.
+"""
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+import records
+from alertes import (
+    verifier_alertes, verifier_alertes_scooters,
+    verifier_alertes_engins, verifier_alertes_golfettes,
+)
+
+# type d'actif → (feuille, attributions, interventions, clé d'identifiant, catégorie des clés)
+KINDS = {
+    'vehicules': ('vehicules', 'attributions', 'interventions', 'immatriculation', 'vehicule'),
+    'scooters': ('scooters', 'attributions_scooters', 'interventions_scooters', 'immatriculation', 'scooter'),
+    'engins': ('engins', 'attributions_engins', 'interventions_engins', 'numero_serie', 'engin'),
+    'golfettes': ('golfettes', 'attributions_golfettes', 'interventions_golfettes', 'numero_serie', 'golfette'),
+}
+
+_ALERTES = {
+    'vehicules': verifier_alertes,
+    'scooters': verifier_alertes_scooters,
+    'engins': verifier_alertes_engins,
+    'golfettes': verifier_alertes_golfettes,
+}
+
+ALERT_SHEETS = tuple(k[1] for k in KINDS.values())
+
+SHEETS = tuple(sorted(
+    {s for k in KINDS.values() for s in k[:3]}
+    | {'categories', 'categories_engins', 'categories_scooters', 'categories_golfettes',
+       'services', 'parametres', 'distribution_clefs'}
+))
+
+
+class FleetState(NamedTuple):
+    categories: tuple
+    categories_engins: tuple
+    categories_scooters: tuple
+    categories_golfettes: tuple
+    services: tuple
+    parametres: Mapping
+    par_id: Mapping           # type → {identifiant: ligne de l'actif}
+    sorties: Mapping          # type → attributions en cours (ordre des lignes)
+    attribution_active: Mapping  # type → {identifiant: attribution en cours}
+    sortis: Mapping           # type → frozenset des identifiants sortis / distribués
+    interventions_en_cours: Mapping  # type → interventions au statut « En cours »
+    en_intervention: Mapping  # type → frozenset des identifiants
+    disponibles: Mapping      # type → actifs ni sortis ni en intervention
+    clef_ouverte: Mapping     # type → {identifiant: distribution de clé non rendue}
+    alertes: Mapping          # type → alertes (cf. alertes.py)
+
+
+def _noms(rows):
+    return tuple(r.get('nom', '') for r in rows if r.get('nom'))
+
+
+def _frozen(d):
+    return MappingProxyType(d)
+
+
+def _en_cours(kind, attr, today):
+    if attr.get('retourne'):
+        return False
+    if kind in ('engins', 'golfettes'):
+        # Comme database._is_engin_active_today : dates illisibles → en cours.
+        rec = records.from_row(attr)
+        return not rec.dates_ok or rec.covers(today)
+    return True
+
+
+def build_alertes(data):
+    """{type: alertes} ; data : {feuille: lignes} (au moins ALERT_SHEETS)."""
+    return _frozen({kind: tuple(_ALERTES[kind](data.get(k[1], []))) for kind, k in KINDS.items()})
+
+
+def build(data, today):
+    """data : {feuille: lignes} (cf. database._load_all_sheets) ; today : date du jour (Paris)."""
+    par_id, sorties, active, sortis = {}, {}, {}, {}
+    interv, en_interv, dispo, clefs = {}, {}, {}, {}
+    for kind, (sheet, attr_sheet, interv_sheet, id_key, clef_cat) in KINDS.items():
+        assets = data.get(sheet, [])
+        attributions = data.get(attr_sheet, [])
+        par_id[kind] = _frozen({a.get(id_key, ''): a for a in assets})
+        sorties[kind] = tuple(a for a in attributions if _en_cours(kind, a, today))
+        active[kind] = _frozen({a.get(id_key, ''): a for a in sorties[kind]})
+        sortis[kind] = frozenset(active[kind])
+        interv[kind] = tuple(i for i in data.get(interv_sheet, []) if i.get('statut') == "En cours")
+        en_interv[kind] = frozenset(i.get(id_key, '') for i in interv[kind])
+        dispo[kind] = tuple(
+            a for a in assets
+            if a.get(id_key, '') not in sortis[kind] and a.get(id_key, '') not in en_interv[kind]
+        )
+        ouvertes = {}
+        for c in data.get('distribution_clefs', []):
+            if c.get('categorie') == clef_cat and not c.get('retour_clef'):
+                # Plusieurs clés ouvertes pour un même id : la 1re compte.
+                ouvertes.setdefault(c.get('identifiant', ''), c)
+        clefs[kind] = _frozen(ouvertes)
+    return FleetState(
+        categories=_noms(data.get('categories', [])),
+        categories_engins=_noms(data.get('categories_engins', [])),
+        categories_scooters=_noms(data.get('categories_scooters', [])),
+        categories_golfettes=_noms(data.get('categories_golfettes', [])),
+        services=_noms(data.get('services', [])),
+        parametres=_frozen({r['cle']: r.get('valeur', '') for r in data.get('parametres', []) if r.get('cle')}),
+        par_id=_frozen(par_id),
+        sorties=_frozen(sorties),
+        attribution_active=_frozen(active),
+        sortis=_frozen(sortis),
+        interventions_en_cours=_frozen(interv),
+        en_intervention=_frozen(en_interv),
+        disponibles=_frozen(dispo),
+        clef_ouverte=_frozen(clefs),
+        alertes=build_alertes(data),
+    )
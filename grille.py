@@ -0,0 +1,98 @@
+"""Rendu HTML des grilles de planning hebdomadaires.
+
+Les pages reconstruisaient à chaque rerun la même table, cellule par cellule,
+avec le même style inline répété dans chaque <td>. Ici la table ne porte
+que des classes (.pl…, définies dans styles.get_css) et le HTML ne dépend
+plus du thème : database.week_table le garde avec l'entrée de cache de la
+feuille d'attributions, par (semaine, jour, actifs affichés, filtres).
+"""
+import html
+
+from records import EMPTY_WEEK, SLOTS
+
+esc = html.escape
+
+JOURS_FR = ('Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim')
+SLOT_ICONS = ('🌅', '🌇')
+# Couleurs des services (.pl-s0 … .pl-s8 ; .pl-sx pour un service inconnu).
+PALETTE = ('#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#84cc16', '#f97316')
+AUTRE = '#6b7280'
+
+
+def service_classes(services):
+    """{service: classe de couleur}, dans l'ordre de la feuille services."""
+    return {s: f"pl-s{i % len(PALETTE)}" for i, s in enumerate(services)}
+
+
+def _head(label, days, today, cls=''):
+    """(début de la table jusqu'à la 1re colonne d'en-tête, en-têtes des jours)."""
+    out = [f"<div class='pl-wrap'><table class='pl{cls}'><thead><tr><th class='pl-h'>{label}</th>"]
+    heads = []
+    for d in days:
+        th = "<th class='pl-today'>" if d == today else "<th>"
+        heads.append(f"{th}{JOURS_FR[d.weekday()]}<br>{d.strftime('%d/%m')}</th>")
+    return out, heads
+
+
+def slot_table(label, assets, occupation, days, today, services):
+    """Table actifs × 7 jours × créneaux (Matin / Après-midi).
+
+    assets : [(identifiant, sous-titre)] ; occupation : records.week_grid de
+    la semaine ; days : les 7 dates affichées."""
+    svc_cls = service_classes(services)
+    out, heads = _head(label, days, today)
+    out.append("<th class='pl-slot'>Slot</th>")
+    out += heads
+    out.append("</tr></thead><tbody>")
+    slots = [f"<td class='pl-slot'>{icon} {periode}</td>" for icon, periode in zip(SLOT_ICONS, SLOTS)]
+    empty = "<td>—</td>"
+    for num, sub in assets:
+        semaine = occupation.get(num, EMPTY_WEEK)
+        out.append(f"<tr><td rowspan='2' class='pl-asset'><b>{esc(num)}</b><br><small>{esc(sub)}</small></td>")
+        for pi, slot in enumerate(slots):
+            if pi:
+                out.append("<tr>")
+            out.append(slot)
+            for jour_slots in semaine:
+                svc = jour_slots[pi]
+                out.append(f"<td class='pl-on {svc_cls.get(svc, 'pl-sx')}'>{esc(svc)}</td>" if svc else empty)
+            out.append("</tr>")
+    out.append("</tbody></table></div>")
+    return ''.join(out)
+
+
+def legende(services):
+    """Pastilles de couleur des services, sous une slot_table."""
+    cls = service_classes(services)
+    badges = " ".join(f"<span class='pl-badge {cls[s]}'>{esc(s)}</span>" for s in services)
+    return f"<div style='margin-top:0.6rem'>{badges}</div>"
+
+
+def zone_table(label, groups, days, today, zone_on, zone_color, marked):
+    """Table « une ligne par engin, une zone par jour » du planning WLG.
+
+    groups : [(titre du groupe ou None, [(identifiant, marque)])] ;
+    zone_on(identifiant, jour) → zone ou None ; marked : identifiants dont la
+    case du jour reçoit 🔑 (clé en circulation)."""
+    out, heads = _head(label, days, today, ' pl-wlg')
+    out += heads
+    out.append("</tr></thead><tbody>")
+    for titre, engins in groups:
+        if titre:
+            out.append(f"<tr><td colspan='8' class='pl-grp'>{titre}</td></tr>")
+        for num, marque in engins:
+            out.append(f"<tr><td class='pl-asset'><b>{esc(num)}</b>")
+            if marque:
+                out.append(f"<br><small>{esc(marque)}</small>")
+            out.append("</td>")
+            for jour in days:
+                is_today = jour == today
+                zone = zone_on(num, jour)
+                if zone:
+                    mk = " 🔑" if is_today and num in marked else ""
+                    out.append(f"<td class='pl-on' style='background:{zone_color(zone)}'>{esc(zone)}{mk}</td>")
+                else:
+                    out.append("<td class='pl-today'>—</td>" if is_today else "<td>—</td>")
+            out.append("</tr>")
+    out.append("</tbody></table></div>")
+    return ''.join(out)
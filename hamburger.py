@@ -1,20 +1,55 @@
+"""Thème de la page : CSS (styles.get_css) et bouton ☰ de la sidebar.
+
+Renvoyer à chaque rerun les ~200 lignes de CSS et le script coûtait des
+octets et du CPU à chaque clic. L'iframe de components.html ne fait
+qu'ajouter un <script> au document parent : ce script, le CSS qu'il pose dans
+le <head>, le bouton et ses gestionnaires (créés dans la page parente, pas
+dans l'iframe) restent quand Streamlit retire l'iframe au rerun suivant. On
+ne l'envoie donc qu'au premier run de la session et quand le thème change.
+Le script est construit une fois par thème et par process.
+"""
+import functools
+import json
+
+import streamlit as st
 import streamlit.components.v1 as components
 
+from styles import THEMES, get_css
 
-def inject_hamburger(t):
-    components.html(f"""
-<script>
+
+@functools.lru_cache(maxsize=None)
+def theme_css(theme):
+    """Règles CSS du thème (get_css sans la balise <style>)."""
+    css = get_css(THEMES[theme])
+    return css[css.index('<style>') + len('<style>'):css.rindex('</style>')]
+
+
+def _parent_code(theme):
+    """Code exécuté dans la page parente (cf. _script)."""
+    t = THEMES[theme]
+    return f"""
 (function() {{
-    var doc = window.parent.document;
-    var isMobile = window.parent.innerWidth <= 768;
+    var win = window;
+    var doc = document;
+    // Un nouvel envoi (changement de thème) rend caducs les timers du précédent.
+    var gen = win.__flotteTheme = (win.__flotteTheme || 0) + 1;
+    var style = doc.getElementById('flotte-theme');
+    if (!style) {{
+        style = doc.createElement('style');
+        style.id = 'flotte-theme';
+        doc.head.appendChild(style);
+    }}
+    style.textContent = {json.dumps(theme_css(theme))};
+
+    var isMobile = win.innerWidth <= 768;
     var sidebarOpen = !isMobile;
     var bgColor = '{t["hamburger_bg"]}';
     var hoverColor = '{t["hamburger_hover"]}';
     var textColor = '{t["h1_color"]}';
 
     function getSidebarWidth() {{
-        if (window.parent.innerWidth <= 480) return Math.min(window.parent.innerWidth * 0.85, 280);
-        if (window.parent.innerWidth <= 768) return Math.min(window.parent.innerWidth * 0.85, 300);
+        if (win.innerWidth <= 480) return Math.min(win.innerWidth * 0.85, 280);
+        if (win.innerWidth <= 768) return Math.min(win.innerWidth * 0.85, 300);
         return 300;
     }}
 
@@ -71,14 +106,43 @@ def inject_hamburger(t):
     }}
 
     function init() {{
+        if (gen !== win.__flotteTheme) return;
         createHamburger();
         setSidebarState(true);
     }}
 
     init();
-    setTimeout(init, 300);
-    setTimeout(init, 1000);
-    setTimeout(init, 2500);
+    win.setTimeout(init, 300);
+    win.setTimeout(init, 1000);
+    win.setTimeout(init, 2500);
+}})();
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _script(theme):
+    # Un <script> créé dans le document parent s'exécute dans son contexte :
+    # ses fonctions et timers survivent à l'iframe qui l'a ajouté.
+    code = json.dumps(_parent_code(theme)).replace('</', '<\\/')
+    return f"""
+<script>
+(function() {{
+    var doc = window.parent.document;
+    var old = doc.getElementById('flotte-theme-js');
+    if (old) old.remove();
+    var s = doc.createElement('script');
+    s.id = 'flotte-theme-js';
+    s.textContent = {code};
+    doc.head.appendChild(s);
 }})();
 </script>
-""", height=0)
+"""
+
+
+def inject_theme(theme):
+    """Envoie CSS + bouton ☰ au premier run de la session ou si le thème a
+    changé ; sinon rien (ils sont déjà dans la page)."""
+    if st.session_state.get('_theme_injecte') == theme:
+        return
+    components.html(_script(theme), height=0)
+    st.session_state['_theme_injecte'] = theme
@@ -4,7 +4,10 @@ Source : WLG - Golfette 2026 - REPARTITION GOLFETTES 2026.pdf
 Usage  : python3 import_golfettes.py
 """
 import os
+import uuid
 import toml
+import quota
+import sheets_backend
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
 
@@ -134,7 +137,7 @@ def connect():
     spreadsheet_id = secrets['google_sheets']['spreadsheet_id']
     scopes = ['https://www.googleapis.com/auth/spreadsheets']
     creds = Credentials.from_service_account_info(creds_info, scopes=scopes)
-    service = build('sheets', 'v4', credentials=creds)
+    service = quota.limit(build('sheets', 'v4', credentials=creds))
     return service, spreadsheet_id
 
 
@@ -176,6 +179,8 @@ def write_sheet(svc, sid, name, data):
         valueInputOption='RAW',
         body={'values': values}
     ).execute()
+    # Jeton _meta : l'app recharge la feuille à sa sonde suivante.
+    sheets_backend.bump_meta(svc, sid, [name])
     print(f"  ✅ {name} : {len(data)} lignes écrites")
 
 
@@ -196,7 +201,7 @@ def main():
     existing_cat_g_noms = {c.get('nom', '') for c in existing_cats_g}
     new_cats_g = [{'nom': c} for c in CATEGORIES_GOLFETTES if c not in existing_cat_g_noms]
     if new_cats_g or not existing_cats_g:
-        all_cats_g = [{'nom': c} for c in CATEGORIES_GOLFETTES]
+        all_cats_g = [{'nom': c, '_id': uuid.uuid4().hex[:12]} for c in CATEGORIES_GOLFETTES]
         write_sheet(svc, sid, 'categories_golfettes', all_cats_g)
         print(f"  Catégories golfettes : {CATEGORIES_GOLFETTES}")
     else:
@@ -206,7 +211,7 @@ def main():
     existing_golf = read_sheet(svc, sid, 'golfettes')
     existing_ids = {g.get('numero_serie', '') for g in existing_golf}
     new_golf = [
-        {'numero_serie': g[0], 'type': g[1], 'marque': g[2]}
+        {'numero_serie': g[0], 'type': g[1], 'marque': g[2], '_id': uuid.uuid4().hex[:12]}
         for g in GOLFETTES
         if g[0] not in existing_ids
     ]
@@ -234,6 +239,7 @@ def main():
                 'date_fin': date_fin,
                 'periode': 'Journée',
                 'retourne': '',
+                '_id': uuid.uuid4().hex[:12],
             })
     if new_attr:
         all_attr = existing_attr + new_attr
@@ -5,8 +5,11 @@ Usage : .venv/bin/python3 import_wlg.py
 """
 import re
 import os
+import uuid
 import pandas as pd
 import toml
+import quota
+import sheets_backend
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
 
@@ -40,7 +43,7 @@ def connect():
         scopes=['https://www.googleapis.com/auth/spreadsheets']
     )
     sid = secrets['google_sheets']['spreadsheet_id']
-    svc = build('sheets', 'v4', credentials=creds)
+    svc = quota.limit(build('sheets', 'v4', credentials=creds))
     return svc, sid
 
 
@@ -58,6 +61,7 @@ def read_sheet(svc, sid, name):
 def write_sheet(svc, sid, name, data):
     svc.spreadsheets().values().clear(spreadsheetId=sid, range=f"{name}!A:Z").execute()
     if not data:
+        sheets_backend.bump_meta(svc, sid, [name])
         return
     headers = list(data[0].keys())
     values = [headers] + [[str(row.get(h, '') or '') for h in headers] for row in data]
@@ -65,6 +69,8 @@ def write_sheet(svc, sid, name, data):
         spreadsheetId=sid, range=f"{name}!A1",
         valueInputOption='RAW', body={'values': values}
     ).execute()
+    # Jeton _meta : l'app recharge la feuille à sa sonde suivante.
+    sheets_backend.bump_meta(svc, sid, [name])
     print(f"  ✅ {name} : {len(data)} lignes écrites")
 
 
@@ -116,6 +122,7 @@ def main():
             'numero_serie': engin_id,
             'type': type_norm,
             'marque': marque,
+            '_id': uuid.uuid4().hex[:12],
         })
 
         # Une attribution par cellule non vide (date × engin)
@@ -136,6 +143,7 @@ def main():
                 'date_fin': date_str,
                 'periode': 'Journée',
                 'retourne': '',
+                '_id': uuid.uuid4().hex[:12],
             })
 
     print(f"  {len(engins_to_add)} engins")
@@ -149,7 +157,7 @@ def main():
     cat_noms = {c.get('nom') for c in cats}
     new_types = {e['type'] for e in engins_to_add} - cat_noms
     if new_types:
-        cats += [{'nom': t} for t in sorted(new_types)]
+        cats += [{'nom': t, '_id': uuid.uuid4().hex[:12]} for t in sorted(new_types)]
         write_sheet(svc, sid, 'categories_engins', cats)
         print(f"  Catégories ajoutées : {sorted(new_types)}")
 
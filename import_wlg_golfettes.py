@@ -16,9 +16,12 @@ catégories_golfettes par les 4 nouveaux types (Cargo L, Cargo S, 4 places,
 Usage : .venv/bin/python3 import_wlg_golfettes.py
 """
 import os
+import uuid
 from datetime import date, timedelta
 import openpyxl
 import toml
+import quota
+import sheets_backend
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
 
@@ -47,7 +50,7 @@ def connect():
         scopes=['https://www.googleapis.com/auth/spreadsheets']
     )
     sid = secrets['google_sheets']['spreadsheet_id']
-    svc = build('sheets', 'v4', credentials=creds)
+    svc = quota.limit(build('sheets', 'v4', credentials=creds))
     return svc, sid
 
 
@@ -66,6 +69,7 @@ def read_sheet(svc, sid, name):
 def write_sheet(svc, sid, name, data, headers=None):
     svc.spreadsheets().values().clear(spreadsheetId=sid, range=f"{name}!A:Z").execute()
     if not data and not headers:
+        sheets_backend.bump_meta(svc, sid, [name])
         return
     if headers is None:
         headers = list(data[0].keys())
@@ -74,6 +78,8 @@ def write_sheet(svc, sid, name, data, headers=None):
         spreadsheetId=sid, range=f"{name}!A1",
         valueInputOption='RAW', body={'values': values}
     ).execute()
+    # Jeton _meta : l'app recharge la feuille à sa sonde suivante.
+    sheets_backend.bump_meta(svc, sid, [name])
     print(f"  ✅ {name} : {len(data)} lignes écrites")
 
 
@@ -142,6 +148,7 @@ def main():
                 'date_fin': d.strftime("%d/%m/%Y"),
                 'periode': 'Journée',
                 'retourne': '',
+                '_id': uuid.uuid4().hex[:12],
             })
 
     print(f"  {len(golfettes_to_upsert)} golfettes à upsert")
@@ -154,7 +161,9 @@ def main():
     # ── 1. Catégories : remplace par les 4 nouvelles ───────────────────────
     cats_data, cats_headers = read_sheet(svc, sid, 'categories_golfettes')
     headers = cats_headers if cats_headers else ['nom']
-    new_cats = [{'nom': c} for c in NEW_CATEGORIES]
+    if '_id' not in headers:
+        headers = headers + ['_id']
+    new_cats = [{'nom': c, '_id': uuid.uuid4().hex[:12]} for c in NEW_CATEGORIES]
     write_sheet(svc, sid, 'categories_golfettes', new_cats, headers=headers)
     print(f"  ✅ categories_golfettes remplacées : {NEW_CATEGORIES}")
 
@@ -162,6 +171,8 @@ def main():
     existing_golf, golf_headers = read_sheet(svc, sid, 'golfettes')
     if not golf_headers:
         golf_headers = ['numero_serie', 'type', 'marque']
+    if '_id' not in golf_headers:
+        golf_headers = golf_headers + ['_id']
     by_id = {g.get('numero_serie'): g for g in existing_golf}
     nb_new, nb_upd = 0, 0
     for g in golfettes_to_upsert:
@@ -172,6 +183,7 @@ def main():
             entry = {h: '' for h in golf_headers}
             entry['numero_serie'] = g['numero_serie']
             entry['type'] = g['type']
+            entry['_id'] = uuid.uuid4().hex[:12]
             by_id[g['numero_serie']] = entry
             nb_new += 1
     write_sheet(svc, sid, 'golfettes', list(by_id.values()), headers=golf_headers)
@@ -181,6 +193,8 @@ def main():
     existing_attrs, attrs_headers = read_sheet(svc, sid, 'attributions_golfettes')
     if not attrs_headers:
         attrs_headers = ['numero_serie', 'service', 'date', 'date_fin', 'periode', 'retourne']
+    if '_id' not in attrs_headers:
+        attrs_headers = attrs_headers + ['_id']
     write_sheet(svc, sid, 'attributions_golfettes', attributions_to_add, headers=attrs_headers)
     print(f"  ✅ {len(attributions_to_add)} attributions WLG"
           f" (remplacé {len(existing_attrs)} anciennes)")
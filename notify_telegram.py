@@ -44,6 +44,7 @@ secrets = load_secrets()
 
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+import quota
 
 
 def get_service():
@@ -51,7 +52,7 @@ def get_service():
         secrets['gcp_service_account'],
         scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
     )
-    return build('sheets', 'v4', credentials=creds)
+    return quota.limit(build('sheets', 'v4', credentials=creds))
 
 
 def read_sheet(service, sheet_name):
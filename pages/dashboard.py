@@ -1,11 +1,12 @@
 import html
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from database import (
     retourner_vehicule, retourner_scooter, retourner_engin, retourner_golfette,
-    _is_engin_active_today
+    fleet_state, slot_week_table
 )
+import grille
+from records import parse_date
 
 esc = html.escape
 
@@ -37,68 +38,131 @@ def _render_planning_engins(t, engins, attributions_engins, services):
         st.info("Aucun engin enregistré")
         return
 
-    JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
-    jours_sem = [semaine_debut + timedelta(days=i) for i in range(7)]
-    _PALETTE = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#84cc16', '#f97316']
-    svc_color = {s: _PALETTE[i % len(_PALETTE)] for i, s in enumerate(services)}
-
-    def _get_slot(num_serie, day, periode):
-        for a in attributions_engins:
-            if a.get('numero_serie') != num_serie or a.get('retourne'):
-                continue
-            try:
-                dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-                df_d = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-                if dd <= day <= df_d:
-                    p = a.get('periode', 'Journée')
-                    if p == 'Journée' or p == periode:
-                        return a['service']
-            except Exception:
-                pass
-        return None
-
-    cb = t['card_border']
-    ib = t['input_bg']
-    hc = t['h23_color']
-    ic = t['intro_color']
-    th_s = f"padding:0.45rem 0.4rem; border:1px solid {cb}; text-align:center; background:{ib}; color:{hc}; font-weight:600; font-size:0.8rem;"
-    td_s = f"border:1px solid {cb}; text-align:center; padding:0.3rem 0.25rem; font-size:0.75rem;"
-    td_eng_s = f"{td_s} background:{ib}; color:{hc}; text-align:left; padding:0.4rem 0.5rem; min-width:110px;"
-    td_slot_s = f"{td_s} background:{ib}; color:{ic}; min-width:52px;"
-
-    planning_html = f"<div style='overflow-x:auto'><table style='width:100%; border-collapse:collapse;'><thead><tr>"
-    planning_html += f"<th style='{th_s} text-align:left; min-width:110px;'>Engin</th>"
-    planning_html += f"<th style='{th_s} min-width:52px;'>Slot</th>"
-    for i, jour in enumerate(jours_sem):
-        jour_color = '#f59e0b' if jour == today_date else hc
-        planning_html += f"<th style='{th_s} color:{jour_color}; min-width:88px;'>{JOURS_FR[i]}<br>{jour.strftime('%d/%m')}</th>"
-    planning_html += "</tr></thead><tbody>"
-
-    for eng in engins:
-        num = eng.get('numero_serie', '')
-        eng_label = f"<b>{esc(num)}</b><br><small style='color:{ic}'>{esc(eng.get('type',''))} {esc(eng.get('marque',''))}</small>"
-        for pi, (periode, icon) in enumerate([('Matin', '🌅'), ('Après-midi', '🌇')]):
-            planning_html += "<tr>"
-            if pi == 0:
-                planning_html += f"<td rowspan='2' style='{td_eng_s}'>{eng_label}</td>"
-            planning_html += f"<td style='{td_slot_s}'>{icon} {periode}</td>"
-            for jour in jours_sem:
-                svc = _get_slot(num, jour, periode)
-                if svc:
-                    bg = svc_color.get(svc, '#6b7280')
-                    planning_html += f"<td style='{td_s} background:{bg}; color:white; font-weight:500;'>{esc(svc)}</td>"
-                else:
-                    planning_html += f"<td style='{td_s} color:{ic};'>—</td>"
-            planning_html += "</tr>"
-
-    planning_html += "</tbody></table></div>"
-    st.markdown(planning_html, unsafe_allow_html=True)
-
-    legende = " ".join(
-        f"<span style='background:{svc_color.get(s,'#6b7280')}; color:white; padding:0.2rem 0.6rem; border-radius:12px; font-size:0.75rem; margin-right:0.3rem;'>{esc(s)}</span>"
-        for s in services
+    assets = [(r.get('numero_serie', ''), f"{r.get('type','')} {r.get('marque','')}") for r in engins]
+    st.markdown(slot_week_table('attributions_engins', "Engin", assets, semaine_debut, today_date, services),
+                unsafe_allow_html=True)
+    st.markdown(grille.legende(services), unsafe_allow_html=True)
+
+
+# ── Listes « 📋 Détails » ───────────────────────────────────────────────────
+# Une carte st.markdown par actif, c'était un message par ligne vers le
+# navigateur : la liste est filtrée, triée et découpée en pages, et la page
+# part en un seul bloc HTML (classes .dash-card de styles.get_css).
+
+TAILLES_PAGE = (10, 25, 50, 100)
+_STATUTS = {'interv': (0, "🔧 En intervention"), 'sortie': (1, None), 'dispo': (2, "✅ Disponible")}
+
+
+def _fiches_actifs(actifs, id_key, sortis, en_interv, libelle_sortie="🔑 Distribué"):
+    fiches = []
+    for a in actifs:
+        ident = a.get(id_key, '')
+        etat = 'interv' if ident in en_interv else 'sortie' if ident in sortis else 'dispo'
+        fiches.append({'id': ident, 'actif': a, 'etat': etat,
+                       'statut': _STATUTS[etat][1] or libelle_sortie})
+    return fiches
+
+
+def _entete(f):
+    actif = f['actif']
+    icone = f"{f['icone']} " if f.get('icone') else ''
+    return (f"<span class='dc-id'>{icone}{esc(f['id'])}</span>"
+            f"<span class='dc-sub'>{esc(actif.get('marque', ''))} — {esc(actif.get('type', ''))}</span>")
+
+
+def _carte_actif(f):
+    return (f"<div class='dash-card dc-{f['etat']}'>{_entete(f)}"
+            f"<br/><span class='dc-statut'>{f['statut']}</span></div>")
+
+
+def _carte_sortie(f):
+    a = f['attr']
+    return (f"<div class='dash-card dc-sortie'>{_entete(f)}<br/>"
+            f"<span class='dc-info'>📅 Sorti le {esc(a.get('date', ''))} à {esc(a.get('heure', ''))}</span>"
+            f"<span class='dc-info'>🏢 Service : {esc(a.get('service', ''))}</span>"
+            f"<span class='dc-info'>📆 Retour prévu : {esc(a.get('date_retour_prevue', 'N/A'))}</span></div>")
+
+
+def _carte_intervention(f):
+    i = f['attr']
+    return (f"<div class='dash-card dc-interv'>{_entete(f)}<br/>"
+            f"<span class='dc-info'>🔧 {esc(i.get('type', ''))} — 📅 {esc(i.get('date', ''))} à {esc(i.get('heure', ''))}</span>"
+            f"<span class='dc-info'>💬 {esc(i.get('commentaire', ''))}</span></div>")
+
+
+def _date_key(value):
+    d = parse_date(value)
+    return (d is None, d or date.min)
+
+
+# libellé → clé de tri (sorted est stable : à égalité, l'ordre des lignes).
+_TRIS_ACTIFS = {
+    "Identifiant": lambda f: f['id'],
+    "Statut": lambda f: _STATUTS[f['etat']][0],
+    "Marque": lambda f: f['actif'].get('marque', ''),
+}
+_TRIS_SORTIES = {
+    "Ordre de sortie": lambda f: 0,
+    "Identifiant": lambda f: f['id'],
+    "Service": lambda f: f['attr'].get('service', ''),
+    "Retour prévu": lambda f: _date_key(f['attr'].get('date_retour_prevue')),
+}
+_TRIS_INTERVENTIONS = {
+    "Catégorie": lambda f: f['cat'],
+    "Identifiant": lambda f: f['id'],
+    "Date": lambda f: _date_key(f['attr'].get('date')),
+}
+
+
+def _texte(f):
+    """Texte cherché : identifiant, marque, type et champs de la ligne affichée."""
+    actif, attr = f['actif'], f.get('attr', {})
+    return ' '.join(str(v) for v in (
+        f['id'], actif.get('marque', ''), actif.get('type', ''), f.get('statut', ''),
+        attr.get('service', ''), attr.get('type', ''), attr.get('commentaire', ''),
+    )).lower()
+
+
+def _reset_page(key):
+    st.session_state[f"{key}_page"] = 0
+
+
+def _tourner_page(key, pas):
+    st.session_state[f"{key}_page"] = st.session_state.get(f"{key}_page", 0) + pas
+
+
+@st.fragment
+def _liste_paginee(key, fiches, carte, tris):
+    """Recherche, tri et pagination d'une liste de fiches ; carte(fiche) → HTML.
+    Fragment : changer de page ou de tri ne relance pas tout le tableau de bord."""
+    c_q, c_tri, c_taille = st.columns([3, 2, 1])
+    q = c_q.text_input("🔎 Rechercher", key=f"{key}_q", on_change=_reset_page, args=(key,))
+    tri = c_tri.selectbox("Trier par", list(tris), key=f"{key}_tri", on_change=_reset_page, args=(key,))
+    taille = c_taille.selectbox("Par page", TAILLES_PAGE, key=f"{key}_taille", on_change=_reset_page, args=(key,))
+
+    q = (q or '').strip().lower()
+    if q:
+        fiches = [f for f in fiches if q in _texte(f)]
+    fiches = sorted(fiches, key=tris[tri])
+    nb_pages = max(1, -(-len(fiches) // taille))
+    page = max(0, min(st.session_state.get(f"{key}_page", 0), nb_pages - 1))
+    st.session_state[f"{key}_page"] = page
+
+    c_prev, c_info, c_next = st.columns([1, 3, 1])
+    c_prev.button("← Préc.", key=f"{key}_prev", disabled=page == 0,
+                  on_click=_tourner_page, args=(key, -1))
+    c_next.button("Suiv. →", key=f"{key}_next", disabled=page >= nb_pages - 1,
+                  on_click=_tourner_page, args=(key, 1))
+    c_info.markdown(
+        f"<p class='dash-pager'>Page {page + 1} / {nb_pages} — {len(fiches)} résultat(s)</p>",
+        unsafe_allow_html=True,
     )
-    st.markdown(f"<div style='margin-top:0.6rem'>{legende}</div>", unsafe_allow_html=True)
+
+    if fiches:
+        debut = page * taille
+        st.markdown(''.join(carte(f) for f in fiches[debut:debut + taille]), unsafe_allow_html=True)
+    else:
+        st.info("Aucun résultat")
 
 
 def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters,
@@ -121,29 +185,30 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
     interventions_golfettes = interventions_golfettes or []
 
     nb_vehicules = len(vehicules)
-    sorties_en_cours = [a for a in attributions if not a.get('retourne')]
+    fs = fleet_state()
+    sorties_en_cours = fs.sorties['vehicules']
     nb_en_sortie = len(sorties_en_cours)
     nb_scooters = len(scooters)
     nb_engins = len(engins)
     nb_golfettes = len(golfettes)
-    interventions_en_cours_v = [i for i in interventions if i.get('statut') == "En cours"]
-    interventions_en_cours_e = [i for i in interventions_engins if i.get('statut') == "En cours"]
-    interventions_en_cours_s = [i for i in interventions_scooters if i.get('statut') == "En cours"]
-    interventions_en_cours_g = [i for i in interventions_golfettes if i.get('statut') == "En cours"]
+    interventions_en_cours_v = fs.interventions_en_cours['vehicules']
+    interventions_en_cours_e = fs.interventions_en_cours['engins']
+    interventions_en_cours_s = fs.interventions_en_cours['scooters']
+    interventions_en_cours_g = fs.interventions_en_cours['golfettes']
     nb_interventions = len(interventions_en_cours_v) + len(interventions_en_cours_e) + len(interventions_en_cours_s) + len(interventions_en_cours_g)
 
-    vh_map = {v['immatriculation']: v for v in vehicules}
-    sco_map = {s['immatriculation']: s for s in scooters}
-    eng_map = {e['numero_serie']: e for e in engins}
-    golf_map = {g['numero_serie']: g for g in golfettes}
-    sorties_set_vh = {a['immatriculation'] for a in attributions if not a.get('retourne')}
-    sorties_set_sco = {a['immatriculation'] for a in attributions_scooters if not a.get('retourne')}
-    sorties_set_eng = {a['numero_serie'] for a in attributions_engins if _is_engin_active_today(a)}
-    sorties_set_golf = {a['numero_serie'] for a in attributions_golfettes if _is_engin_active_today(a)}
-    interv_set_vh = {i['immatriculation'] for i in interventions if i.get('statut') == "En cours"}
-    interv_set_sco = {i['immatriculation'] for i in interventions_scooters if i.get('statut') == "En cours"}
-    interv_set_eng = {i['numero_serie'] for i in interventions_engins if i.get('statut') == "En cours"}
-    interv_set_golf = {i['numero_serie'] for i in interventions_golfettes if i.get('statut') == "En cours"}
+    vh_map = fs.par_id['vehicules']
+    sco_map = fs.par_id['scooters']
+    eng_map = fs.par_id['engins']
+    golf_map = fs.par_id['golfettes']
+    sorties_set_vh = fs.sortis['vehicules']
+    sorties_set_sco = fs.sortis['scooters']
+    sorties_set_eng = fs.sortis['engins']
+    sorties_set_golf = fs.sortis['golfettes']
+    interv_set_vh = fs.en_intervention['vehicules']
+    interv_set_sco = fs.en_intervention['scooters']
+    interv_set_eng = fs.en_intervention['engins']
+    interv_set_golf = fs.en_intervention['golfettes']
 
     col1, col2, col3, col4, col5, col6 = st.columns(6)
     with col1:
@@ -177,24 +242,8 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
         st.markdown("---")
         st.markdown("### 🚙 Détail des Véhicules")
         if vehicules:
-            for v in vehicules:
-                immat = v.get('immatriculation', '')
-                en_sortie = immat in sorties_set_vh
-                en_interv = immat in interv_set_vh
-                if en_interv:
-                    statut = "🔧 En intervention"
-                    couleur = "#f59e0b"
-                elif en_sortie:
-                    statut = "🔑 Distribué"
-                    couleur = "#ef4444"
-                else:
-                    statut = "✅ Disponible"
-                    couleur = "#10b981"
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid {couleur};border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;font-size:1rem;'>{esc(immat)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(v.get('marque',''))} — {esc(v.get('type',''))}</span>
-                    <br/><span style='color:{couleur};font-weight:500;font-size:0.9rem;'>{statut}</span>
-                </div>""", unsafe_allow_html=True)
+            _liste_paginee('dl_vehicules', _fiches_actifs(vehicules, 'immatriculation', sorties_set_vh, interv_set_vh),
+                           _carte_actif, _TRIS_ACTIFS)
         else:
             st.info("Aucun véhicule enregistré")
 
@@ -202,16 +251,9 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
         st.markdown("---")
         st.markdown("### 🔑 Véhicules distribués")
         if sorties_en_cours:
-            for a in sorties_en_cours:
-                immat = a.get('immatriculation', '')
-                info_v = vh_map.get(immat, {})
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid #ef4444;border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;'>{esc(immat)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(info_v.get('marque',''))} — {esc(info_v.get('type',''))}</span><br/>
-                    <span style='color:{t['text_color']};font-size:0.85rem;'>📅 Sorti le {esc(a.get('date',''))} à {esc(a.get('heure',''))}</span>
-                    <span style='color:{t['text_color']};font-size:0.85rem;margin-left:1rem;'>🏢 Service : {esc(a.get('service',''))}</span>
-                    <span style='color:{t['text_color']};font-size:0.85rem;margin-left:1rem;'>📆 Retour prévu : {esc(a.get('date_retour_prevue','N/A'))}</span>
-                </div>""", unsafe_allow_html=True)
+            fiches = [{'id': a.get('immatriculation', ''), 'actif': vh_map.get(a.get('immatriculation', ''), {}), 'attr': a}
+                      for a in sorties_en_cours]
+            _liste_paginee('dl_en_sortie', fiches, _carte_sortie, _TRIS_SORTIES)
         else:
             st.info("Aucun véhicule distribué actuellement")
 
@@ -219,24 +261,8 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
         st.markdown("---")
         st.markdown("### 🚜 Détail des Engins")
         if engins:
-            for e in engins:
-                num = e.get('numero_serie', '')
-                en_sortie = num in sorties_set_eng
-                en_interv = num in interv_set_eng
-                if en_interv:
-                    statut = "🔧 En intervention"
-                    couleur = "#f59e0b"
-                elif en_sortie:
-                    statut = "🔑 Distribué"
-                    couleur = "#ef4444"
-                else:
-                    statut = "✅ Disponible"
-                    couleur = "#10b981"
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid {couleur};border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;font-size:1rem;'>{esc(num)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(e.get('marque',''))} — {esc(e.get('type',''))}</span>
-                    <br/><span style='color:{couleur};font-weight:500;font-size:0.9rem;'>{statut}</span>
-                </div>""", unsafe_allow_html=True)
+            _liste_paginee('dl_engins', _fiches_actifs(engins, 'numero_serie', sorties_set_eng, interv_set_eng),
+                           _carte_actif, _TRIS_ACTIFS)
         else:
             st.info("Aucun engin enregistré")
 
@@ -244,24 +270,8 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
         st.markdown("---")
         st.markdown("### ⛳ Détail des Golfettes")
         if golfettes:
-            for g in golfettes:
-                num = g.get('numero_serie', '')
-                en_sortie = num in sorties_set_golf
-                en_interv = num in interv_set_golf
-                if en_interv:
-                    statut = "🔧 En intervention"
-                    couleur = "#f59e0b"
-                elif en_sortie:
-                    statut = "🔑 Distribuée"
-                    couleur = "#ef4444"
-                else:
-                    statut = "✅ Disponible"
-                    couleur = "#10b981"
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid {couleur};border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;font-size:1rem;'>{esc(num)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(g.get('marque',''))} — {esc(g.get('type',''))}</span>
-                    <br/><span style='color:{couleur};font-weight:500;font-size:0.9rem;'>{statut}</span>
-                </div>""", unsafe_allow_html=True)
+            _liste_paginee('dl_golfettes', _fiches_actifs(golfettes, 'numero_serie', sorties_set_golf, interv_set_golf, "🔑 Distribuée"),
+                           _carte_actif, _TRIS_ACTIFS)
         else:
             st.info("Aucune golfette enregistrée")
 
@@ -269,75 +279,27 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
         st.markdown("---")
         st.markdown("### 🛵 Détail des Scooters")
         if scooters:
-            for s in scooters:
-                immat = s.get('immatriculation', '')
-                en_sortie = immat in sorties_set_sco
-                en_interv = immat in interv_set_sco
-                if en_interv:
-                    statut = "🔧 En intervention"
-                    couleur = "#f59e0b"
-                elif en_sortie:
-                    statut = "🔑 Distribué"
-                    couleur = "#ef4444"
-                else:
-                    statut = "✅ Disponible"
-                    couleur = "#10b981"
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid {couleur};border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;font-size:1rem;'>{esc(immat)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(s.get('marque',''))} — {esc(s.get('type',''))}</span>
-                    <br/><span style='color:{couleur};font-weight:500;font-size:0.9rem;'>{statut}</span>
-                </div>""", unsafe_allow_html=True)
+            _liste_paginee('dl_scooters', _fiches_actifs(scooters, 'immatriculation', sorties_set_sco, interv_set_sco),
+                           _carte_actif, _TRIS_ACTIFS)
         else:
             st.info("Aucun scooter enregistré")
 
     elif detail == 'interventions':
         st.markdown("---")
         st.markdown("### 🔨 Interventions en cours")
-        if interventions_en_cours_v:
-            st.markdown("#### 🚗 Véhicules")
-            for i in interventions_en_cours_v:
-                immat = i.get('immatriculation', '')
-                info_v = vh_map.get(immat, {})
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid #f59e0b;border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;'>{esc(immat)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(info_v.get('marque',''))} — {esc(info_v.get('type',''))}</span><br/>
-                    <span style='color:{t['text_color']};font-size:0.85rem;'>🔧 {esc(i.get('type',''))} — 📅 {esc(i.get('date',''))} à {esc(i.get('heure',''))}</span>
-                    <span style='color:{t['text_color']};font-size:0.85rem;margin-left:1rem;'>💬 {esc(i.get('commentaire',''))}</span>
-                </div>""", unsafe_allow_html=True)
-        if interventions_en_cours_s:
-            st.markdown("#### 🛵 Scooters")
-            for i in interventions_en_cours_s:
-                immat = i.get('immatriculation', '')
-                info_s = sco_map.get(immat, {})
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid #f59e0b;border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;'>{esc(immat)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(info_s.get('marque',''))} — {esc(info_s.get('type',''))}</span><br/>
-                    <span style='color:{t['text_color']};font-size:0.85rem;'>🔧 {esc(i.get('type',''))} — 📅 {esc(i.get('date',''))} à {esc(i.get('heure',''))}</span>
-                    <span style='color:{t['text_color']};font-size:0.85rem;margin-left:1rem;'>💬 {esc(i.get('commentaire',''))}</span>
-                </div>""", unsafe_allow_html=True)
-        if interventions_en_cours_e:
-            st.markdown("#### 🚜 Engins")
-            for i in interventions_en_cours_e:
-                num = i.get('numero_serie', '')
-                info_e = eng_map.get(num, {})
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid #f59e0b;border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;'>{esc(num)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(info_e.get('marque',''))} — {esc(info_e.get('type',''))}</span><br/>
-                    <span style='color:{t['text_color']};font-size:0.85rem;'>🔧 {esc(i.get('type',''))} — 📅 {esc(i.get('date',''))} à {esc(i.get('heure',''))}</span>
-                    <span style='color:{t['text_color']};font-size:0.85rem;margin-left:1rem;'>💬 {esc(i.get('commentaire',''))}</span>
-                </div>""", unsafe_allow_html=True)
-        if interventions_en_cours_g:
-            st.markdown("#### ⛳ Golfettes")
-            for i in interventions_en_cours_g:
-                num = i.get('numero_serie', '')
-                info_g = golf_map.get(num, {})
-                st.markdown(f"""<div style='background:{t['card_bg']};border:1px solid {t['card_border']};border-left:4px solid #f59e0b;border-radius:10px;padding:0.8rem 1.2rem;margin-bottom:0.5rem;'>
-                    <span style='color:{t['h1_color']};font-weight:600;'>{esc(num)}</span>
-                    <span style='color:{t['label_color']};margin-left:1rem;'>{esc(info_g.get('marque',''))} — {esc(info_g.get('type',''))}</span><br/>
-                    <span style='color:{t['text_color']};font-size:0.85rem;'>🔧 {esc(i.get('type',''))} — 📅 {esc(i.get('date',''))} à {esc(i.get('heure',''))}</span>
-                    <span style='color:{t['text_color']};font-size:0.85rem;margin-left:1rem;'>💬 {esc(i.get('commentaire',''))}</span>
-                </div>""", unsafe_allow_html=True)
-        if not interventions_en_cours_v and not interventions_en_cours_e and not interventions_en_cours_s and not interventions_en_cours_g:
+        fiches = [
+            {'id': i.get(id_key, ''), 'actif': par_id.get(i.get(id_key, ''), {}), 'attr': i, 'cat': cat, 'icone': icone}
+            for cat, (icone, en_cours, id_key, par_id) in enumerate([
+                ("🚗", interventions_en_cours_v, 'immatriculation', vh_map),
+                ("🛵", interventions_en_cours_s, 'immatriculation', sco_map),
+                ("🚜", interventions_en_cours_e, 'numero_serie', eng_map),
+                ("⛳", interventions_en_cours_g, 'numero_serie', golf_map),
+            ])
+            for i in en_cours
+        ]
+        if fiches:
+            _liste_paginee('dl_interventions', fiches, _carte_intervention, _TRIS_INTERVENTIONS)
+        else:
             st.info("Aucune intervention en cours")
 
     st.markdown("---")
@@ -352,6 +314,7 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
 
     st.markdown("---")
     st.markdown("### 📋 Sorties du Jour")
+    import pandas as pd  # import lent : seulement pour les tableaux ci-dessous, pas au démarrage
     aujourd_hui = datetime.now().strftime("%d/%m/%Y")
 
     with st.expander("🚗 Véhicules", expanded=False):
@@ -398,7 +361,7 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
             st.warning("⚠️ Aucune attribution")
 
     with st.expander("🚜 Engins", expanded=False):
-        sorties_jour_eng = [a for a in attributions_engins if _is_engin_active_today(a)]
+        sorties_jour_eng = fs.sorties['engins']
         if sorties_jour_eng:
             df_eng = pd.DataFrame(sorties_jour_eng)
             df_eng['type'] = df_eng['numero_serie'].map(lambda x: eng_map.get(x, {}).get('type', ''))
@@ -465,7 +428,7 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
 
     st.markdown("---")
     st.markdown("### 🔙 Retourner un Véhicule")
-    sortis = [a for a in attributions if not a.get('retourne')]
+    sortis = fs.sorties['vehicules']
     if sortis:
         col_r1, col_r2 = st.columns([3, 1])
         immat_ret = col_r1.selectbox("Véhicule", [f"{v['immatriculation']} - {v['service']}" for v in sortis])
@@ -478,7 +441,7 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
 
     st.markdown("---")
     st.markdown("### 🔙 Retourner un Scooter")
-    sortis_sco = [a for a in attributions_scooters if not a.get('retourne')]
+    sortis_sco = fs.sorties['scooters']
     if sortis_sco:
         col_r1, col_r2 = st.columns([3, 1])
         options_sco = []
@@ -495,7 +458,7 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
 
     st.markdown("---")
     st.markdown("### 🔙 Retourner un Engin")
-    sortis_engins_dash = [a for a in attributions_engins if _is_engin_active_today(a)]
+    sortis_engins_dash = fs.sorties['engins']
     if sortis_engins_dash:
         col_r1, col_r2 = st.columns([3, 1])
         engin_ret_dash = col_r1.selectbox("Engin", [f"{e['numero_serie']} - {e['service']}" for e in sortis_engins_dash])
@@ -508,7 +471,7 @@ def render_dashboard(t, vehicules, attributions, scooters, attributions_scooters
 
     st.markdown("---")
     st.markdown("### 🔙 Retourner une Golfette")
-    sortis_golf_dash = [a for a in attributions_golfettes if _is_engin_active_today(a)]
+    sortis_golf_dash = fs.sorties['golfettes']
     if sortis_golf_dash:
         col_r1, col_r2 = st.columns([3, 1])
         golf_ret_dash = col_r1.selectbox("Golfette", [f"{a['numero_serie']} - {a['service']}" for a in sortis_golf_dash])
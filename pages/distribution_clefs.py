@@ -12,7 +12,15 @@ esc = html.escape
 def render_distribution_clefs(t, engins, vehicules, scooters, golfettes=None):
     st.markdown("# 🔑 Distribution des Clés")
     st.markdown("<p class='page-intro'>Traçabilité des remises et retours de clés</p>", unsafe_allow_html=True)
+    _distribution(t, engins, vehicules, scooters, golfettes)
 
+
+@st.fragment
+def _distribution(t, engins, vehicules, scooters, golfettes):
+    """Indicateurs, formulaires et listes de clés : une distribution ou un
+    retour ne relance que ce fragment (pas tout app.py). Seule la feuille
+    distribution_clefs change : elle est relue à chaque passage, les listes
+    d'actifs passées en argument restent valables."""
     clefs = get_distribution_clefs()
     en_circulation = [c for c in clefs if not c.get('retour_clef')]
     rendues = [c for c in clefs if c.get('retour_clef')]
@@ -43,7 +51,7 @@ def render_distribution_clefs(t, engins, vehicules, scooters, golfettes=None):
                         add_distribution_clef('engin', identifiant, nom.strip(), commentaire)
                         st.success(f"✅ Clé {identifiant} distribuée à {nom}")
                         st.session_state['_fk'] = st.session_state.get('_fk', 0) + 1
-                        st.rerun()
+                        st.rerun(scope="fragment")
                     else:
                         st.error("❌ Le nom du preneur est requis")
         else:
@@ -63,7 +71,7 @@ def render_distribution_clefs(t, engins, vehicules, scooters, golfettes=None):
                         add_distribution_clef('vehicule', identifiant_v, nom_v.strip(), commentaire_v)
                         st.success(f"✅ Clé {identifiant_v} distribuée à {nom_v}")
                         st.session_state['_fk'] = st.session_state.get('_fk', 0) + 1
-                        st.rerun()
+                        st.rerun(scope="fragment")
                     else:
                         st.error("❌ Le nom du preneur est requis")
         else:
@@ -84,7 +92,7 @@ def render_distribution_clefs(t, engins, vehicules, scooters, golfettes=None):
                         add_distribution_clef('golfette', identifiant_g, nom_g.strip(), commentaire_g)
                         st.success(f"✅ Clé {identifiant_g} distribuée à {nom_g}")
                         st.session_state['_fk'] = st.session_state.get('_fk', 0) + 1
-                        st.rerun()
+                        st.rerun(scope="fragment")
                     else:
                         st.error("❌ Le nom du preneur est requis")
         else:
@@ -111,9 +119,14 @@ def render_distribution_clefs(t, engins, vehicules, scooters, golfettes=None):
                 unsafe_allow_html=True
             )
             if col_btn.button("✅ Rendu", key=f"ret_clef_{idx}", type="primary"):
-                retour_clef(idx)
-                st.success("✅ Clé rendue !")
-                st.rerun()
+                try:
+                    retour_clef(c.get('_id', ''))
+                except KeyError:
+                    st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                    st.button("🔄 Recharger", key=f"reload_clef_{idx}")
+                else:
+                    st.success("✅ Clé rendue !")
+                    st.rerun(scope="fragment")
 
     if rendues:
         st.markdown("---")
@@ -134,5 +147,10 @@ def render_distribution_clefs(t, engins, vehicules, scooters, golfettes=None):
                     unsafe_allow_html=True
                 )
                 if col_d.button("🗑️", key=f"del_clef_{idx}"):
-                    delete_distribution_clef(idx)
-                    st.rerun()
+                    try:
+                        delete_distribution_clef(c.get('_id', ''))
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_clef_{idx}")
+                    else:
+                        st.rerun(scope="fragment")
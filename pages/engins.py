@@ -4,10 +4,10 @@ from datetime import datetime, timedelta
 from database import (
     add_engin, delete_engin, update_engin_prestataire,
     add_attribution_engin, update_attribution_engin, delete_attribution_engin,
-    _is_engin_active_today, add_intervention_engin, update_intervention_engin,
+    fleet_state, slot_week_table, add_intervention_engin, update_intervention_engin,
     retourner_engin
 )
-from alertes import verifier_alertes_engins
+import grille
 
 STATUTS_INTERV = ["En cours", "Terminée", "En attente"]
 
@@ -31,11 +31,11 @@ def _page_vue(t, engins, attributions_engins, services, interventions_engins):
     st.markdown("<p class='page-intro'>Tableau de bord opérationnel — engins</p>", unsafe_allow_html=True)
 
     today_date = datetime.now().date()
-    distribues = [a for a in attributions_engins if _is_engin_active_today(a)]
-    distribues_ids = {a['numero_serie'] for a in distribues}
-    interv_en_cours = [i for i in interventions_engins if i.get('statut') == "En cours"]
-    interv_ids = {i['numero_serie'] for i in interv_en_cours}
-    disponibles = [e for e in engins if e['numero_serie'] not in distribues_ids and e['numero_serie'] not in interv_ids]
+    fs = fleet_state()
+    distribues = fs.sorties['engins']
+    distribues_ids = fs.sortis['engins']
+    interv_en_cours = fs.interventions_en_cours['engins']
+    disponibles = fs.disponibles['engins']
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("🚜 Total", len(engins))
@@ -43,7 +43,7 @@ def _page_vue(t, engins, attributions_engins, services, interventions_engins):
     col3.metric("✅ Disponibles", len(disponibles))
     col4.metric("🔧 Interventions", len(interv_en_cours))
 
-    alertes = verifier_alertes_engins(attributions_engins)
+    alertes = fs.alertes['engins']
     if alertes:
         st.markdown("---")
         st.markdown("### 🚨 Alertes")
@@ -75,66 +75,10 @@ def _page_vue(t, engins, attributions_engins, services, interventions_engins):
         st.rerun()
 
     if engins:
-        JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
-        jours_sem = [semaine_debut + timedelta(days=i) for i in range(7)]
-        _PALETTE = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#84cc16', '#f97316']
-        svc_color = {s: _PALETTE[i % len(_PALETTE)] for i, s in enumerate(services)}
-
-        def _get_slot(num_serie, day, periode):
-            for a in attributions_engins:
-                if a.get('numero_serie') != num_serie or a.get('retourne'):
-                    continue
-                try:
-                    dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-                    df_d = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-                    if dd <= day <= df_d:
-                        p = a.get('periode', 'Journée')
-                        if p == 'Journée' or p == periode:
-                            return a['service']
-                except Exception:
-                    pass
-            return None
-
-        cb = t['card_border']
-        ib = t['input_bg']
-        hc = t['h23_color']
-        ic = t['intro_color']
-        th_s = f"padding:0.45rem 0.4rem; border:1px solid {cb}; text-align:center; background:{ib}; color:{hc}; font-weight:600; font-size:0.8rem;"
-        td_s = f"border:1px solid {cb}; text-align:center; padding:0.3rem 0.25rem; font-size:0.75rem;"
-        td_eng_s = f"{td_s} background:{ib}; color:{hc}; text-align:left; padding:0.4rem 0.5rem; min-width:110px;"
-        td_slot_s = f"{td_s} background:{ib}; color:{ic}; min-width:52px;"
-
-        grid = f"<div style='overflow-x:auto'><table style='width:100%; border-collapse:collapse;'><thead><tr>"
-        grid += f"<th style='{th_s} text-align:left; min-width:110px;'>Engin</th>"
-        grid += f"<th style='{th_s} min-width:52px;'>Slot</th>"
-        for i, jour in enumerate(jours_sem):
-            jour_color = '#f59e0b' if jour == today_date else hc
-            grid += f"<th style='{th_s} color:{jour_color}; min-width:88px;'>{JOURS_FR[i]}<br>{jour.strftime('%d/%m')}</th>"
-        grid += "</tr></thead><tbody>"
-        for eng in engins:
-            num = eng.get('numero_serie', '')
-            eng_label = f"<b>{esc(num)}</b><br><small style='color:{ic}'>{esc(eng.get('type',''))} {esc(eng.get('marque',''))}</small>"
-            for pi, (periode, icon) in enumerate([('Matin', '🌅'), ('Après-midi', '🌇')]):
-                grid += "<tr>"
-                if pi == 0:
-                    grid += f"<td rowspan='2' style='{td_eng_s}'>{eng_label}</td>"
-                grid += f"<td style='{td_slot_s}'>{icon} {periode}</td>"
-                for jour in jours_sem:
-                    svc = _get_slot(num, jour, periode)
-                    if svc:
-                        bg = svc_color.get(svc, '#6b7280')
-                        grid += f"<td style='{td_s} background:{bg}; color:white; font-weight:500;'>{esc(svc)}</td>"
-                    else:
-                        grid += f"<td style='{td_s} color:{ic};'>—</td>"
-                grid += "</tr>"
-        grid += "</tbody></table></div>"
-        st.markdown(grid, unsafe_allow_html=True)
-
-        legende = " ".join(
-            f"<span style='background:{svc_color.get(s,'#6b7280')}; color:white; padding:0.2rem 0.6rem; border-radius:12px; font-size:0.75rem; margin-right:0.3rem;'>{esc(s)}</span>"
-            for s in services
-        )
-        st.markdown(f"<div style='margin-top:0.6rem'>{legende}</div>", unsafe_allow_html=True)
+        assets = [(r.get('numero_serie', ''), f"{r.get('type','')} {r.get('marque','')}") for r in engins]
+        st.markdown(slot_week_table('attributions_engins', "Engin", assets, semaine_debut, today_date, services),
+                    unsafe_allow_html=True)
+        st.markdown(grille.legende(services), unsafe_allow_html=True)
     else:
         st.info("Aucun engin enregistré")
 
@@ -257,68 +201,10 @@ def _page_attribuer(t, engins, attributions_engins, services):
         st.rerun()
 
     if engins:
-        JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
-        jours_sem = [semaine_debut + timedelta(days=i) for i in range(7)]
-        _PALETTE = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#84cc16', '#f97316']
-        svc_color = {s: _PALETTE[i % len(_PALETTE)] for i, s in enumerate(services)}
-
-        def _get_slot(num_serie, day, periode):
-            for a in attributions_engins:
-                if a.get('numero_serie') != num_serie or a.get('retourne'):
-                    continue
-                try:
-                    dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-                    df_d = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-                    if dd <= day <= df_d:
-                        p = a.get('periode', 'Journée')
-                        if p == 'Journée' or p == periode:
-                            return a['service']
-                except Exception:
-                    pass
-            return None
-
-        cb = t['card_border']
-        ib = t['input_bg']
-        hc = t['h23_color']
-        ic = t['intro_color']
-        th_s = f"padding:0.45rem 0.4rem; border:1px solid {cb}; text-align:center; background:{ib}; color:{hc}; font-weight:600; font-size:0.8rem;"
-        td_s = f"border:1px solid {cb}; text-align:center; padding:0.3rem 0.25rem; font-size:0.75rem;"
-        td_eng_s = f"{td_s} background:{ib}; color:{hc}; text-align:left; padding:0.4rem 0.5rem; min-width:110px;"
-        td_slot_s = f"{td_s} background:{ib}; color:{ic}; min-width:52px;"
-
-        html = f"<div style='overflow-x:auto'><table style='width:100%; border-collapse:collapse;'><thead><tr>"
-        html += f"<th style='{th_s} text-align:left; min-width:110px;'>Engin</th>"
-        html += f"<th style='{th_s} min-width:52px;'>Slot</th>"
-        for i, jour in enumerate(jours_sem):
-            jour_color = '#f59e0b' if jour == today_date else hc
-            html += f"<th style='{th_s} color:{jour_color}; min-width:88px;'>{JOURS_FR[i]}<br>{jour.strftime('%d/%m')}</th>"
-        html += "</tr></thead><tbody>"
-
-        for eng in engins:
-            num = eng.get('numero_serie', '')
-            eng_label = f"<b>{esc(num)}</b><br><small style='color:{ic}'>{esc(eng.get('type',''))} {esc(eng.get('marque',''))}</small>"
-            for pi, (periode, icon) in enumerate([('Matin', '🌅'), ('Après-midi', '🌇')]):
-                html += "<tr>"
-                if pi == 0:
-                    html += f"<td rowspan='2' style='{td_eng_s}'>{eng_label}</td>"
-                html += f"<td style='{td_slot_s}'>{icon} {periode}</td>"
-                for jour in jours_sem:
-                    svc = _get_slot(num, jour, periode)
-                    if svc:
-                        bg = svc_color.get(svc, '#6b7280')
-                        html += f"<td style='{td_s} background:{bg}; color:white; font-weight:500;'>{esc(svc)}</td>"
-                    else:
-                        html += f"<td style='{td_s} color:{ic};'>—</td>"
-                html += "</tr>"
-
-        html += "</tbody></table></div>"
-        st.markdown(html, unsafe_allow_html=True)
-
-        legende = " ".join(
-            f"<span style='background:{svc_color.get(s,'#6b7280')}; color:white; padding:0.2rem 0.6rem; border-radius:12px; font-size:0.75rem; margin-right:0.3rem;'>{esc(s)}</span>"
-            for s in services
-        )
-        st.markdown(f"<div style='margin-top:0.6rem'>{legende}</div>", unsafe_allow_html=True)
+        assets = [(r.get('numero_serie', ''), f"{r.get('type','')} {r.get('marque','')}") for r in engins]
+        st.markdown(slot_week_table('attributions_engins', "Engin", assets, semaine_debut, today_date, services),
+                    unsafe_allow_html=True)
+        st.markdown(grille.legende(services), unsafe_allow_html=True)
     else:
         st.info("Aucun engin enregistré — ajoutez-en depuis 🚜 Saisir un engin")
 
@@ -375,13 +261,23 @@ def _page_attribuer(t, engins, attributions_engins, services):
                     saved = col_s.form_submit_button("💾 Enregistrer")
                     deleted = col_d.form_submit_button("🗑️ Supprimer")
                 if saved:
-                    update_attribution_engin(idx, {'service': new_srv, 'date': new_date, 'date_fin': new_datefin, 'periode': new_per})
-                    st.success("✅ Modifié !")
-                    st.rerun()
+                    try:
+                        update_attribution_engin(attr.get('_id', ''), {'service': new_srv, 'date': new_date, 'date_fin': new_datefin, 'periode': new_per})
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_eng_{idx}")
+                    else:
+                        st.success("✅ Modifié !")
+                        st.rerun()
                 if deleted:
-                    delete_attribution_engin(idx)
-                    st.success("✅ Supprimé !")
-                    st.rerun()
+                    try:
+                        delete_attribution_engin(attr.get('_id', ''))
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_eng_{idx}")
+                    else:
+                        st.success("✅ Supprimé !")
+                        st.rerun()
     else:
         st.info("Aucune attribution enregistrée")
 
@@ -411,7 +307,6 @@ def _page_interventions(t, engins, interventions_engins):
     st.markdown("---")
     st.markdown("### 📋 Historique")
     if interventions_engins:
-        # On garde l'index d'origine (ligne dans la feuille) pour pouvoir update
         indexed = list(enumerate(interventions_engins))[:20]
         for idx, interv in indexed:
             statut = interv.get('statut', '')
@@ -438,12 +333,17 @@ def _page_interventions(t, engins, interventions_engins):
                         placeholder="https://drive.google.com/…",
                     )
                     if st.form_submit_button("💾 Enregistrer", type="primary"):
-                        update_intervention_engin(idx, {
-                            'statut': new_statut,
-                            'note_cloture': note.strip(),
-                            'bon_url': bon_url.strip(),
-                        })
-                        st.success("✅ Mis à jour")
-                        st.rerun()
+                        try:
+                            update_intervention_engin(interv.get('_id', ''), {
+                                'statut': new_statut,
+                                'note_cloture': note.strip(),
+                                'bon_url': bon_url.strip(),
+                            })
+                        except KeyError:
+                            # Pas de bouton dans un formulaire : le prochain envoi recharge.
+                            st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        else:
+                            st.success("✅ Mis à jour")
+                            st.rerun()
     else:
         st.info("Aucune intervention enregistrée")
@@ -4,9 +4,9 @@ from datetime import datetime, timedelta
 from database import (
     add_golfette, delete_golfette,
     add_attribution_golfette, update_attribution_golfette, delete_attribution_golfette,
-    _is_engin_active_today, add_intervention_golfette, retourner_golfette
+    fleet_state, slot_week_table, add_intervention_golfette, retourner_golfette
 )
-from alertes import verifier_alertes_golfettes
+import grille
 
 
 esc = html.escape
@@ -28,11 +28,11 @@ def _page_vue(t, golfettes, attributions_golfettes, services, interventions_golf
     st.markdown("<p class='page-intro'>Tableau de bord opérationnel — golfettes</p>", unsafe_allow_html=True)
 
     today_date = datetime.now().date()
-    distribues = [a for a in attributions_golfettes if _is_engin_active_today(a)]
-    distribues_ids = {a['numero_serie'] for a in distribues}
-    interv_en_cours = [i for i in interventions_golfettes if i.get('statut') == "En cours"]
-    interv_ids = {i['numero_serie'] for i in interv_en_cours}
-    disponibles = [g for g in golfettes if g['numero_serie'] not in distribues_ids and g['numero_serie'] not in interv_ids]
+    fs = fleet_state()
+    distribues = fs.sorties['golfettes']
+    distribues_ids = fs.sortis['golfettes']
+    interv_en_cours = fs.interventions_en_cours['golfettes']
+    disponibles = fs.disponibles['golfettes']
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("⛳ Total", len(golfettes))
@@ -40,7 +40,7 @@ def _page_vue(t, golfettes, attributions_golfettes, services, interventions_golf
     col3.metric("✅ Disponibles", len(disponibles))
     col4.metric("🔧 Interventions", len(interv_en_cours))
 
-    alertes = verifier_alertes_golfettes(attributions_golfettes)
+    alertes = fs.alertes['golfettes']
     if alertes:
         st.markdown("---")
         st.markdown("### 🚨 Alertes")
@@ -72,66 +72,10 @@ def _page_vue(t, golfettes, attributions_golfettes, services, interventions_golf
         st.rerun()
 
     if golfettes:
-        JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
-        jours_sem = [semaine_debut + timedelta(days=i) for i in range(7)]
-        _PALETTE = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#84cc16', '#f97316']
-        svc_color = {s: _PALETTE[i % len(_PALETTE)] for i, s in enumerate(services)}
-
-        def _get_slot(num_serie, day, periode):
-            for a in attributions_golfettes:
-                if a.get('numero_serie') != num_serie or a.get('retourne'):
-                    continue
-                try:
-                    dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-                    df_d = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-                    if dd <= day <= df_d:
-                        p = a.get('periode', 'Journée')
-                        if p == 'Journée' or p == periode:
-                            return a['service']
-                except Exception:
-                    pass
-            return None
-
-        cb = t['card_border']
-        ib = t['input_bg']
-        hc = t['h23_color']
-        ic = t['intro_color']
-        th_s = f"padding:0.45rem 0.4rem; border:1px solid {cb}; text-align:center; background:{ib}; color:{hc}; font-weight:600; font-size:0.8rem;"
-        td_s = f"border:1px solid {cb}; text-align:center; padding:0.3rem 0.25rem; font-size:0.75rem;"
-        td_eng_s = f"{td_s} background:{ib}; color:{hc}; text-align:left; padding:0.4rem 0.5rem; min-width:110px;"
-        td_slot_s = f"{td_s} background:{ib}; color:{ic}; min-width:52px;"
-
-        grid = f"<div style='overflow-x:auto'><table style='width:100%; border-collapse:collapse;'><thead><tr>"
-        grid += f"<th style='{th_s} text-align:left; min-width:110px;'>Golfette</th>"
-        grid += f"<th style='{th_s} min-width:52px;'>Slot</th>"
-        for i, jour in enumerate(jours_sem):
-            jour_color = '#f59e0b' if jour == today_date else hc
-            grid += f"<th style='{th_s} color:{jour_color}; min-width:88px;'>{JOURS_FR[i]}<br>{jour.strftime('%d/%m')}</th>"
-        grid += "</tr></thead><tbody>"
-        for golf in golfettes:
-            num = golf.get('numero_serie', '')
-            golf_label = f"<b>{esc(num)}</b><br><small style='color:{ic}'>{esc(golf.get('type',''))} {esc(golf.get('marque',''))}</small>"
-            for pi, (periode, icon) in enumerate([('Matin', '🌅'), ('Après-midi', '🌇')]):
-                grid += "<tr>"
-                if pi == 0:
-                    grid += f"<td rowspan='2' style='{td_eng_s}'>{golf_label}</td>"
-                grid += f"<td style='{td_slot_s}'>{icon} {periode}</td>"
-                for jour in jours_sem:
-                    svc = _get_slot(num, jour, periode)
-                    if svc:
-                        bg = svc_color.get(svc, '#6b7280')
-                        grid += f"<td style='{td_s} background:{bg}; color:white; font-weight:500;'>{esc(svc)}</td>"
-                    else:
-                        grid += f"<td style='{td_s} color:{ic};'>—</td>"
-                grid += "</tr>"
-        grid += "</tbody></table></div>"
-        st.markdown(grid, unsafe_allow_html=True)
-
-        legende = " ".join(
-            f"<span style='background:{svc_color.get(s,'#6b7280')}; color:white; padding:0.2rem 0.6rem; border-radius:12px; font-size:0.75rem; margin-right:0.3rem;'>{esc(s)}</span>"
-            for s in services
-        )
-        st.markdown(f"<div style='margin-top:0.6rem'>{legende}</div>", unsafe_allow_html=True)
+        assets = [(r.get('numero_serie', ''), f"{r.get('type','')} {r.get('marque','')}") for r in golfettes]
+        st.markdown(slot_week_table('attributions_golfettes', "Golfette", assets, semaine_debut, today_date, services),
+                    unsafe_allow_html=True)
+        st.markdown(grille.legende(services), unsafe_allow_html=True)
     else:
         st.info("Aucune golfette enregistrée")
 
@@ -250,68 +194,10 @@ def _page_attribuer(t, golfettes, attributions_golfettes, services):
         st.rerun()
 
     if golfettes:
-        JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
-        jours_sem = [semaine_debut + timedelta(days=i) for i in range(7)]
-        _PALETTE = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#84cc16', '#f97316']
-        svc_color = {s: _PALETTE[i % len(_PALETTE)] for i, s in enumerate(services)}
-
-        def _get_slot(num_serie, day, periode):
-            for a in attributions_golfettes:
-                if a.get('numero_serie') != num_serie or a.get('retourne'):
-                    continue
-                try:
-                    dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-                    df_d = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-                    if dd <= day <= df_d:
-                        p = a.get('periode', 'Journée')
-                        if p == 'Journée' or p == periode:
-                            return a['service']
-                except Exception:
-                    pass
-            return None
-
-        cb = t['card_border']
-        ib = t['input_bg']
-        hc = t['h23_color']
-        ic = t['intro_color']
-        th_s = f"padding:0.45rem 0.4rem; border:1px solid {cb}; text-align:center; background:{ib}; color:{hc}; font-weight:600; font-size:0.8rem;"
-        td_s = f"border:1px solid {cb}; text-align:center; padding:0.3rem 0.25rem; font-size:0.75rem;"
-        td_eng_s = f"{td_s} background:{ib}; color:{hc}; text-align:left; padding:0.4rem 0.5rem; min-width:110px;"
-        td_slot_s = f"{td_s} background:{ib}; color:{ic}; min-width:52px;"
-
-        planning_html = f"<div style='overflow-x:auto'><table style='width:100%; border-collapse:collapse;'><thead><tr>"
-        planning_html += f"<th style='{th_s} text-align:left; min-width:110px;'>Golfette</th>"
-        planning_html += f"<th style='{th_s} min-width:52px;'>Slot</th>"
-        for i, jour in enumerate(jours_sem):
-            jour_color = '#f59e0b' if jour == today_date else hc
-            planning_html += f"<th style='{th_s} color:{jour_color}; min-width:88px;'>{JOURS_FR[i]}<br>{jour.strftime('%d/%m')}</th>"
-        planning_html += "</tr></thead><tbody>"
-
-        for golf in golfettes:
-            num = golf.get('numero_serie', '')
-            golf_label = f"<b>{esc(num)}</b><br><small style='color:{ic}'>{esc(golf.get('type',''))} {esc(golf.get('marque',''))}</small>"
-            for pi, (periode, icon) in enumerate([('Matin', '🌅'), ('Après-midi', '🌇')]):
-                planning_html += "<tr>"
-                if pi == 0:
-                    planning_html += f"<td rowspan='2' style='{td_eng_s}'>{golf_label}</td>"
-                planning_html += f"<td style='{td_slot_s}'>{icon} {periode}</td>"
-                for jour in jours_sem:
-                    svc = _get_slot(num, jour, periode)
-                    if svc:
-                        bg = svc_color.get(svc, '#6b7280')
-                        planning_html += f"<td style='{td_s} background:{bg}; color:white; font-weight:500;'>{esc(svc)}</td>"
-                    else:
-                        planning_html += f"<td style='{td_s} color:{ic};'>—</td>"
-                planning_html += "</tr>"
-
-        planning_html += "</tbody></table></div>"
-        st.markdown(planning_html, unsafe_allow_html=True)
-
-        legende = " ".join(
-            f"<span style='background:{svc_color.get(s,'#6b7280')}; color:white; padding:0.2rem 0.6rem; border-radius:12px; font-size:0.75rem; margin-right:0.3rem;'>{esc(s)}</span>"
-            for s in services
-        )
-        st.markdown(f"<div style='margin-top:0.6rem'>{legende}</div>", unsafe_allow_html=True)
+        assets = [(r.get('numero_serie', ''), f"{r.get('type','')} {r.get('marque','')}") for r in golfettes]
+        st.markdown(slot_week_table('attributions_golfettes', "Golfette", assets, semaine_debut, today_date, services),
+                    unsafe_allow_html=True)
+        st.markdown(grille.legende(services), unsafe_allow_html=True)
     else:
         st.info("Aucune golfette enregistrée — ajoutez-en depuis ⛳ Saisir une golfette")
 
@@ -368,13 +254,23 @@ def _page_attribuer(t, golfettes, attributions_golfettes, services):
                     saved = col_s.form_submit_button("💾 Enregistrer")
                     deleted = col_d.form_submit_button("🗑️ Supprimer")
                 if saved:
-                    update_attribution_golfette(idx, {'service': new_srv, 'date': new_date, 'date_fin': new_datefin, 'periode': new_per})
-                    st.success("✅ Modifié !")
-                    st.rerun()
+                    try:
+                        update_attribution_golfette(attr.get('_id', ''), {'service': new_srv, 'date': new_date, 'date_fin': new_datefin, 'periode': new_per})
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_golf_{idx}")
+                    else:
+                        st.success("✅ Modifié !")
+                        st.rerun()
                 if deleted:
-                    delete_attribution_golfette(idx)
-                    st.success("✅ Supprimé !")
-                    st.rerun()
+                    try:
+                        delete_attribution_golfette(attr.get('_id', ''))
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_golf_{idx}")
+                    else:
+                        st.success("✅ Supprimé !")
+                        st.rerun()
     else:
         st.info("Aucune attribution enregistrée")
 
@@ -61,7 +61,6 @@ def render_interventions_wlg(t, engins, golfettes, interventions_engins, interve
     default_hor_golf = first_golf.get('horaires', '')
 
     wlg_engins = [e for e in engins if _is_wlg(e.get('numero_serie', ''))]
-    # On garde l'index d'origine pour pouvoir update le statut (idx = ligne dans la feuille)
     wlg_interv_engins = [(idx, i) for idx, i in enumerate(interventions_engins) if _is_wlg(i.get('numero_serie', ''))]
     wlg_interv_golf = list(enumerate(interventions_golfettes))
 
@@ -250,8 +249,13 @@ def _render_card(t, idx, i, id_key, kind):
                     'note_cloture': note.strip(),
                     'bon_url': bon_url.strip(),
                 }
-                if kind == 'engin':
-                    update_intervention_engin(idx, data)
+                try:
+                    if kind == 'engin':
+                        update_intervention_engin(i.get('_id', ''), data)
+                    else:
+                        update_intervention_golfette(i.get('_id', ''), data)
+                except KeyError:
+                    # Pas de bouton dans un formulaire : le prochain envoi recharge.
+                    st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
                 else:
-                    update_intervention_golfette(idx, data)
-                st.rerun()
+                    st.rerun()
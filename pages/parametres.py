@@ -1,5 +1,6 @@
 import html
 import streamlit as st
+import archive
 from styles import THEMES
 from database import (
     add_category, delete_category,
@@ -8,7 +9,9 @@ from database import (
     add_category_scooter, delete_category_scooter,
     add_category_golfette, delete_category_golfette,
     add_lien, delete_lien,
-    add_contact_wlg, delete_contact_wlg
+    add_contact_wlg, delete_contact_wlg,
+    archiver, archive_horizon, set_parametre, offline_status,
+    quota_usage
 )
 
 
@@ -139,8 +142,13 @@ def render_parametres(t, categories, services, categories_engins, categories_sco
                 f"<span style='color:{t['intro_color']};font-size:0.82rem;'>📞 {esc(c.get('telephone',''))} &nbsp;·&nbsp; 🕐 {esc(c.get('horaires',''))}</span>"
                 f"</div>", unsafe_allow_html=True)
             if c2.button("🗑️", key=f"del_ce_{idx}"):
-                delete_contact_wlg(idx)
-                st.rerun()
+                try:
+                    delete_contact_wlg(c.get('_id', ''))
+                except KeyError:
+                    st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                    st.button("🔄 Recharger", key=f"reload_ce_{idx}")
+                else:
+                    st.rerun()
         with st.form(f"form_add_contact_eng_{st.session_state.get('_fk',0)}"):
             n1 = st.text_input("Nom / Poste *", placeholder="Ex : Mécanicien WLG", key="ce_nom")
             cc1, cc2 = st.columns(2)
@@ -165,8 +173,13 @@ def render_parametres(t, categories, services, categories_engins, categories_sco
                 f"<span style='color:{t['intro_color']};font-size:0.82rem;'>📞 {esc(c.get('telephone',''))} &nbsp;·&nbsp; 🕐 {esc(c.get('horaires',''))}</span>"
                 f"</div>", unsafe_allow_html=True)
             if c2.button("🗑️", key=f"del_cg_{idx}"):
-                delete_contact_wlg(idx)
-                st.rerun()
+                try:
+                    delete_contact_wlg(c.get('_id', ''))
+                except KeyError:
+                    st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                    st.button("🔄 Recharger", key=f"reload_cg_{idx}")
+                else:
+                    st.rerun()
         with st.form(f"form_add_contact_golf_{st.session_state.get('_fk',0)}"):
             n2 = st.text_input("Nom / Poste *", placeholder="Ex : Technicien golfettes", key="cg_nom")
             cc3, cc4 = st.columns(2)
@@ -203,3 +216,32 @@ def render_parametres(t, categories, services, categories_engins, categories_sco
                     st.rerun()
                 else:
                     st.error("❌ Nom et URL requis")
+
+    st.markdown("---")
+    st.markdown("### 🗄️ Archivage")
+    st.markdown("<p class='page-intro'>Déplace les attributions retournées et les interventions terminées plus anciennes que l'horizon vers les feuilles <code>*_archive_AAAA</code>.</p>", unsafe_allow_html=True)
+    c1, c2, c3 = st.columns([2, 1, 1])
+    horizon = c1.number_input("Horizon (jours)", min_value=archive.HORIZON_MIN, max_value=archive.HORIZON_MAX,
+                              value=archive_horizon(), step=30)
+    if c2.button("🔍 Aperçu", use_container_width=True):
+        resume = archiver(horizon, dry_run=True)
+        if resume:
+            st.info(" · ".join(f"{k} : {n}" for k, n in resume.items()))
+        else:
+            st.info("Rien à archiver")
+    # Archivage = appels directs à l'API (pas de mise en attente hors ligne).
+    if c3.button("🗄️ Archiver", type="primary", use_container_width=True, disabled=offline_status() is not None):
+        if horizon != archive_horizon():
+            set_parametre('archive_horizon_jours', str(horizon))
+        resume = archiver(horizon)
+        st.success(f"✅ {sum(resume.values())} ligne(s) archivée(s)" if resume else "Rien à archiver")
+
+    st.markdown("---")
+    st.markdown("### 📶 Quota API Google Sheets")
+    st.markdown("<p class='page-intro'>Requêtes de ce serveur sur la dernière minute (budget par minute).</p>", unsafe_allow_html=True)
+    usage = quota_usage()
+    cols = st.columns(2)
+    for col, (kind, label) in zip(cols, [('read', 'Lectures'), ('write', 'Écritures')]):
+        u = usage[kind]
+        col.metric(label, f"{u['last_minute']} / {u['capacity']}",
+                   help=f"Attente cumulée {u['waited_s']} s · {u['retries']} nouvelle(s) tentative(s)")
@@ -3,13 +3,17 @@ import re
 import streamlit as st
 from datetime import datetime, timedelta
 from database import (
-    get_distribution_clefs, add_distribution_clef, retour_clef,
+    get_golfettes, get_distribution_clefs, add_distribution_clef, retour_clef,
     add_attribution_golfette, ecraser_attributions_golfette_periode,
+    transaction, attribution_index,
 )
 
 esc = html.escape
 
 JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
+JOURS_LONG = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+MOIS_FR = ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet',
+           'août', 'septembre', 'octobre', 'novembre', 'décembre']
 
 _PALETTE = [
     '#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6',
@@ -31,41 +35,12 @@ def _sort_key(g):
     return n
 
 
-def _get_zone_for_day(num_serie, day, attributions):
-    best, best_dur = None, None
-    for a in attributions:
-        if a.get('numero_serie') != num_serie or a.get('retourne'):
-            continue
-        try:
-            dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-            df = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-            if dd <= day <= df:
-                dur = (df - dd).days
-                # `<=` : à durée égale la dernière attribution rencontrée gagne,
-                # ce qui permet à un ajustement manuel d'écraser un planning existant.
-                if best_dur is None or dur <= best_dur:
-                    best = a.get('service', '')
-                    best_dur = dur
-        except Exception:
-            pass
-    return best
-
-
-def _get_zone_upcoming(num_serie, today, attributions):
-    best, best_date = None, None
-    for a in attributions:
-        if a.get('numero_serie') != num_serie or a.get('retourne'):
-            continue
-        try:
-            dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-            df = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-            if df >= today:
-                if best_date is None or dd < best_date:
-                    best = a.get('service', '')
-                    best_date = dd
-        except Exception:
-            pass
-    return best
+def _get_zone_for_day(num_serie, day, attr_index):
+    return attr_index.zone_on(num_serie, day)
+
+
+def _get_zone_upcoming(num_serie, today, attr_index):
+    return attr_index.next_zone(num_serie, today)
 
 
 def _clef_status(num_serie, clefs):
@@ -75,10 +50,14 @@ def _clef_status(num_serie, clefs):
     return False, None, None
 
 
-def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
+@st.fragment
+def _etat_du_jour(t):
+    """Indicateurs, clés et golfettes actives du jour. Rendu / Distribuer
+    changent aussi les 🔑 de la grille de la semaine : rerun complet."""
     today = datetime.now().date()
+    attr_index = attribution_index('attributions_golfettes')
 
-    golfettes_sorted = sorted(golfettes, key=_sort_key)
+    golfettes_sorted = sorted(get_golfettes(), key=_sort_key)
     clefs = get_distribution_clefs()
 
     golf_ids = {g['numero_serie'] for g in golfettes_sorted}
@@ -89,7 +68,7 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
 
     actifs_today = [
         g for g in golfettes_sorted
-        if _get_zone_for_day(g['numero_serie'], today, attributions_golfettes)
+        if _get_zone_for_day(g['numero_serie'], today, attr_index)
         or g['numero_serie'] in clef_out_ids
     ]
 
@@ -102,14 +81,6 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
     circ_ids = {g['numero_serie'] for g, _, _ in en_circulation}
     disponibles = [g for g in actifs_today if g['numero_serie'] not in circ_ids]
 
-    # En-tête
-    st.markdown("# ⛳ Planning Golfettes WLG26")
-    JOURS_LONG = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-    MOIS_FR = ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet',
-               'août', 'septembre', 'octobre', 'novembre', 'décembre']
-    today_str = f"{JOURS_LONG[today.weekday()]} {today.day} {MOIS_FR[today.month - 1]} {today.year}"
-    st.markdown(f"<p class='page-intro'>{today_str}</p>", unsafe_allow_html=True)
-
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("⛳ Golfettes", len(golfettes_sorted))
     c2.metric("📅 Actives aujourd'hui", len(actifs_today))
@@ -124,8 +95,8 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
         for golf, entry, idx in en_circulation:
             num = golf['numero_serie']
             zone = (
-                _get_zone_for_day(num, today, attributions_golfettes)
-                or _get_zone_upcoming(num, today, attributions_golfettes)
+                _get_zone_for_day(num, today, attr_index)
+                or _get_zone_upcoming(num, today, attr_index)
                 or 'Anticipée'
             )
             nom = entry.get('nom', '')
@@ -146,9 +117,14 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
                 unsafe_allow_html=True,
             )
             if col_btn.button("✅ Rendu", key=f"wlg_golf_ret_{num}", type="primary"):
-                retour_clef(idx)
-                st.success(f"✅ Clé {num} rendue !")
-                st.rerun()
+                try:
+                    retour_clef(entry.get('_id', ''))
+                except KeyError:
+                    st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                    st.button("🔄 Recharger", key=f"wlg_golf_reload_{num}")
+                else:
+                    st.success(f"✅ Clé {num} rendue !")
+                    st.rerun()
         st.markdown("---")
 
     # ── DISTRIBUER UNE CLÉ ────────────────────────────────────────────────
@@ -158,7 +134,7 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
 
     def _golf_label(g):
         num = g['numero_serie']
-        zone = _get_zone_for_day(num, today, attributions_golfettes)
+        zone = _get_zone_for_day(num, today, attr_index)
         return f"{num} — {zone}" if zone else num
 
     dispo_options = [_golf_label(g) for g in all_dispo]
@@ -166,7 +142,7 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
     if dispo_options:
         golf_sel = st.selectbox("Golfette *", dispo_options, key="wlg_sel_golf")
         sel_num = golf_sel.split(" — ")[0]
-        is_inactive = not _get_zone_for_day(sel_num, today, attributions_golfettes)
+        is_inactive = not _get_zone_for_day(sel_num, today, attr_index)
 
         confirm = False
         if is_inactive:
@@ -218,12 +194,12 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
         for g in actifs_today:
             num = g['numero_serie']
             type_g = g.get('type', '')
-            zone_today = _get_zone_for_day(num, today, attributions_golfettes)
+            zone_today = _get_zone_for_day(num, today, attr_index)
             out, entry, _ = _clef_status(num, clefs)
             if zone_today:
                 zone = zone_today
             elif out:
-                zone = _get_zone_upcoming(num, today, attributions_golfettes) or 'Anticipée'
+                zone = _get_zone_upcoming(num, today, attr_index) or 'Anticipée'
             else:
                 zone = ''
             zone_color = _zone_color(zone)
@@ -256,8 +232,20 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
         table += "</tbody></table></div>"
         st.markdown(table, unsafe_allow_html=True)
 
-    # ── PLANNING SEMAINE ──────────────────────────────────────────────────
-    st.markdown("---")
+
+@st.fragment
+def _planning_semaine(t):
+    """Grille de la semaine : la navigation ne relance que ce fragment."""
+    today = datetime.now().date()
+    attr_index = attribution_index('attributions_golfettes')
+    golfettes_sorted = sorted(get_golfettes(), key=_sort_key)
+    clefs = get_distribution_clefs()
+
+    cb = t['card_border']
+    ib = t['input_bg']
+    hc = t['h23_color']
+    ic = t['intro_color']
+
     st.markdown("### 📅 Planning semaine")
 
     if 'wlg_golf_jour_offset' not in st.session_state:
@@ -270,10 +258,10 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
     col_n1, col_n2, col_n3, col_n4, col_n5 = st.columns([1, 1, 4, 1, 1])
     if col_n1.button("⏮ Sem.", key="wlg_golf_prev_sem"):
         st.session_state['wlg_golf_jour_offset'] -= 7
-        st.rerun()
+        st.rerun(scope="fragment")
     if col_n2.button("← Jour", key="wlg_golf_prev_jour"):
         st.session_state['wlg_golf_jour_offset'] -= 1
-        st.rerun()
+        st.rerun(scope="fragment")
     aligne_lundi = sem_debut.weekday() == 0
     titre = (
         f"Semaine du {sem_debut.strftime('%d/%m')} au {sem_fin.strftime('%d/%m/%Y')}"
@@ -287,10 +275,10 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
     )
     if col_n4.button("Jour →", key="wlg_golf_next_jour"):
         st.session_state['wlg_golf_jour_offset'] += 1
-        st.rerun()
+        st.rerun(scope="fragment")
     if col_n5.button("Sem. ⏭", key="wlg_golf_next_sem"):
         st.session_state['wlg_golf_jour_offset'] += 7
-        st.rerun()
+        st.rerun(scope="fragment")
 
     if golfettes_sorted:
         jours_sem = [sem_debut + timedelta(days=i) for i in range(7)]
@@ -321,7 +309,7 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
             grid += f"<tr><td style='{td_eng}'>⛳ {esc(num)}</td>"
             for jour in jours_sem:
                 is_today_col = jour == today
-                zone = _get_zone_for_day(num, jour, attributions_golfettes)
+                zone = _get_zone_for_day(num, jour, attr_index)
                 today_bg = "background:rgba(245,158,11,0.08);" if is_today_col else ""
                 if zone:
                     bg = _zone_color(zone)
@@ -338,7 +326,7 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
         all_zones = set()
         for g in golfettes_sorted:
             for j in jours_sem:
-                z = _get_zone_for_day(g['numero_serie'], j, attributions_golfettes)
+                z = _get_zone_for_day(g['numero_serie'], j, attr_index)
                 if z:
                     all_zones.add(z)
         if all_zones:
@@ -351,6 +339,25 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
             st.markdown(f"<div style='margin-top:0.5rem;line-height:2.2;'>{legend}</div>",
                         unsafe_allow_html=True)
 
+
+def render_planning_golfettes_wlg(t):
+    """Page découpée en fragments, comme planning_wlg : un clic ne relance
+    que le fragment concerné."""
+    today = datetime.now().date()
+
+    # En-tête
+    st.markdown("# ⛳ Planning Golfettes WLG26")
+    today_str = f"{JOURS_LONG[today.weekday()]} {today.day} {MOIS_FR[today.month - 1]} {today.year}"
+    st.markdown(f"<p class='page-intro'>{today_str}</p>", unsafe_allow_html=True)
+
+    _etat_du_jour(t)
+    st.markdown("---")
+    _planning_semaine(t)
+
+    # Modifie le planning des deux fragments (et les alertes) : rerun complet.
+    attr_index = attribution_index('attributions_golfettes')
+    golfettes_sorted = sorted(get_golfettes(), key=_sort_key)
+
     # ── AJUSTER LE PLANNING ───────────────────────────────────────────────
     st.markdown("---")
     with st.expander("✏️ Ajuster le planning — modifier la zone d'une golfette"):
@@ -359,7 +366,7 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
                 col1, col2 = st.columns(2)
                 golf_opts = [
                     f"{g['numero_serie']} — {g.get('type', '')} "
-                    f"({_get_zone_for_day(g['numero_serie'], today, attributions_golfettes) or 'non actif'})"
+                    f"({_get_zone_for_day(g['numero_serie'], today, attr_index) or 'non actif'})"
                     for g in golfettes_sorted
                 ]
                 golf_adj = col1.selectbox("Golfette *", golf_opts)
@@ -372,8 +379,10 @@ def render_planning_golfettes_wlg(t, golfettes, attributions_golfettes):
                         num = golf_adj.split(" — ")[0]
                         date_deb_s = date_deb.strftime("%d/%m/%Y")
                         date_fin_s = date_fin_v.strftime("%d/%m/%Y")
-                        ecraser_attributions_golfette_periode(num, date_deb_s, date_fin_s)
-                        add_attribution_golfette(num, zone_adj.strip(), date_deb_s, date_fin_s, "Journée")
+                        # 1 seul aller-retour API pour les deux écritures
+                        with transaction():
+                            ecraser_attributions_golfette_periode(num, date_deb_s, date_fin_s)
+                            add_attribution_golfette(num, zone_adj.strip(), date_deb_s, date_fin_s, "Journée")
                         st.success(f"✅ {num} → {zone_adj.strip()} du {date_deb.strftime('%d/%m')} au {date_fin_v.strftime('%d/%m')}")
                         st.session_state['_fk'] = st.session_state.get('_fk', 0) + 1
                         st.rerun()
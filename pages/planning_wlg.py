@@ -3,11 +3,14 @@ import re
 import streamlit as st
 from datetime import datetime, timedelta
 from database import (
+    get_engins, get_interventions_engins,
     get_distribution_clefs, add_distribution_clef, retour_clef,
     add_attribution_engin, ecraser_attributions_engin_periode,
+    transaction, attribution_index, week_table,
     marquer_retard_livraison_engin, marquer_engin_recu,
     marquer_livraison_anticipee_engin, annuler_livraison_anticipee_engin,
 )
+import grille
 
 esc = html.escape
 
@@ -18,6 +21,9 @@ GROUPE_INFO = {
 }
 GROUPE_ORDER = ['C', 'T', 'N']
 JOURS_FR = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
+JOURS_LONG = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+MOIS_FR = ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet',
+           'août', 'septembre', 'octobre', 'novembre', 'décembre']
 
 _PALETTE = [
     '#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6',
@@ -44,45 +50,14 @@ def _sort_key(engin):
     return (GROUPE_ORDER.index(g) if g in GROUPE_ORDER else 99, n)
 
 
-def _get_zone_for_day(num_serie, day, attributions_engins):
+def _get_zone_for_day(num_serie, day, attr_index):
     """Retourne la zone la plus spécifique (plage la plus courte) couvrant ce jour."""
-    best = None
-    best_dur = None
-    for a in attributions_engins:
-        if a.get('numero_serie') != num_serie or a.get('retourne'):
-            continue
-        try:
-            dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-            df = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-            if dd <= day <= df:
-                dur = (df - dd).days
-                # `<=` : à durée égale la dernière attribution rencontrée gagne,
-                # ce qui permet à un ajustement manuel d'écraser un planning existant.
-                if best_dur is None or dur <= best_dur:
-                    best = a.get('service', '')
-                    best_dur = dur
-        except Exception:
-            pass
-    return best
-
-
-def _get_zone_upcoming(num_serie, today, attributions_engins):
+    return attr_index.zone_on(num_serie, day)
+
+
+def _get_zone_upcoming(num_serie, today, attr_index):
     """Retourne la zone de la prochaine attribution à venir (ou en cours)."""
-    best = None
-    best_date = None
-    for a in attributions_engins:
-        if a.get('numero_serie') != num_serie or a.get('retourne'):
-            continue
-        try:
-            dd = datetime.strptime(a['date'], "%d/%m/%Y").date()
-            df = datetime.strptime(a.get('date_fin', a['date']), "%d/%m/%Y").date()
-            if df >= today:
-                if best_date is None or dd < best_date:
-                    best = a.get('service', '')
-                    best_date = dd
-        except Exception:
-            pass
-    return best
+    return attr_index.next_zone(num_serie, today)
 
 
 def _clef_status(num_serie, clefs):
@@ -93,18 +68,26 @@ def _clef_status(num_serie, clefs):
     return False, None, None
 
 
-def render_planning_wlg(t, engins, attributions_engins, interventions_engins=None):
+def _wlg_engins():
+    return sorted((e for e in get_engins() if _is_wlg(e.get('numero_serie', ''))), key=_sort_key)
+
+
+@st.fragment
+def _etat_du_jour(t):
+    """Indicateurs, livraisons, clés et engins actifs du jour : un bouton
+    (Reçu, Non livré…) ne relance que ce fragment. Rendu et Distribuer
+    changent aussi les 🔑 de la grille de la semaine : rerun complet."""
     today = datetime.now().date()
+    attr_index = attribution_index('attributions_engins')
 
-    wlg_engins = [e for e in engins if _is_wlg(e.get('numero_serie', ''))]
-    wlg_engins.sort(key=_sort_key)
+    wlg_engins = _wlg_engins()
     wlg_ids = {e['numero_serie'] for e in wlg_engins}
 
     clefs = get_distribution_clefs()
 
     # Engins WLG avec au moins une intervention "En cours"
     en_intervention_ids = set()
-    for iv in (interventions_engins or []):
+    for iv in get_interventions_engins():
         if iv.get('statut') == 'En cours' and iv.get('numero_serie') in wlg_ids:
             en_intervention_ids.add(iv['numero_serie'])
     nb_intervention = len(en_intervention_ids)
@@ -129,7 +112,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
 
     actifs_today = [
         e for e in wlg_engins
-        if _get_zone_for_day(e['numero_serie'], today, attributions_engins)
+        if _get_zone_for_day(e['numero_serie'], today, attr_index)
         or e['numero_serie'] in en_intervention_ids
         or e['numero_serie'] in clef_out_ids
         or e['numero_serie'] in retard_ids
@@ -149,14 +132,6 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
         if e['numero_serie'] not in circ_ids and e['numero_serie'] not in retard_ids
     ]
 
-    # En-tête
-    st.markdown("# 🎪 Planning WLG26")
-    JOURS_LONG = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-    MOIS_FR = ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet',
-               'août', 'septembre', 'octobre', 'novembre', 'décembre']
-    today_str = f"{JOURS_LONG[today.weekday()]} {today.day} {MOIS_FR[today.month - 1]} {today.year}"
-    st.markdown(f"<p class='page-intro'>{today_str}</p>", unsafe_allow_html=True)
-
     c1, c2, c3, c4, c5, c6 = st.columns(6)
     c1.metric("🚜 Engins WLG", len(wlg_engins))
     c2.metric("📅 Actifs aujourd'hui", len(actifs_today))
@@ -175,8 +150,8 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
         if num in avance_ids:
             # déjà signalé livré en avance → présent dans le tableau actifs
             continue
-        zone_tomorrow = _get_zone_for_day(num, tomorrow, attributions_engins)
-        zone_today = _get_zone_for_day(num, today, attributions_engins)
+        zone_tomorrow = _get_zone_for_day(num, tomorrow, attr_index)
+        zone_today = _get_zone_for_day(num, today, attr_index)
         if zone_tomorrow and not zone_today:
             livraisons_demain.append((e, zone_tomorrow))
 
@@ -208,7 +183,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
             if col_btn.button("📦 Déjà livré", key=f"avance_{num}", use_container_width=True):
                 marquer_livraison_anticipee_engin(num)
                 st.success(f"📦 {num} signalé livré en avance")
-                st.rerun()
+                st.rerun(scope="fragment")
         st.markdown("---")
 
     # ── SIGNALER UNE LIVRAISON ANTICIPÉE (autres jours) ────────────────────
@@ -221,7 +196,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
         with st.expander("📦 Signaler une livraison anticipée (autre jour)"):
             def _label_av(e):
                 num = e['numero_serie']
-                z_up = _get_zone_upcoming(num, today, attributions_engins)
+                z_up = _get_zone_upcoming(num, today, attr_index)
                 return f"{num} — prochaine zone : {z_up}" if z_up else f"{num} — pas de planning à venir"
             opts = [_label_av(e) for e in non_actifs]
             sel = st.selectbox("Engin *", opts, key="wlg_av_sel")
@@ -229,7 +204,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
             if st.button("📦 Signaler livré en avance", key="wlg_av_btn", type="primary"):
                 marquer_livraison_anticipee_engin(sel_num)
                 st.success(f"📦 {sel_num} signalé livré en avance")
-                st.rerun()
+                st.rerun(scope="fragment")
         st.markdown("---")
 
     # ── CLÉs EN CIRCULATION (priorité matin) ───────────────────────────────
@@ -238,8 +213,8 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
         for eng, entry, idx in en_circulation:
             num = eng['numero_serie']
             zone = (
-                _get_zone_for_day(num, today, attributions_engins)
-                or _get_zone_upcoming(num, today, attributions_engins)
+                _get_zone_for_day(num, today, attr_index)
+                or _get_zone_upcoming(num, today, attr_index)
                 or 'Anticipée'
             )
             nom = entry.get('nom', '')
@@ -264,9 +239,14 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
                 unsafe_allow_html=True,
             )
             if col_btn.button("✅ Rendu", key=f"wlg_ret_{num}", type="primary"):
-                retour_clef(idx)
-                st.success(f"✅ Clé {num} rendue !")
-                st.rerun()
+                try:
+                    retour_clef(entry.get('_id', ''))
+                except KeyError:
+                    st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                    st.button("🔄 Recharger", key=f"wlg_reload_{num}")
+                else:
+                    st.success(f"✅ Clé {num} rendue !")
+                    st.rerun()
 
         st.markdown("---")
 
@@ -278,7 +258,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
 
     def _engin_label(e):
         num = e['numero_serie']
-        zone = _get_zone_for_day(num, today, attributions_engins)
+        zone = _get_zone_for_day(num, today, attr_index)
         return f"{num} — {zone}" if zone else num
 
     dispo_options = [_engin_label(e) for e in all_dispo]
@@ -286,7 +266,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
     if dispo_options:
         engin_sel = st.selectbox("Engin *", dispo_options, key="wlg_sel_engin")
         sel_num = engin_sel.split(" — ")[0]
-        is_inactive = not _get_zone_for_day(sel_num, today, attributions_engins)
+        is_inactive = not _get_zone_for_day(sel_num, today, attr_index)
 
         confirm = False
         if is_inactive:
@@ -315,7 +295,6 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
     st.markdown("### 📋 Engins actifs aujourd'hui")
 
     cb = t['card_border']
-    ib = t['input_bg']
     hc = t['h23_color']
     ic = t['intro_color']
 
@@ -335,7 +314,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
                 num = eng['numero_serie']
                 marque = eng.get('marque', '')
                 num_pre = engin_map.get(num, {}).get('numero_prestataire', '') or ''
-                zone_today = _get_zone_for_day(num, today, attributions_engins)
+                zone_today = _get_zone_for_day(num, today, attr_index)
                 out, entry, _ = _clef_status(num, clefs)
                 non_livre = num in retard_ids
                 # "livré en avance" effectif : flag set ET pas encore dans son planning
@@ -343,11 +322,11 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
                 if zone_today:
                     zone = zone_today
                 elif out:
-                    zone = _get_zone_upcoming(num, today, attributions_engins) or 'Anticipée'
+                    zone = _get_zone_upcoming(num, today, attr_index) or 'Anticipée'
                 elif en_avance:
-                    zone = _get_zone_upcoming(num, today, attributions_engins) or ''
+                    zone = _get_zone_upcoming(num, today, attr_index) or ''
                 elif non_livre:
-                    zone = _get_zone_upcoming(num, today, attributions_engins) or ''
+                    zone = _get_zone_upcoming(num, today, attr_index) or ''
                 else:
                     zone = ''
                 zone_color = _zone_color(zone)
@@ -439,20 +418,28 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
                         if st.button("✅ Reçu", key=f"recu_{num}", type="primary", use_container_width=True):
                             marquer_engin_recu(num)
                             st.success(f"✅ {num} marqué reçu sur parc")
-                            st.rerun()
+                            st.rerun(scope="fragment")
                     elif en_avance:
                         if st.button("↩️ Annuler avance", key=f"unav_{num}", use_container_width=True):
                             annuler_livraison_anticipee_engin(num)
                             st.info(f"↩️ {num} : livraison anticipée annulée")
-                            st.rerun()
+                            st.rerun(scope="fragment")
                     elif not sur_parc:
                         if st.button("🚚 Non livré", key=f"nonlivre_{num}", use_container_width=True):
                             marquer_retard_livraison_engin(num)
                             st.warning(f"🚚 {num} signalé non livré")
-                            st.rerun()
+                            st.rerun(scope="fragment")
+
+
+@st.fragment
+def _planning_semaine(t):
+    """Grille de la semaine : la navigation ne relance que ce fragment."""
+    today = datetime.now().date()
+    attr_index = attribution_index('attributions_engins')
+    wlg_engins = _wlg_engins()
+    clefs = get_distribution_clefs()
+    hc = t['h23_color']
 
-    # ── PLANNING SEMAINE ───────────────────────────────────────────────────
-    st.markdown("---")
     st.markdown("### 📅 Planning semaine")
 
     if 'wlg_jour_offset' not in st.session_state:
@@ -465,10 +452,10 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
     col_n1, col_n2, col_n3, col_n4, col_n5 = st.columns([1, 1, 4, 1, 1])
     if col_n1.button("⏮ Sem.", key="wlg_prev_sem"):
         st.session_state['wlg_jour_offset'] -= 7
-        st.rerun()
+        st.rerun(scope="fragment")
     if col_n2.button("← Jour", key="wlg_prev_jour"):
         st.session_state['wlg_jour_offset'] -= 1
-        st.rerun()
+        st.rerun(scope="fragment")
     aligne_lundi = sem_debut.weekday() == 0
     titre = (
         f"Semaine du {sem_debut.strftime('%d/%m')} au {sem_fin.strftime('%d/%m/%Y')}"
@@ -482,74 +469,38 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
     )
     if col_n4.button("Jour →", key="wlg_next_jour"):
         st.session_state['wlg_jour_offset'] += 1
-        st.rerun()
+        st.rerun(scope="fragment")
     if col_n5.button("Sem. ⏭", key="wlg_next_sem"):
         st.session_state['wlg_jour_offset'] += 7
-        st.rerun()
+        st.rerun(scope="fragment")
 
     if wlg_engins:
         jours_sem = [sem_debut + timedelta(days=i) for i in range(7)]
 
-        th_s = (f"padding:0.4rem 0.35rem;border:1px solid {cb};text-align:center;"
-                f"background:{ib};color:{hc};font-weight:600;font-size:0.76rem;")
-        td_s = f"border:1px solid {cb};text-align:center;padding:0.3rem 0.25rem;font-size:0.74rem;"
-        td_eng = (f"{td_s}background:{ib};color:{hc};text-align:left;"
-                  f"padding:0.35rem 0.55rem;font-weight:700;font-size:0.9rem;")
-        td_grp = (f"padding:0.3rem 0.55rem;background:{ib};color:{ic};"
-                  f"font-size:0.72rem;font-weight:600;border:1px solid {cb};")
-
-        grid = (
-            f"<div style='overflow-x:auto'>"
-            f"<table style='width:100%;border-collapse:collapse;'><thead><tr>"
-            f"<th style='{th_s} text-align:left;min-width:58px;'>Engin</th>"
-        )
-        for jour in jours_sem:
-            is_today = jour == today
-            j_color = '#f59e0b' if is_today else hc
-            j_bg = "background:rgba(245,158,11,0.12);" if is_today else ""
-            j_bold = "font-weight:800;" if is_today else ""
-            grid += (f"<th style='{th_s}color:{j_color};{j_bg}{j_bold}min-width:78px;'>"
-                     f"{JOURS_FR[jour.weekday()]}<br>{jour.strftime('%d/%m')}</th>")
-        grid += "</tr></thead><tbody>"
-
-        prev_g = None
+        groups, prev_g = [], None
         for eng in wlg_engins:
             num = eng['numero_serie']
             g = num[0].upper()
             if g != prev_g and g in GROUPE_INFO:
-                grp_icon, grp_label = GROUPE_INFO[g]
-                grid += (f"<tr><td colspan='8' style='{td_grp}'>"
-                         f"{grp_icon} {grp_label}</td></tr>")
+                groups.append(("{} {}".format(*GROUPE_INFO[g]), []))
                 prev_g = g
-
-            out_today, _, _ = _clef_status(num, clefs)
-            marque = eng.get('marque', '')
-            engin_cell = (
-                f"<span style='font-weight:700;font-size:0.9rem;color:{hc};'>{esc(num)}</span>"
-                + (f"<br><span style='font-weight:400;font-size:0.72rem;color:{ic};'>{esc(marque)}</span>" if marque else "")
-            )
-            grid += f"<tr><td style='{td_eng}'>{engin_cell}</td>"
-            for jour in jours_sem:
-                is_today_col = jour == today
-                zone = _get_zone_for_day(num, jour, attributions_engins)
-                today_bg = "background:rgba(245,158,11,0.08);" if is_today_col else ""
-                if zone:
-                    bg = _zone_color(zone)
-                    clef_mk = " 🔑" if (is_today_col and out_today) else ""
-                    grid += (f"<td style='{td_s}{today_bg}background:{bg};"
-                             f"color:white;font-weight:600;'>{esc(zone)}{clef_mk}</td>")
-                else:
-                    grid += f"<td style='{td_s}{today_bg}color:{ic};'>—</td>"
-            grid += "</tr>"
-
-        grid += "</tbody></table></div>"
+            elif not groups:
+                groups.append((None, []))
+            groups[-1][1].append((num, eng.get('marque', '')))
+        groups = tuple((titre, tuple(engs)) for titre, engs in groups)
+        marked = frozenset(e['numero_serie'] for e in wlg_engins if _clef_status(e['numero_serie'], clefs)[0])
+        grid = week_table(
+            'attributions_engins', ('wlg', sem_debut, today, groups, marked),
+            lambda: grille.zone_table("Engin", groups, jours_sem, today,
+                                      attr_index.zone_on, _zone_color, marked),
+        )
         st.markdown(grid, unsafe_allow_html=True)
 
         # Légende zones
         all_zones = set()
         for e in wlg_engins:
             for j in jours_sem:
-                z = _get_zone_for_day(e['numero_serie'], j, attributions_engins)
+                z = _get_zone_for_day(e['numero_serie'], j, attr_index)
                 if z:
                     all_zones.add(z)
         if all_zones:
@@ -562,6 +513,26 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
             st.markdown(f"<div style='margin-top:0.5rem;line-height:2.2;'>{legend}</div>",
                         unsafe_allow_html=True)
 
+
+def render_planning_wlg(t):
+    """Page découpée en fragments (st.fragment) : un clic ne relance que le
+    fragment concerné, pas tout app.py (CSS, sidebar, autre grille). Chaque
+    fragment relit ses feuilles dans le cache, à jour après une écriture."""
+    today = datetime.now().date()
+
+    # En-tête
+    st.markdown("# 🎪 Planning WLG26")
+    today_str = f"{JOURS_LONG[today.weekday()]} {today.day} {MOIS_FR[today.month - 1]} {today.year}"
+    st.markdown(f"<p class='page-intro'>{today_str}</p>", unsafe_allow_html=True)
+
+    _etat_du_jour(t)
+    st.markdown("---")
+    _planning_semaine(t)
+
+    # Modifie le planning des deux fragments (et les alertes) : rerun complet.
+    attr_index = attribution_index('attributions_engins')
+    wlg_engins = _wlg_engins()
+
     # ── AJUSTER LE PLANNING ────────────────────────────────────────────────
     st.markdown("---")
     with st.expander("✏️ Ajuster le planning — modifier la zone d'un engin"):
@@ -570,7 +541,7 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
                 col1, col2 = st.columns(2)
                 engin_opts = [
                     f"{e['numero_serie']} — {e.get('marque', '')} "
-                    f"({_get_zone_for_day(e['numero_serie'], today, attributions_engins) or 'non actif'})"
+                    f"({_get_zone_for_day(e['numero_serie'], today, attr_index) or 'non actif'})"
                     for e in wlg_engins
                 ]
                 engin_adj = col1.selectbox("Engin *", engin_opts)
@@ -583,8 +554,10 @@ def render_planning_wlg(t, engins, attributions_engins, interventions_engins=Non
                         num = engin_adj.split(" — ")[0]
                         date_deb_s = date_deb.strftime("%d/%m/%Y")
                         date_fin_s = date_fin_v.strftime("%d/%m/%Y")
-                        ecraser_attributions_engin_periode(num, date_deb_s, date_fin_s)
-                        add_attribution_engin(num, zone_adj.strip(), date_deb_s, date_fin_s, "Journée")
+                        # 1 seul aller-retour API pour les deux écritures
+                        with transaction():
+                            ecraser_attributions_engin_periode(num, date_deb_s, date_fin_s)
+                            add_attribution_engin(num, zone_adj.strip(), date_deb_s, date_fin_s, "Journée")
                         st.success(f"✅ {num} → {zone_adj.strip()} du {date_deb.strftime('%d/%m')} au {date_fin_v.strftime('%d/%m')}")
                         st.session_state['_fk'] = st.session_state.get('_fk', 0) + 1
                         st.rerun()
@@ -106,13 +106,23 @@ def _page_attribuer(t, scooters, attributions_scooters, services):
                     saved = col_s.form_submit_button("💾 Enregistrer")
                     deleted = col_d.form_submit_button("🗑️ Supprimer")
                 if saved:
-                    update_attribution_scooter(idx, {'service': new_srv, 'date_retour_prevue': new_dr, 'date': new_date, 'heure': new_heure, 'casque': new_casque})
-                    st.success("✅ Modifié !")
-                    st.rerun()
+                    try:
+                        update_attribution_scooter(attr.get('_id', ''), {'service': new_srv, 'date_retour_prevue': new_dr, 'date': new_date, 'heure': new_heure, 'casque': new_casque})
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_sco_{idx}")
+                    else:
+                        st.success("✅ Modifié !")
+                        st.rerun()
                 if deleted:
-                    delete_attribution_scooter(idx)
-                    st.success("✅ Supprimé !")
-                    st.rerun()
+                    try:
+                        delete_attribution_scooter(attr.get('_id', ''))
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_sco_{idx}")
+                    else:
+                        st.success("✅ Supprimé !")
+                        st.rerun()
     else:
         st.info("Aucune attribution")
 
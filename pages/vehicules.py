@@ -5,9 +5,8 @@ from database import (
     add_vehicule, delete_vehicule,
     add_attribution, update_attribution, delete_attribution,
     add_bon_carburant, update_bon_carburant, delete_bon_carburant,
-    add_intervention, AGENCES, save_fiche_vehicule
+    add_intervention, AGENCES, save_fiche_vehicule, read_archives
 )
-from pdf import generer_pdf_bon
 
 esc = html.escape
 
@@ -113,13 +112,23 @@ def _page_attribuer(t, vehicules, attributions, services):
                     saved = col_s.form_submit_button("💾 Enregistrer")
                     deleted = col_d.form_submit_button("🗑️ Supprimer")
                 if saved:
-                    update_attribution(idx, {'service': new_srv, 'date_retour_prevue': new_dr, 'date': new_date, 'heure': new_heure})
-                    st.success("✅ Modifié !")
-                    st.rerun()
+                    try:
+                        update_attribution(attr.get('_id', ''), {'service': new_srv, 'date_retour_prevue': new_dr, 'date': new_date, 'heure': new_heure})
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_vh_{idx}")
+                    else:
+                        st.success("✅ Modifié !")
+                        st.rerun()
                 if deleted:
-                    delete_attribution(idx)
-                    st.success("✅ Supprimé !")
-                    st.rerun()
+                    try:
+                        delete_attribution(attr.get('_id', ''))
+                    except KeyError:
+                        st.error("❌ Ligne introuvable : modifiée ou supprimée depuis un autre poste.")
+                        st.button("🔄 Recharger", key=f"reload_vh_{idx}")
+                    else:
+                        st.success("✅ Supprimé !")
+                        st.rerun()
     else:
         st.info("Aucune attribution")
 
@@ -157,6 +166,7 @@ def _page_carburant(t, vehicules, attributions, services, bons_carburant):
             st.markdown(f"<div style='background: {t['input_bg']}; border-radius: 16px; padding: 2rem; margin: 1rem 0; border: 1px solid {t['card_border']};'><h3 style='color: {t['h1_color']}; text-align: center;'>📄 BON DE CARBURANT</h3><p style='color: {t['label_color']};'><strong style='color: {t['strong_color']};'>N°:</strong> {esc(bon['numero_bon'])} | <strong style='color: {t['strong_color']};'>Véhicule:</strong> {esc(bon['immatriculation'])} | <strong style='color: #ef4444;'>Carte N°{esc(bon['numero_carte'])}</strong></p></div>", unsafe_allow_html=True)
             col1, col2 = st.columns(2)
             with col1:
+                from pdf import generer_pdf_bon  # reportlab : chargé au premier bon seulement
                 pdf = generer_pdf_bon(bon, st.session_state.dernier_bon['conducteur_nom'], st.session_state.dernier_bon['conducteur_prenom'], st.session_state.dernier_bon.get('logo_url'))
                 st.download_button("📥 Télécharger PDF", pdf, f"bon_{bon['numero_bon']}.pdf", "application/pdf", type="primary")
             with col2:
@@ -313,6 +323,9 @@ def _page_fiche(t, vehicules, fiches_vehicules, interventions, bons_carburant, a
 
     st.markdown("---")
     st.markdown("### 🔨 Interventions")
+    # Les archives ne sont lues que sur demande (cf. archive.py).
+    if st.checkbox("🗄️ Inclure les archives", key=f"fiche_archives_{immat}"):
+        interventions = read_archives('interventions') + list(interventions)
     vh_interventions = [i for i in interventions if i.get('immatriculation') == immat]
     if vh_interventions:
         for interv in vh_interventions:
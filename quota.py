@@ -0,0 +1,165 @@
+"""Limiteur de débit pour l'API Google Sheets.
+
+Google plafonne les requêtes par minute, séparément en lecture et en
+écriture (60/min par utilisateur, donc par compte de service). Quand une
+dizaine de tablettes rechargent en même temps, on prend des 429.
+
+    svc = quota.limit(build('sheets', 'v4', credentials=creds))
+
+limit() enveloppe le client : chaque .execute() consomme d'abord un jeton
+dans le seau (lecture ou écriture) du process, en attendant si besoin, puis
+retente les 429 / 5xx / erreurs réseau avec un backoff exponentiel à gigue
+(sauf values().append, qui n'est pas idempotent).
+Sans dépendance à Streamlit : utilisable depuis les scripts d'import et
+notify_telegram.py.
+
+Budgets (requêtes par minute) : FLOTTE_QUOTA_READ / FLOTTE_QUOTA_WRITE.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Méthodes de lecture ; tout le reste (update, append, clear, batchUpdate…) est une écriture.
+_READ_METHODS = {'get', 'batchGet', 'batchGetByDataFilter'}
+# Jamais retentées : un essai en erreur a pu écrire quand même (réponse
+# perdue) et le renvoyer doublerait la ligne. Celui qui appelle vérifie
+# avant de réessayer (cf. database._send).
+_NO_RETRY_METHODS = {'append'}
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.recent = deque()
+        self.waited = 0.0
+        self.retries = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        while self.recent and now - self.recent[0] > 60:
+            self.recent.popleft()
+
+
+class RateLimiter:
+    """Deux seaux à jetons (read / write) partagés par les threads du process."""
+
+    def __init__(self, read_per_minute=60, write_per_minute=60, max_retries=5, backoff_max=32.0):
+        self.buckets = {'read': TokenBucket(read_per_minute), 'write': TokenBucket(write_per_minute)}
+        self.max_retries = max_retries
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+
+    def acquire(self, kind):
+        bucket = self.buckets[kind]
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket._refill(now)
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    bucket.recent.append(now)
+                    return
+                wait = (1 - bucket.tokens) / bucket.rate
+                bucket.waited += wait
+            time.sleep(wait)
+
+    def call(self, kind, fn, retry=True):
+        """Exécute fn() après avoir pris un jeton ; retente les erreurs
+        transitoires (sauf retry=False : un seul essai)."""
+        delay = 1.0
+        retries = self.max_retries if retry else 0
+        for attempt in range(retries + 1):
+            self.acquire(kind)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == retries or not is_transient(e):
+                    raise
+                with self._lock:
+                    self.buckets[kind].retries += 1
+                time.sleep(delay + random.uniform(0, delay))
+                delay = min(delay * 2, self.backoff_max)
+
+    def usage(self):
+        """{'read'|'write': {capacity, available, last_minute, waited_s, retries}}."""
+        out = {}
+        with self._lock:
+            now = time.monotonic()
+            for kind, bucket in self.buckets.items():
+                bucket._refill(now)
+                out[kind] = {
+                    'capacity': bucket.capacity,
+                    'available': int(bucket.tokens),
+                    'last_minute': len(bucket.recent),
+                    'waited_s': round(bucket.waited, 1),
+                    'retries': bucket.retries,
+                }
+        return out
+
+
+def is_transient(e):
+    """429, 5xx ou erreur réseau : ça vaut la peine de réessayer."""
+    status = getattr(getattr(e, 'resp', None), 'status', None)
+    if status is not None:
+        status = int(status)
+        return status == 429 or status >= 500
+    return isinstance(e, (OSError, TimeoutError))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter():
+    """Limiteur unique du process (budgets lus dans l'environnement)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimiter(
+                read_per_minute=int(os.environ.get('FLOTTE_QUOTA_READ') or 60),
+                write_per_minute=int(os.environ.get('FLOTTE_QUOTA_WRITE') or 60),
+            )
+        return _shared
+
+
+class _Limited:
+    """Proxy du client : propage l'enveloppe le long de la chaîne
+    service.spreadsheets().values().get(...) et limite .execute()."""
+
+    def __init__(self, target, limiter, method='', retry=True):
+        self._target = target
+        self._limiter = limiter
+        self._method = method
+        self._retry = retry
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return _Limited(attr(*args, **kwargs), self._limiter, name, self._retry)
+        return call
+
+    def execute(self, *args, **kwargs):
+        kind = 'read' if self._method in _READ_METHODS else 'write'
+        retry = self._retry and self._method not in _NO_RETRY_METHODS
+        return self._limiter.call(kind, lambda: self._target.execute(*args, **kwargs), retry)
+
+
+def limit(service, limiter=None, retry=True):
+    return _Limited(service, limiter or shared_limiter(), retry=retry)
+
+
+def single_shot(service):
+    """Comme limit(service), mais sans nouvel essai : pour une sonde qui doit
+    échouer vite plutôt qu'attendre. Un client déjà limité garde son limiteur."""
+    if isinstance(service, _Limited):
+        return _Limited(service._target, service._limiter, retry=False)
+    return limit(service, retry=False)
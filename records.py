@@ -0,0 +1,252 @@
+"""Lignes compactes (Row) et attributions typées.
+
+Les feuilles stockent les dates en texte 'dd/mm/YYYY' : plutôt que de refaire
+un strptime par ligne à chaque rerun, chaque ligne est convertie une fois
+(par version du cache, cf. database.attribution_records) en Attribution,
+avec des dates déjà parsées.
+"""
+import sys
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+class Row(Mapping):
+    """Ligne de feuille en lecture seule : un tuple de valeurs et le dict
+    {colonne: position} partagé par toutes les lignes de la feuille, au lieu
+    d'un dict (et de ses clés) par ligne. S'utilise comme un dict en lecture
+    (get, [], in, items, dict(row), {**row}) ; pour modifier, copier."""
+    __slots__ = ('_cols', '_values')
+
+    def __init__(self, cols, values):
+        self._cols = cols
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._cols[key]]
+
+    def get(self, key, default=None):
+        i = self._cols.get(key)
+        return default if i is None else self._values[i]
+
+    def __contains__(self, key):
+        return key in self._cols
+
+    def __iter__(self):
+        return iter(self._cols)
+
+    def __len__(self):
+        return len(self._cols)
+
+    def keys(self):
+        return self._cols.keys()
+
+    def to_dict(self):
+        return dict(zip(self._cols, self._values))
+
+    def __repr__(self):
+        return f"Row({self.to_dict()!r})"
+
+
+def _intern(v):
+    # Dates, services, statuts… reviennent sur des milliers de lignes.
+    return sys.intern(v) if type(v) is str and len(v) <= 64 else v
+
+
+def compact_rows(rows, headers=None):
+    """Lignes (dicts ou Row) → [Row] partageant un même en-tête. Sans headers,
+    l'en-tête est l'union des clés dans l'ordre d'apparition ; une colonne
+    absente d'une ligne vaut ''."""
+    if not rows:
+        return []
+    first = rows[0]
+    if headers is None and isinstance(first, Row) and all(type(r) is Row and r._cols is first._cols for r in rows):
+        return list(rows)
+    if headers is None:
+        headers = dict.fromkeys(k for r in rows for k in r)
+    cols = {h: i for i, h in enumerate(dict.fromkeys(headers))}
+    if isinstance(first, Row) and first._cols == cols:
+        cols = first._cols
+    out = []
+    for r in rows:
+        if type(r) is Row and (r._cols is cols or r._cols == cols):
+            out.append(r if r._cols is cols else Row(cols, r._values))
+        else:
+            out.append(Row(cols, tuple(_intern(r.get(h, '')) for h in cols)))
+    return out
+
+
+def rows_from_values(values):
+    """Réponse values().get/batchGet (en-tête + lignes) → [Row]. Comme
+    dict(zip(en-tête, ligne complétée par '')) : cellules au-delà de l'en-tête
+    ignorées, et pour un nom de colonne en double la dernière l'emporte."""
+    if not values or len(values) < 2:
+        return []
+    headers = values[0]
+    width = len(headers)
+    if len(set(headers)) != width:
+        return compact_rows([dict(zip(headers, r + [''] * (width - len(r)))) for r in values[1:]])
+    cols = {h: i for i, h in enumerate(headers)}
+    pad = ('',) * width
+    return [Row(cols, tuple(map(_intern, r[:width])) + pad[len(r):]) for r in values[1:]]
+
+
+PERIODES = ('Journée', 'Matin', 'Après-midi')
+_PERIODE_ALIAS = {p.lower(): p for p in PERIODES}
+_PERIODE_ALIAS.update({'journee': 'Journée', 'apres-midi': 'Après-midi', 'après midi': 'Après-midi'})
+
+
+@lru_cache(maxsize=8192)
+def parse_date(value):
+    """'dd/mm/YYYY' → date ; None si vide ou illisible. Mémoïsé : une feuille
+    ne contient que quelques centaines de dates distinctes."""
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_periode(value):
+    """Période canonique ('Journée' si vide)."""
+    value = (value or '').strip()
+    return _PERIODE_ALIAS.get(value.lower(), value) if value else 'Journée'
+
+
+class Attribution(NamedTuple):
+    ident: str                          # numero_serie ou immatriculation
+    service: str
+    date_debut: Optional[date]
+    date_fin: Optional[date]            # = date_debut si la colonne date_fin est absente
+    periode: str
+    retourne: bool
+    date_retour_prevue: Optional[date]  # véhicules / scooters
+    row: dict                           # ligne brute (_id, heure, casque…)
+
+    @property
+    def dates_ok(self):
+        return self.date_debut is not None and self.date_fin is not None
+
+    def covers(self, day):
+        """Vrai si l'attribution (non retournée ou pas) couvre le jour."""
+        return self.dates_ok and self.date_debut <= day <= self.date_fin
+
+
+def from_row(row, id_key='numero_serie'):
+    debut = parse_date(row.get('date'))
+    return Attribution(
+        ident=row.get(id_key, ''),
+        service=row.get('service', ''),
+        date_debut=debut,
+        # Comme a.get('date_fin', a['date']) : une date_fin vide est invalide.
+        date_fin=parse_date(row['date_fin']) if 'date_fin' in row else debut,
+        periode=normalize_periode(row.get('periode')),
+        retourne=bool(row.get('retourne')),
+        date_retour_prevue=parse_date(row.get('date_retour_prevue')),
+        row=row,
+    )
+
+
+def from_rows(rows, id_key='numero_serie'):
+    return [from_row(r, id_key) for r in rows]
+
+
+class AttributionIndex:
+    """Index par identifiant des attributions actives (non retournées, dates
+    valides), pour répondre en O(log n) aux questions du planning :
+
+      zone_on(ident, jour)    zone couvrant le jour : plage la plus courte,
+                              à durée égale la dernière ligne gagne ;
+      next_zone(ident, jour)  zone de la prochaine attribution non terminée
+                              (date_debut la plus tôt, la première à égalité).
+
+    Les attributions d'un engin découpent le temps en segments où le gagnant
+    est constant ; on les précalcule une fois, puis une recherche dichotomique
+    suffit. Construit une fois par version de la feuille (cf.
+    database.attribution_index).
+    """
+
+    def __init__(self, attr_records):
+        by_ident = {}
+        for pos, a in enumerate(attr_records):
+            if a.retourne or not a.dates_ok:
+                continue
+            by_ident.setdefault(a.ident, []).append((pos, a))
+        self._segments = {k: _segments(v) for k, v in by_ident.items()}
+        self._upcoming = {k: _upcoming(v) for k, v in by_ident.items()}
+
+    def zone_on(self, ident, day):
+        seg = self._segments.get(ident)
+        if not seg:
+            return None
+        starts, zones = seg
+        i = bisect_right(starts, day) - 1
+        return zones[i] if i >= 0 else None
+
+    def next_zone(self, ident, day):
+        up = self._upcoming.get(ident)
+        if not up:
+            return None
+        ends, best = up
+        i = bisect_left(ends, day)
+        return best[i] if i < len(ends) else None
+
+
+def _segments(items):
+    """[(pos, Attribution)] → (débuts des segments triés, zone de chaque segment)."""
+    items = [(pos, a) for pos, a in items if a.date_debut <= a.date_fin]
+    bounds = sorted({a.date_debut for _, a in items} | {a.date_fin + timedelta(days=1) for _, a in items})
+    zones = []
+    for b in bounds:
+        best, best_dur = None, None
+        for _, a in items:  # ordre des lignes
+            if a.date_debut <= b <= a.date_fin:
+                dur = (a.date_fin - a.date_debut).days
+                if best_dur is None or dur <= best_dur:
+                    best, best_dur = a.service, dur
+        zones.append(best)
+    return bounds, zones
+
+
+def _upcoming(items):
+    """Triées par date_fin, avec pour chaque suffixe (date_fin >= jour) la zone
+    de date_debut minimale."""
+    items = sorted(items, key=lambda it: it[1].date_fin)
+    ends = [a.date_fin for _, a in items]
+    best = [None] * len(items)
+    key = None
+    for i in range(len(items) - 1, -1, -1):
+        pos, a = items[i]
+        if key is None or (a.date_debut, pos) < key:
+            key = (a.date_debut, pos)
+            zone = a.service
+        best[i] = zone
+    return ends, best
+
+
+SLOTS = ('Matin', 'Après-midi')
+EMPTY_WEEK = tuple((None,) * len(SLOTS) for _ in range(7))
+
+
+def week_grid(attr_records, monday):
+    """Occupation de la semaine en une passe : {ident: 7 jours × SLOTS → service
+    ou None}. Comme l'ancien _get_slot, la première attribution (ordre des
+    lignes) non retournée qui couvre le jour et le créneau l'emporte ; une
+    attribution 'Journée' occupe les deux créneaux."""
+    sunday = monday + timedelta(days=6)
+    grid = {}
+    for a in attr_records:
+        if a.retourne or not a.dates_ok or a.date_fin < monday or a.date_debut > sunday:
+            continue
+        week = grid.get(a.ident)
+        if week is None:
+            week = grid[a.ident] = [[None] * len(SLOTS) for _ in range(7)]
+        first = max((a.date_debut - monday).days, 0)
+        last = min((a.date_fin - monday).days, 6)
+        for pi, slot in enumerate(SLOTS):
+            if a.periode != 'Journée' and a.periode != slot:
+                continue
+            for di in range(first, last + 1):
+                if week[di][pi] is None:
+                    week[di][pi] = a.service
+    return {k: tuple(tuple(day) for day in week) for k, week in grid.items()}
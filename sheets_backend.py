@@ -0,0 +1,316 @@
+"""Backends de stockage pour database.py.
+
+Les deux backends exposent la même interface, celle du client Google
+(service.spreadsheets().values().<méthode>(...).execute()) :
+  - lecture de tout     : values().batchGet(spreadsheetId, ranges)
+  - lecture d'une plage : values().get(spreadsheetId, range)
+  - ajout               : values().append(spreadsheetId, range, ..., body)
+  - mise à jour         : values().update(...) / values().batchUpdate(...)
+  - effacement          : values().clear(spreadsheetId, range)
+  + spreadsheets().get() / spreadsheets().batchUpdate() (addSheet) pour init_database.
+
+Backend choisi par la variable d'environnement FLOTTE_BACKEND
+(ou st.secrets["backend"]["kind"]) :
+  - 'google' (défaut) : API Google Sheets, identifiants de st.secrets ;
+  - 'fake'            : classeur en mémoire, sans compte Google, pour tester
+                        et mesurer les pages hors ligne. Options :
+                          FLOTTE_FAKE_PATH     fichier JSON (persistance sur disque)
+                          FLOTTE_FAKE_LATENCY  latence simulée par appel, en secondes
+                          FLOTTE_FAKE_QUOTA    nb max de requêtes par minute (429 au-delà)
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+_A1_RE = re.compile(r'^([A-Z]*)(\d*)$')
+
+
+def backend_kind(secrets=None):
+    kind = os.environ.get('FLOTTE_BACKEND')
+    if not kind and secrets is not None:
+        try:
+            kind = secrets.get('backend', {}).get('kind')
+        except Exception:
+            kind = None
+    return (kind or 'google').lower()
+
+
+def google_service(secrets, timeout=None):
+    """timeout : délai réseau par requête en secondes (défaut httplib2 sinon)."""
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    credentials = service_account.Credentials.from_service_account_info(
+        secrets["gcp_service_account"],
+        scopes=["https://www.googleapis.com/auth/spreadsheets"]
+    )
+    if timeout is None:
+        return build('sheets', 'v4', credentials=credentials)
+    import google_auth_httplib2
+    import httplib2
+    http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+    return build('sheets', 'v4', http=http)
+
+
+def fake_service_from_env():
+    quota = os.environ.get('FLOTTE_FAKE_QUOTA')
+    return FakeSheetsService(
+        path=os.environ.get('FLOTTE_FAKE_PATH') or None,
+        latency=float(os.environ.get('FLOTTE_FAKE_LATENCY') or 0),
+        quota_per_minute=int(quota) if quota else None,
+    )
+
+
+# Feuille des jetons de version (cf. database._check_meta) : une ligne par
+# feuille, un nouveau jeton à chaque écriture.
+META_SHEET = '_meta'
+
+
+def bump_meta(svc, sid, sheet_names):
+    """Pose un nouveau jeton _meta pour sheet_names : pour les scripts qui
+    écrivent hors de l'app, afin qu'elle recharge ces feuilles à la sonde
+    suivante plutôt qu'au bout de son TTL de sécurité. Sans gravité si ça
+    échoue (pas de _meta, réseau) ; renvoie les feuilles signalées."""
+    try:
+        values = svc.spreadsheets().values().get(
+            spreadsheetId=sid, range=f"{META_SHEET}!A:A"
+        ).execute().get('values', [])
+        rows = {r[0]: i + 2 for i, r in enumerate(values[1:]) if r and r[0]}
+        data = [
+            {'range': f"{META_SHEET}!B{rows[name]}", 'values': [[uuid.uuid4().hex[:12]]]}
+            for name in sheet_names if name in rows
+        ]
+        if data:
+            svc.spreadsheets().values().batchUpdate(
+                spreadsheetId=sid, body={"valueInputOption": "RAW", "data": data}
+            ).execute()
+        return [name for name in sheet_names if name in rows]
+    except Exception:
+        return []
+
+
+# ── Backend simulé ──────────────────────────────────────────────────────────
+
+class FakeHttpError(Exception):
+    """Imite googleapiclient.errors.HttpError (attribut resp.status)."""
+
+    def __init__(self, status, message):
+        super().__init__(f"<HttpError {status}: {message}>")
+        self.status_code = status
+        self.resp = type('Resp', (), {'status': status})()
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def _col_letter(i):
+    letters = ''
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        letters = chr(65 + r) + letters
+    return letters
+
+
+def _raw(v):
+    """Valeur stockée pour valueInputOption=RAW (l'API relit des chaînes)."""
+    if v is None:
+        return ''
+    if isinstance(v, bool):
+        return 'TRUE' if v else 'FALSE'
+    return str(v)
+
+
+def _parse_range(a1):
+    """'feuille!B2:C5' → (feuille, ligne0, col0, ligne_fin, col_fin) ; bornes
+    de fin exclusives, None = illimité."""
+    if '!' in a1:
+        name, cells = a1.rsplit('!', 1)
+    else:
+        name, cells = a1, ''
+    name = name.strip("'")
+    if not cells:
+        return name, 0, 0, None, None
+    start, _, end = cells.partition(':')
+    c1, r1 = _A1_RE.match(start).groups()
+    c2, r2 = _A1_RE.match(end).groups() if end else (c1, r1)
+    return (
+        name,
+        int(r1) - 1 if r1 else 0,
+        _col_index(c1) if c1 else 0,
+        int(r2) if r2 else None,
+        _col_index(c2) + 1 if c2 else None,
+    )
+
+
+class _Request:
+    def __init__(self, service, kind, fn):
+        self._service, self._kind, self._fn = service, kind, fn
+
+    def execute(self):
+        return self._service._call(self._kind, self._fn)
+
+
+class _Values:
+    def __init__(self, service):
+        self._s = service
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        return _Request(self._s, 'read', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self._s._read(spreadsheetId, r) for r in ranges],
+        })
+
+    def get(self, spreadsheetId, range, **kwargs):
+        return _Request(self._s, 'read', lambda: self._s._read(spreadsheetId, range))
+
+    def update(self, spreadsheetId, range, body, valueInputOption='RAW', **kwargs):
+        return _Request(self._s, 'write', lambda: self._s._write(spreadsheetId, range, body.get('values', [])))
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            done = [self._s._write(spreadsheetId, d['range'], d.get('values', [])) for d in body.get('data', [])]
+            return {'spreadsheetId': spreadsheetId, 'responses': done}
+        return _Request(self._s, 'write', run)
+
+    def append(self, spreadsheetId, range, body, valueInputOption='RAW', insertDataOption=None, **kwargs):
+        return _Request(self._s, 'write', lambda: self._s._append(spreadsheetId, range, body.get('values', [])))
+
+    def clear(self, spreadsheetId, range, body=None):
+        return _Request(self._s, 'write', lambda: self._s._clear(spreadsheetId, range))
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._s = service
+
+    def values(self):
+        return _Values(self._s)
+
+    def get(self, spreadsheetId, **kwargs):
+        return _Request(self._s, 'read', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'sheets': [{'properties': {'title': t, 'sheetId': i}} for i, t in enumerate(self._s._book(spreadsheetId))],
+        })
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            book = self._s._book(spreadsheetId)
+            for req in body.get('requests', []):
+                if 'addSheet' in req:
+                    book.setdefault(req['addSheet']['properties']['title'], [])
+                elif 'deleteDimension' in req:
+                    # sheetId = rang de la feuille dans le classeur (cf. get)
+                    rng = req['deleteDimension']['range']
+                    del book[list(book)[rng['sheetId']]][rng['startIndex']:rng['endIndex']]
+            self._s._save()
+            return {'spreadsheetId': spreadsheetId, 'replies': [{} for _ in body.get('requests', [])]}
+        return _Request(self._s, 'write', run)
+
+
+class FakeSheetsService:
+    """Classeur en mémoire qui imite le client Google Sheets v4.
+
+    data : {spreadsheetId: {feuille: [[cellule, ...], ...]}} (chaînes).
+    latency : secondes ajoutées à chaque execute().
+    quota_per_minute : au-delà, execute() lève FakeHttpError(429), comme l'API.
+    path : fichier JSON relu à la création et réécrit après chaque écriture.
+    """
+
+    def __init__(self, data=None, path=None, latency=0.0, quota_per_minute=None):
+        self.path = path
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.calls = {'read': 0, 'write': 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._data = data if data is not None else {}
+        if data is None and path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._data = json.load(f)
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def _call(self, kind, fn):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.quota_per_minute is not None:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_minute:
+                    raise FakeHttpError(429, "Quota exceeded (simulé)")
+                self._recent.append(now)
+            self.calls[kind] += 1
+            return fn()
+
+    def _book(self, spreadsheet_id):
+        return self._data.setdefault(spreadsheet_id, {})
+
+    def _grid(self, spreadsheet_id, name):
+        book = self._book(spreadsheet_id)
+        if name not in book:
+            raise FakeHttpError(400, f"Unable to parse range: {name}")
+        return book[name]
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _read(self, spreadsheet_id, a1):
+        name, r0, c0, r1, c1 = _parse_range(a1)
+        rows = [row[c0:c1] for row in self._grid(spreadsheet_id, name)[r0:r1]]
+        # Comme l'API : cellules vides de fin de ligne et lignes vides de fin omises.
+        rows = [row[:max((i + 1 for i, v in enumerate(row) if v != ''), default=0)] for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        out = {'range': a1, 'majorDimension': 'ROWS'}
+        if rows:
+            out['values'] = rows
+        return out
+
+    def _write(self, spreadsheet_id, a1, values):
+        name, r0, c0, _, _ = _parse_range(a1)
+        grid = self._grid(spreadsheet_id, name)
+        for i, row in enumerate(values):
+            while len(grid) <= r0 + i:
+                grid.append([])
+            line = grid[r0 + i]
+            if len(line) < c0 + len(row):
+                line.extend([''] * (c0 + len(row) - len(line)))
+            line[c0:c0 + len(row)] = [_raw(v) for v in row]
+        self._save()
+        width = max((len(r) for r in values), default=1)
+        return {
+            'updatedRange': f"{name}!{_col_letter(c0)}{r0 + 1}:{_col_letter(c0 + width - 1)}{r0 + len(values)}",
+            'updatedRows': len(values),
+        }
+
+    def _append(self, spreadsheet_id, a1, values):
+        name, _, c0, _, _ = _parse_range(a1)
+        grid = self._grid(spreadsheet_id, name)
+        last = max((i for i, row in enumerate(grid) if any(v != '' for v in row)), default=-1)
+        start = f"{name}!{_col_letter(c0)}{last + 2}"
+        return {'spreadsheetId': spreadsheet_id, 'updates': self._write(spreadsheet_id, start, values)}
+
+    def _clear(self, spreadsheet_id, a1):
+        name, r0, c0, r1, c1 = _parse_range(a1)
+        grid = self._grid(spreadsheet_id, name)
+        for row in grid[r0:r1]:
+            for c in range(c0, len(row) if c1 is None else min(c1, len(row))):
+                row[c] = ''
+        self._save()
+        return {'clearedRange': a1}
@@ -1,8 +1,8 @@
 import streamlit as st
-from alertes import verifier_alertes, verifier_alertes_scooters, verifier_alertes_engins, verifier_alertes_golfettes
+from database import alertes_state, pending_writes
 
 
-def render_sidebar(t, attributions, attributions_scooters, attributions_engins, services, attributions_golfettes=None):
+def render_sidebar(t):
     vehicule_pages = [
         "➕ Saisir un véhicule",
         "🔧 Attribuer un véhicule",
@@ -85,7 +85,8 @@ def render_sidebar(t, attributions, attributions_scooters, attributions_engins,
                   on_click=nav_to, args=("⚙️ Paramètres",))
 
         st.markdown("---")
-        alertes = verifier_alertes(attributions)
+        alertes_par_type = alertes_state()
+        alertes = alertes_par_type['vehicules']
         if alertes:
             st.markdown(f"<div style='background: rgba(239, 68, 68, 0.1); border: 1px solid rgba(239, 68, 68, 0.3); border-radius: 10px; padding: 1rem;'><p style='color: #ef4444; font-weight: 600; margin: 0;'>🚨 {len(alertes)} véhicule(s) à retourner bientôt</p></div>", unsafe_allow_html=True)
             with st.expander("Voir les alertes"):
@@ -97,7 +98,7 @@ def render_sidebar(t, attributions, attributions_scooters, attributions_engins,
                     else:
                         st.warning(f"🟡 {a['immatriculation']} - {a['service']} (J-{a['jours_restants']})")
 
-        alertes_engins = verifier_alertes_engins(attributions_engins)
+        alertes_engins = alertes_par_type['engins']
         if alertes_engins:
             st.markdown(f"<div style='background: rgba(245, 158, 11, 0.1); border: 1px solid rgba(245, 158, 11, 0.3); border-radius: 10px; padding: 1rem; margin-top: 0.5rem;'><p style='color: #f59e0b; font-weight: 600; margin: 0;'>🚜 {len(alertes_engins)} engin(s) à retourner</p></div>", unsafe_allow_html=True)
             with st.expander("Voir les alertes engins"):
@@ -107,7 +108,7 @@ def render_sidebar(t, attributions, attributions_scooters, attributions_engins,
                     else:
                         st.warning(f"🟠 {a['numero_serie']} - {a['service']} (fin prévue {a['date_fin']})")
 
-        alertes_golfettes = verifier_alertes_golfettes(attributions_golfettes or [])
+        alertes_golfettes = alertes_par_type['golfettes']
         if alertes_golfettes:
             st.markdown(f"<div style='background: rgba(16, 185, 129, 0.1); border: 1px solid rgba(16, 185, 129, 0.3); border-radius: 10px; padding: 1rem; margin-top: 0.5rem;'><p style='color: #10b981; font-weight: 600; margin: 0;'>⛳ {len(alertes_golfettes)} golfette(s) à retourner</p></div>", unsafe_allow_html=True)
             with st.expander("Voir les alertes golfettes"):
@@ -117,7 +118,7 @@ def render_sidebar(t, attributions, attributions_scooters, attributions_engins,
                     else:
                         st.warning(f"🟠 {a['numero_serie']} - {a['service']} (fin prévue {a['date_fin']})")
 
-        alertes_scooters = verifier_alertes_scooters(attributions_scooters)
+        alertes_scooters = alertes_par_type['scooters']
         if alertes_scooters:
             st.markdown(f"<div style='background: rgba(168, 85, 247, 0.1); border: 1px solid rgba(168, 85, 247, 0.3); border-radius: 10px; padding: 1rem; margin-top: 0.5rem;'><p style='color: #a855f7; font-weight: 600; margin: 0;'>🛵 {len(alertes_scooters)} scooter(s) à retourner bientôt</p></div>", unsafe_allow_html=True)
             with st.expander("Voir les alertes scooters"):
@@ -131,3 +132,6 @@ def render_sidebar(t, attributions, attributions_scooters, attributions_engins,
 
         st.markdown("---")
         st.markdown("<div style='background: rgba(16, 185, 129, 0.08); border-radius: 8px; padding: 0.75rem; margin-bottom: 0.5rem;'><p style='color: #10b981; font-size: 0.8rem; margin: 0;'>🗄️ Base connectée</p></div>", unsafe_allow_html=True)
+        en_attente = pending_writes()
+        if en_attente:
+            st.markdown(f"<div style='background: rgba(245, 158, 11, 0.08); border-radius: 8px; padding: 0.75rem; margin-bottom: 0.5rem;'><p style='color: #f59e0b; font-size: 0.8rem; margin: 0;'>⏳ {en_attente} modification(s) en attente</p></div>", unsafe_allow_html=True)
@@ -1,3 +1,5 @@
+from grille import PALETTE, AUTRE
+
 THEMES = {
     "Sombre Classique": {
         "bg": "linear-gradient(135deg, #0f0f1a 0%, #1a1a2e 50%, #16213e 100%)",
@@ -165,6 +167,41 @@ def get_css(t):
     strong {{ color: {t['strong_color']}; }}
     .page-intro {{ color: {t['intro_color']}; font-size: 0.95rem; margin-bottom: 2rem; }}
     .sidebar-title {{ color: {t['sidebar_title']}; font-size: 1.5rem; font-weight: 700; margin-bottom: 0.5rem; }}
+    /* Grilles de planning (grille.py) */
+    .pl-wrap {{ overflow-x: auto; }}
+    .pl {{ width: 100%; border-collapse: collapse; }}
+    .pl th, .pl td {{ border: 1px solid {t['card_border']}; text-align: center; }}
+    .pl th {{ padding: 0.45rem 0.4rem; background: {t['input_bg']}; color: {t['h23_color']}; font-weight: 600; font-size: 0.8rem; min-width: 88px; }}
+    .pl td {{ padding: 0.3rem 0.25rem; font-size: 0.75rem; color: {t['intro_color']}; }}
+    .pl th.pl-h {{ text-align: left; min-width: 110px; }}
+    .pl th.pl-today {{ color: #f59e0b; }}
+    .pl .pl-slot {{ background: {t['input_bg']}; min-width: 52px; }}
+    .pl td.pl-asset {{ background: {t['input_bg']}; color: {t['h23_color']}; text-align: left; padding: 0.4rem 0.5rem; min-width: 110px; }}
+    .pl td.pl-asset small {{ color: {t['intro_color']}; }}
+    .pl td.pl-on {{ color: white; font-weight: 500; }}
+    .pl.pl-wlg th {{ padding: 0.4rem 0.35rem; font-size: 0.76rem; min-width: 78px; }}
+    .pl.pl-wlg th.pl-h {{ min-width: 58px; }}
+    .pl.pl-wlg th.pl-today {{ background: rgba(245,158,11,0.12); font-weight: 800; }}
+    .pl.pl-wlg td {{ font-size: 0.74rem; }}
+    .pl.pl-wlg td.pl-today {{ background: rgba(245,158,11,0.08); }}
+    .pl.pl-wlg td.pl-asset {{ padding: 0.35rem 0.55rem; font-size: 0.9rem; min-width: 0; }}
+    .pl.pl-wlg td.pl-asset small {{ font-size: 0.72rem; }}
+    .pl.pl-wlg td.pl-on {{ font-weight: 600; }}
+    .pl td.pl-grp {{ text-align: left; padding: 0.3rem 0.55rem; background: {t['input_bg']}; font-size: 0.72rem; font-weight: 600; }}
+    {''.join(f".pl-s{i} {{ background: {c}; }} " for i, c in enumerate(PALETTE))}.pl-sx {{ background: {AUTRE}; }}
+    .pl-badge {{ color: white; padding: 0.2rem 0.6rem; border-radius: 12px; font-size: 0.75rem; margin-right: 0.3rem; }}
+    /* Listes « 📋 Détails » du tableau de bord */
+    .dash-card {{ background: {t['card_bg']}; border: 1px solid {t['card_border']}; border-left: 4px solid #10b981; border-radius: 10px; padding: 0.8rem 1.2rem; margin-bottom: 0.5rem; }}
+    .dash-card.dc-sortie {{ border-left-color: #ef4444; }}
+    .dash-card.dc-interv {{ border-left-color: #f59e0b; }}
+    .dash-card .dc-id {{ color: {t['h1_color']}; font-weight: 600; font-size: 1rem; }}
+    .dash-card .dc-sub {{ color: {t['label_color']}; margin-left: 1rem; }}
+    .dash-card .dc-info {{ color: {t['text_color']}; font-size: 0.85rem; }}
+    .dash-card .dc-info + .dc-info {{ margin-left: 1rem; }}
+    .dash-card .dc-statut {{ color: #10b981; font-weight: 500; font-size: 0.9rem; }}
+    .dash-card.dc-sortie .dc-statut {{ color: #ef4444; }}
+    .dash-card.dc-interv .dc-statut {{ color: #f59e0b; }}
+    .dash-pager {{ text-align: center; color: {t['intro_color']}; margin: 0.4rem 0; }}
     /* Sidebar nav buttons */
     [data-testid="stSidebar"] .stButton > button {{
         background: transparent !important;